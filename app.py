@@ -7,80 +7,112 @@ import os
 import aws_cdk.core as cdk
 
 from lib.pipeline_stack import PipelineStack
+from lib.pipeline_deploy_stage import PipelineDeployStage
 from lib.empty_stack import EmptyStack
 from lib.configuration import (
     ACCOUNT_ID, DEPLOYMENT, DEV, TEST, PROD, REGION,
-    get_logical_id_prefix, get_all_configurations
+    get_ephemeral_environment, get_logical_id_prefix, get_all_configurations
 )
+from lib.stack_sharding import check_stack_budget, get_stack_budget
 from lib.tagging import tag
 
-app = cdk.App()
 
-if bool(os.environ.get('IS_BOOTSTRAP')):
-    EmptyStack(app, 'StackStub')
-else:
-    raw_mappings = get_all_configurations()
+def create_app(outdir: str = None, context: dict = None) -> cdk.App:
+    """
+    Creates the CDK app with the pipeline stacks of the selected environments
 
-    deployment_account = raw_mappings[DEPLOYMENT][ACCOUNT_ID]
-    deployment_region = raw_mappings[DEPLOYMENT][REGION]
-    deployment_aws_env = {
-        'account': deployment_account,
-        'region': deployment_region,
-    }
-    logical_id_prefix = get_logical_id_prefix()
-    
-    if os.environ.get('ENV', DEV) == DEV:
-        target_environment = DEV
-        dev_account = raw_mappings[DEV][ACCOUNT_ID]
-        dev_region = raw_mappings[DEV][REGION]
-        dev_aws_env = {
-            'account': dev_account,
-            'region': dev_region,
-        }
-        dev_pipeline_stack = PipelineStack(
-            app,
-            f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
-            target_environment=DEV,
-            target_branch='main',
-            target_aws_env=dev_aws_env,
-            env=deployment_aws_env,
-        )
-        tag(dev_pipeline_stack, DEPLOYMENT)
+    @param outdir str: The cloud assembly directory, None for the one the CDK CLI passes
+    @param context dict: Context values, None for the ones the CDK CLI passes
 
-    if os.environ.get('ENV', TEST) == TEST:
-        target_environment = TEST
-        test_account = raw_mappings[TEST][ACCOUNT_ID]
-        test_region = raw_mappings[TEST][REGION]
-        test_aws_env = {
-            'account': test_account,
-            'region': test_region,
-        }
-        test_pipeline_stack = PipelineStack(
+    @return: cdk.App:
+    """
+    app = cdk.App(outdir=outdir, context=context)
+
+    if bool(os.environ.get('IS_BOOTSTRAP')):
+        EmptyStack(app, 'StackStub')
+    elif os.environ.get('EPHEMERAL_BRANCH'):
+        # Short-lived environment of a feature branch, deployed straight to the Dev account without a pipeline
+        raw_mappings = get_all_configurations()
+        target_environment = get_ephemeral_environment(os.environ['EPHEMERAL_BRANCH'])
+        PipelineDeployStage(
             app,
-            f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
-            target_environment=TEST,
-            target_branch='test',
-            target_aws_env=test_aws_env,
-            env=deployment_aws_env,
+            target_environment,
+            target_environment=target_environment,
+            deployment_account_id=raw_mappings[DEPLOYMENT][ACCOUNT_ID],
+            env={
+                'account': raw_mappings[DEV][ACCOUNT_ID],
+                'region': raw_mappings[DEV][REGION],
+            },
         )
-        tag(test_pipeline_stack, DEPLOYMENT)
+    else:
+        raw_mappings = get_all_configurations()
 
-    if os.environ.get('ENV', PROD) == PROD:
-        target_environment = PROD
-        prod_account = raw_mappings[PROD][ACCOUNT_ID]
-        prod_region = raw_mappings[PROD][REGION]
-        prod_aws_env = {
-            'account': prod_account,
-            'region': prod_region,
+        deployment_account = raw_mappings[DEPLOYMENT][ACCOUNT_ID]
+        deployment_region = raw_mappings[DEPLOYMENT][REGION]
+        deployment_aws_env = {
+            'account': deployment_account,
+            'region': deployment_region,
         }
-        prod_pipeline_stack = PipelineStack(
-            app,
-            f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
-            target_environment=PROD,
-            target_branch='production',
-            target_aws_env=prod_aws_env,
-            env=deployment_aws_env,
-        )
-        tag(prod_pipeline_stack, DEPLOYMENT)
+        logical_id_prefix = get_logical_id_prefix()
+
+        if os.environ.get('ENV', DEV) == DEV:
+            target_environment = DEV
+            dev_account = raw_mappings[DEV][ACCOUNT_ID]
+            dev_region = raw_mappings[DEV][REGION]
+            dev_aws_env = {
+                'account': dev_account,
+                'region': dev_region,
+            }
+            dev_pipeline_stack = PipelineStack(
+                app,
+                f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
+                target_environment=DEV,
+                target_branch='main',
+                target_aws_env=dev_aws_env,
+                env=deployment_aws_env,
+            )
+            tag(dev_pipeline_stack, DEPLOYMENT)
+
+        if os.environ.get('ENV', TEST) == TEST:
+            target_environment = TEST
+            test_account = raw_mappings[TEST][ACCOUNT_ID]
+            test_region = raw_mappings[TEST][REGION]
+            test_aws_env = {
+                'account': test_account,
+                'region': test_region,
+            }
+            test_pipeline_stack = PipelineStack(
+                app,
+                f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
+                target_environment=TEST,
+                target_branch='test',
+                target_aws_env=test_aws_env,
+                env=deployment_aws_env,
+            )
+            tag(test_pipeline_stack, DEPLOYMENT)
+
+        if os.environ.get('ENV', PROD) == PROD:
+            target_environment = PROD
+            prod_account = raw_mappings[PROD][ACCOUNT_ID]
+            prod_region = raw_mappings[PROD][REGION]
+            prod_aws_env = {
+                'account': prod_account,
+                'region': prod_region,
+            }
+            prod_pipeline_stack = PipelineStack(
+                app,
+                f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
+                target_environment=PROD,
+                target_branch='production',
+                target_aws_env=prod_aws_env,
+                env=deployment_aws_env,
+            )
+            tag(prod_pipeline_stack, DEPLOYMENT)
+
+    return app
+
 
-app.synth()
+if __name__ == '__main__':
+    cloud_assembly = create_app().synth()
+    if not bool(os.environ.get('IS_BOOTSTRAP')):
+        check_stack_budget(cloud_assembly.directory, get_stack_budget())
@@ -0,0 +1,152 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+MANIFEST_FILE = 'manifest.json'
+STACK_ARTIFACT = 'aws:cloudformation:stack'
+NESTED_ASSEMBLY_ARTIFACT = 'cdk:cloud-assembly'
+ASSET_MANIFEST_ARTIFACT = 'cdk:asset-manifest'
+NESTED_STACK_RESOURCE = 'AWS::CloudFormation::Stack'
+
+
+def load_manifest(directory: str) -> dict:
+    """
+    Loads the manifest of a cloud assembly directory, e.g. cdk.out
+
+    @param directory str: The cloud assembly directory
+
+    @return: dict: The manifest
+    """
+    with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+        return json.load(manifest_file)
+
+
+def iter_stack_artifacts(directory: str):
+    """
+    Yields every stack artifact of the cloud assembly, including stacks of nested assemblies (pipeline stages)
+
+    @param directory str: The cloud assembly directory
+
+    @return: Generator of (directory, artifact id, artifact) tuples, directory is where the artifact files are
+    """
+    for artifact_id, artifact in load_manifest(directory).get('artifacts', {}).items():
+        if artifact['type'] == STACK_ARTIFACT:
+            yield directory, artifact_id, artifact
+        elif artifact['type'] == NESTED_ASSEMBLY_ARTIFACT:
+            yield from iter_stack_artifacts(os.path.join(directory, artifact['properties']['directoryName']))
+
+
+def get_stack_name(artifact_id: str, artifact: dict) -> str:
+    """
+    Returns the CloudFormation stack name of a stack artifact
+
+    @param artifact_id str: The artifact id
+    @param artifact dict: The artifact from the manifest
+
+    @return: str: The stack name
+    """
+    return artifact.get('properties', {}).get('stackName', artifact_id)
+
+
+def load_template(directory: str, artifact: dict) -> dict:
+    """
+    Loads the CloudFormation template of a stack artifact
+
+    @param directory str: The directory of the artifact
+    @param artifact dict: The artifact from the manifest
+
+    @return: dict: The template
+    """
+    with open(os.path.join(directory, artifact['properties']['templateFile'])) as template_file:
+        return json.load(template_file)
+
+
+def find_stack_templates(directory: str, stack_names) -> dict:
+    """
+    Returns the templates of the given stacks from the cloud assembly
+
+    @param directory str: The cloud assembly directory
+    @param stack_names: CloudFormation stack names to look for
+
+    @return: dict: Template per stack name, stacks that are not in the assembly are omitted
+    """
+    stack_names = set(stack_names)
+    return {
+        get_stack_name(artifact_id, artifact): load_template(artifact_directory, artifact)
+        for artifact_directory, artifact_id, artifact in iter_stack_artifacts(directory)
+        if get_stack_name(artifact_id, artifact) in stack_names
+    }
+
+
+def get_file_asset_paths(directory: str, artifact: dict) -> dict:
+    """
+    Returns the files the asset manifests of a stack artifact publish, e.g. its nested stack templates
+
+    @param directory str: The directory of the artifact
+    @param artifact dict: The stack artifact from the manifest
+
+    @return: dict: File path relative to the directory per published object key
+    """
+    artifacts = load_manifest(directory).get('artifacts', {})
+    paths = {}
+    for dependency in artifact.get('dependencies', []):
+        if artifacts.get(dependency, {}).get('type') != ASSET_MANIFEST_ARTIFACT:
+            continue
+        with open(os.path.join(directory, artifacts[dependency]['properties']['file'])) as asset_manifest_file:
+            files = json.load(asset_manifest_file).get('files', {})
+        for asset in files.values():
+            for destination in asset['destinations'].values():
+                paths[destination['objectKey']] = asset['source']['path']
+
+    return paths
+
+
+def load_nested_templates(directory: str, template: dict, asset_paths: dict) -> list:
+    """
+    Loads the templates of the nested stacks of a template, recursing into their own nested stacks
+
+    @param directory str: The directory of the stack artifact
+    @param template dict: The parent template
+    @param asset_paths dict: File path per published object key, see get_file_asset_paths
+
+    @raises: Exception: Throws an exception if a nested stack template is not in the assembly
+    @return: list: The nested templates, depth first
+    """
+    templates = []
+    for logical_id, resource in template.get('Resources', {}).items():
+        if resource['Type'] != NESTED_STACK_RESOURCE:
+            continue
+        # The template URL is joined from tokens, its object key is the asset hash of the nested template
+        template_url = json.dumps(resource.get('Properties', {}).get('TemplateURL'))
+        paths = [path for object_key, path in asset_paths.items() if object_key in template_url]
+        if not paths:
+            raise Exception(f'The template of nested stack {logical_id} is not in the cloud assembly {directory}')
+        with open(os.path.join(directory, paths[0])) as template_file:
+            nested_template = json.load(template_file)
+        templates += [nested_template, *load_nested_templates(directory, nested_template, asset_paths)]
+
+    return templates
+
+
+def find_nested_templates(directory: str, stack_names) -> dict:
+    """
+    Returns the templates of the nested stacks of the given stacks from the cloud assembly,
+    e.g. of stacks split by stack_sharding.py
+
+    @param directory str: The cloud assembly directory
+    @param stack_names: CloudFormation stack names to look for
+
+    @return: dict: List of nested templates per stack name, stacks that are not in the assembly are omitted
+    """
+    stack_names = set(stack_names)
+    return {
+        get_stack_name(artifact_id, artifact): load_nested_templates(
+            artifact_directory,
+            load_template(artifact_directory, artifact),
+            get_file_asset_paths(artifact_directory, artifact),
+        )
+        for artifact_directory, artifact_id, artifact in iter_stack_artifacts(directory)
+        if get_stack_name(artifact_id, artifact) in stack_names
+    }
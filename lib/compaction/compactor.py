@@ -0,0 +1,424 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Glue Python shell script deployed by CompactionStack. It only depends on boto3 and, for Parquet, pyarrow,
+# so it runs as a single file in Glue and against a local directory for testing:
+#   python3 lib/compaction/compactor.py --local-root /tmp/zones --buckets conformed --target-file-bytes 1048576
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import uuid
+
+MANIFEST_NAME = '_compaction_manifest.json'
+COMPACTED_PREFIX = 'compacted-'
+# Compacted objects are written under a hidden name, which Hive, Spark, and Athena ignore, and moved to their
+# visible name once the manifest lists them
+STAGED_PREFIX = f'_{COMPACTED_PREFIX}'
+# Line delimited formats are merged by concatenation, Parquet by concatenating tables
+LINE_DELIMITED_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+PARQUET_EXTENSION = '.parquet'
+DELETE_OBJECTS_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class S3ObjectStore:
+
+    def __init__(self, s3_client, bucket: str):
+        """
+        Object store backed by an Amazon S3 bucket
+
+        @param s3_client: S3 client for the bucket's account and region
+        @param bucket str: The bucket name
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def list(self, prefix: str = '') -> dict:
+        """
+        @param prefix str: The key prefix
+        @return: dict: Size in bytes per key
+        """
+        return {
+            summary['Key']: summary['Size']
+            for page in self.s3_client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix)
+            for summary in page.get('Contents', [])
+        }
+
+    def get(self, key: str) -> bytes:
+        """
+        @param key str: The object key
+        @return: bytes: The object contents
+        """
+        return self.s3_client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def put(self, key: str, body: bytes):
+        """
+        Writes an object, encrypted by the bucket's default encryption with the data lake KMS key
+
+        @param key str: The object key
+        @param body bytes: The object contents
+        """
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def move(self, source_key: str, destination_key: str):
+        """
+        Moves an object by copying it, in parts for large objects, and deleting the source
+
+        @param source_key str: The key of the object to move
+        @param destination_key str: The new key of the object
+        """
+        self.s3_client.copy({'Bucket': self.bucket, 'Key': source_key}, self.bucket, destination_key)
+        self.s3_client.delete_object(Bucket=self.bucket, Key=source_key)
+
+    def delete(self, keys: list):
+        """
+        @param keys list: The keys of the objects to delete
+        """
+        for index in range(0, len(keys), DELETE_OBJECTS_BATCH_SIZE):
+            self.s3_client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    'Objects': [{'Key': key} for key in keys[index:index + DELETE_OBJECTS_BATCH_SIZE]],
+                    'Quiet': True,
+                },
+            )
+
+
+class LocalObjectStore:
+
+    def __init__(self, root: str):
+        """
+        Object store backed by a local directory, a stand-in for a bucket when testing.
+        Keys are paths relative to the root, with forward slashes.
+
+        @param root str: The directory that stands in for the bucket
+        """
+        self.root = root
+
+    def list(self, prefix: str = '') -> dict:
+        """
+        @param prefix str: The key prefix
+        @return: dict: Size in bytes per key
+        """
+        objects = {}
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    objects[key] = os.path.getsize(path)
+        return objects
+
+    def get(self, key: str) -> bytes:
+        """
+        @param key str: The object key
+        @return: bytes: The object contents
+        """
+        with open(os.path.join(self.root, key), 'rb') as local_file:
+            return local_file.read()
+
+    def put(self, key: str, body: bytes):
+        """
+        Writes an object through a temporary file, so it is replaced at once like an S3 object
+
+        @param key str: The object key
+        @param body bytes: The object contents
+        """
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'wb') as local_file:
+            local_file.write(body)
+        os.replace(f'{path}.tmp', path)
+
+    def move(self, source_key: str, destination_key: str):
+        """
+        @param source_key str: The key of the object to move
+        @param destination_key str: The new key of the object
+        """
+        os.replace(os.path.join(self.root, source_key), os.path.join(self.root, destination_key))
+
+    def delete(self, keys: list):
+        """
+        @param keys list: The keys of the objects to delete
+        """
+        for key in keys:
+            if os.path.exists(os.path.join(self.root, key)):
+                os.remove(os.path.join(self.root, key))
+
+
+def split_key(key: str) -> tuple:
+    """
+    @param key str: The object key
+    @return: tuple: (partition prefix ending with a slash or empty, object name)
+    """
+    partition, _, name = key.rpartition('/')
+    return (f'{partition}/' if partition else ''), name
+
+
+def get_extension(name: str) -> str:
+    """
+    @param name str: The object name
+    @return: str: The extension of a mergeable format, None for other formats
+    """
+    extension = os.path.splitext(name)[1].lower()
+    return extension if extension in LINE_DELIMITED_EXTENSIONS + (PARQUET_EXTENSION,) else None
+
+
+def is_hidden(name: str) -> bool:
+    """
+    Hive, Spark, and Athena ignore objects whose name starts with an underscore or a dot
+
+    @param name str: The object name
+    @return: bool:
+    """
+    return name.startswith('_') or name.startswith('.')
+
+
+def read_manifest(store, partition: str) -> dict:
+    """
+    Reads the compaction manifest of a partition. The manifest lists the compacted objects that are live, the hidden
+    staged objects they are moved from, and the objects they replaced. Writing it is the atomic step that swaps
+    the replaced objects for the compacted ones.
+
+    @param store: The object store
+    @param partition str: The partition prefix
+
+    @return: dict: The manifest, empty if the partition was never compacted
+    """
+    manifest = {'compacted': [], 'staged': {}, 'replaced': []}
+    if f'{partition}{MANIFEST_NAME}' in store.list(f'{partition}{MANIFEST_NAME}'):
+        manifest.update(json.loads(store.get(f'{partition}{MANIFEST_NAME}')))
+
+    return manifest
+
+
+def get_staged_key(key: str) -> str:
+    """
+    @param key str: The key of a compacted object
+    @return: str: The hidden key the compacted object is written to before it is live
+    """
+    partition, name = split_key(key)
+    return f'{partition}_{name}'
+
+
+def is_live(key: str, manifest: dict) -> bool:
+    """
+    Readers that honor the manifest read the live objects only: objects not replaced by a compaction,
+    and compacted objects once the manifest lists them
+
+    @param key str: The object key
+    @param manifest dict: The partition's manifest, see read_manifest
+
+    @return: bool:
+    """
+    _, name = split_key(key)
+    if is_hidden(name) or key in manifest['replaced']:
+        return False
+
+    return not name.startswith(COMPACTED_PREFIX) or key in manifest['compacted']
+
+
+def get_live_keys(store, partition: str) -> list:
+    """
+    Returns the keys of the objects a reader should read from a partition, consistent during a compaction.
+    A compacted object that the manifest lists but that is not moved to its visible key yet is read from its
+    staged key.
+
+    Readers that list the partition without the manifest, e.g. Athena, never see staged objects, but may see a
+    compacted object together with the objects it replaces between its move and their deletion.
+
+    @param store: The object store
+    @param partition str: The partition prefix
+
+    @return: list: The keys, sorted
+    """
+    manifest = read_manifest(store, partition)
+    keys = {key for key in store.list(partition) if split_key(key)[0] == partition}
+    live_keys = {key for key in keys if is_live(key, manifest)}
+    live_keys |= {
+        staged_key for staged_key, key in manifest['staged'].items() if key not in keys and staged_key in keys
+    }
+    return sorted(live_keys)
+
+
+def recover_partition(store, partition: str, manifest: dict, objects: dict):
+    """
+    Finishes or rolls back an interrupted earlier run: moves staged objects the manifest lists to their visible keys,
+    and deletes replaced objects still present and compacted or staged objects the manifest does not list
+
+    @param store: The object store
+    @param partition str: The partition prefix
+    @param manifest dict: The partition's manifest, see read_manifest
+    @param objects dict: Size per key of the objects of the partition
+    """
+    for staged_key, key in manifest['staged'].items():
+        if staged_key in objects and key not in objects:
+            store.move(staged_key, key)
+    store.delete([
+        key for key in objects
+        if key in manifest['replaced']
+        or (key in manifest['staged'] and manifest['staged'][key] in objects)
+        or (split_key(key)[1].startswith(COMPACTED_PREFIX) and key not in manifest['compacted'])
+        or (split_key(key)[1].startswith(STAGED_PREFIX) and key not in manifest['staged'])
+    ])
+
+
+def merge(bodies: list, extension: str) -> bytes:
+    """
+    Merges objects of the same format into one
+
+    @param bodies list: The object contents, in order
+    @param extension str: The format extension, see get_extension
+
+    @return: bytes: The merged object
+    """
+    if extension != PARQUET_EXTENSION:
+        return b''.join(body if body.endswith(b'\n') or not body else body + b'\n' for body in bodies)
+
+    import pyarrow
+    import pyarrow.parquet as parquet
+    tables = [parquet.read_table(io.BytesIO(body)) for body in bodies]
+    output = io.BytesIO()
+    parquet.write_table(pyarrow.concat_tables(tables), output)
+    return output.getvalue()
+
+
+def plan_groups(objects: dict, target_file_bytes: int) -> list:
+    """
+    Bins the small objects of a partition, per format, into groups of up to the target size.
+    Objects of the target size or larger are left alone, as are groups of a single object.
+
+    @param objects dict: Size per key of the live objects of one partition
+    @param target_file_bytes int: The target size of compacted objects
+
+    @return: list: (extension, keys) tuples, one per compacted object to write
+    """
+    groups = []
+    by_extension = {}
+    for key in sorted(objects):
+        extension = get_extension(split_key(key)[1])
+        if extension and objects[key] < target_file_bytes:
+            by_extension.setdefault(extension, []).append(key)
+    for extension, keys in by_extension.items():
+        group, group_bytes = [], 0
+        for key in keys:
+            if group and group_bytes + objects[key] > target_file_bytes:
+                groups.append((extension, group))
+                group, group_bytes = [], 0
+            group.append(key)
+            group_bytes += objects[key]
+        groups.append((extension, group))
+
+    return [(extension, keys) for extension, keys in groups if len(keys) > 1]
+
+
+def compact_partition(store, partition: str, target_file_bytes: int, run_id: str = None) -> dict:
+    """
+    Compacts one partition:
+    1. Finishes or rolls back an interrupted earlier run, see recover_partition
+    2. Writes the compacted objects under hidden staged keys, which all readers ignore
+    3. Writes the manifest, atomically swapping the replaced objects for the compacted ones for readers that honor it
+    4. Moves the compacted objects to their visible keys and deletes the replaced objects
+
+    @param store: The object store
+    @param partition str: The partition prefix
+    @param target_file_bytes int: The target size of compacted objects
+    @param run_id str: Unique id of the run, part of the compacted object names, random if not provided
+
+    @raises: Exception: Throws the exception of a failed merge, after deleting the objects staged so far
+    @return: dict: Number of objects replaced and written, and the partition
+    """
+    run_id = run_id or uuid.uuid4().hex[:12]
+    manifest = read_manifest(store, partition)
+    recover_partition(
+        store, partition, manifest,
+        {key: size for key, size in store.list(partition).items() if split_key(key)[0] == partition},
+    )
+    objects = {key: size for key, size in store.list(partition).items() if split_key(key)[0] == partition}
+    live_objects = {key: size for key, size in objects.items() if is_live(key, manifest)}
+
+    groups = plan_groups(live_objects, target_file_bytes)
+    if not groups:
+        return {'partition': partition, 'replaced': 0, 'written': 0}
+    staged = {}
+    try:
+        for index, (extension, keys) in enumerate(groups):
+            key = f'{partition}{COMPACTED_PREFIX}{run_id}-{index:05d}{extension}'
+            store.put(get_staged_key(key), merge([store.get(group_key) for group_key in keys], extension))
+            staged[get_staged_key(key)] = key
+    except Exception:
+        store.delete(list(staged))
+        raise
+
+    replaced = [key for _, keys in groups for key in keys]
+    store.put(f'{partition}{MANIFEST_NAME}', json.dumps({
+        'runId': run_id,
+        'compacted': sorted(set(manifest['compacted']) - set(replaced) | set(staged.values())),
+        'staged': staged,
+        'replaced': replaced,
+    }, indent=2).encode('utf-8'))
+    for staged_key, key in staged.items():
+        store.move(staged_key, key)
+    store.delete(replaced)
+
+    return {'partition': partition, 'replaced': len(replaced), 'written': len(staged)}
+
+
+def compact(store, target_file_bytes: int, prefix: str = '') -> list:
+    """
+    Compacts every partition under the prefix, a partition being the objects directly under one key prefix.
+    A partition that fails to compact, e.g. Parquet files with different schemas, is logged and skipped.
+
+    @param store: The object store
+    @param target_file_bytes int: The target size of compacted objects
+    @param prefix str: Only compact partitions under this prefix
+
+    @return: list: The result per partition that was compacted or failed, failures have an error instead of counts
+    """
+    run_id = uuid.uuid4().hex[:12]
+    results = []
+    for partition in sorted({split_key(key)[0] for key in store.list(prefix)}):
+        try:
+            result = compact_partition(store, partition, target_file_bytes, run_id)
+        except Exception as error:
+            logger.exception('Skipping partition %s', partition)
+            result = {'partition': partition, 'error': str(error)}
+        if result.get('written') or result.get('error'):
+            results.append(result)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merges small objects of each partition into target sized objects')
+    parser.add_argument(
+        '--buckets', required=True, help='Comma separated bucket names, or directories with --local-root'
+    )
+    parser.add_argument('--target-file-bytes', type=int, required=True)
+    parser.add_argument('--prefix', default='', help='Only compact partitions under this prefix')
+    parser.add_argument('--local-root', help='Compact directories under this root instead of S3 buckets')
+    # Glue passes its own arguments, e.g. --job-bookmark-option, which are ignored
+    arguments, _ = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.INFO)
+    failed = False
+    for bucket_name in arguments.buckets.split(','):
+        if arguments.local_root:
+            object_store = LocalObjectStore(os.path.join(arguments.local_root, bucket_name))
+        else:
+            import boto3
+            object_store = S3ObjectStore(boto3.client('s3'), bucket_name)
+        for partition_result in compact(object_store, arguments.target_file_bytes, arguments.prefix):
+            if 'error' in partition_result:
+                failed = True
+                continue
+            print(f'{bucket_name}/{partition_result["partition"]}: replaced {partition_result["replaced"]} objects '
+                  f'with {partition_result["written"]}')
+    # Fails the job run once every partition was tried, so skipped partitions are visible
+    if failed:
+        sys.exit(1)
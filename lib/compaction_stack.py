@@ -0,0 +1,124 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+
+import aws_cdk.core as cdk
+import aws_cdk.aws_glue as glue
+import aws_cdk.aws_iam as iam
+import aws_cdk.aws_kms as kms
+import aws_cdk.aws_s3 as s3
+import aws_cdk.aws_s3_assets as s3_assets
+
+from .configuration import (
+    AVAILABILITY_ZONE_1, COMPACTION_SCHEDULE, COMPACTION_TARGET_FILE_BYTES, S3_CONFORMED_BUCKET, S3_KMS_KEY,
+    S3_PURPOSE_BUILT_BUCKET, SHARED_SECURITY_GROUP_ID, SUBNET_ID_1, get_environment_configuration,
+    get_logical_id_prefix, get_resource_name_prefix,
+)
+from .output_registry import import_output
+
+
+class CompactionStack(cdk.Stack):
+
+    def __init__(self, scope: cdk.Construct, construct_id: str, target_environment: str, **kwargs) -> None:
+        """
+        CloudFormation stack to create a scheduled AWS Glue Python shell job that merges small files
+        of the conformed and purpose-built zones into files of the configured target size.
+        The VPC, buckets, and KMS key are read from the outputs the other stacks publish to SSM, so this stack
+        adds no exports to them. It must be deployed after them.
+
+        @param scope cdk.Construct: Parent of this stack, usually an App or a Stage, but could be any construct.
+        @param construct_id str:
+            The construct ID of this stack. If stackName is not explicitly defined,
+            this id (and any parent IDs) will be used to determine the physical ID of the stack.
+        @param target_environment str: The target environment for stacks in the deploy stage
+        @param kwargs:
+        """
+        super().__init__(scope, construct_id, **kwargs)
+
+        mappings = get_environment_configuration(target_environment)
+        logical_id_prefix = get_logical_id_prefix()
+        resource_name_prefix = get_resource_name_prefix()
+        buckets = [
+            s3.Bucket.from_bucket_name(
+                self,
+                f'{target_environment}{logical_id_prefix}{construct_name}',
+                import_output(self, output_key, target_environment),
+            )
+            for construct_name, output_key in (
+                ('ConformedBucket', S3_CONFORMED_BUCKET), ('PurposeBuiltBucket', S3_PURPOSE_BUILT_BUCKET),
+            )
+        ]
+        s3_kms_key = kms.Key.from_key_arn(
+            self,
+            f'{target_environment}{logical_id_prefix}KmsKey',
+            import_output(self, S3_KMS_KEY, target_environment),
+        )
+
+        script = s3_assets.Asset(
+            self,
+            f'{target_environment}{logical_id_prefix}CompactorScript',
+            path=os.path.join(os.path.dirname(__file__), 'compaction', 'compactor.py'),
+        )
+        role = iam.Role(
+            self,
+            f'{target_environment}{logical_id_prefix}CompactionRole',
+            assumed_by=iam.ServicePrincipal('glue.amazonaws.com'),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name('service-role/AWSGlueServiceRole'),
+            ],
+        )
+        script.grant_read(role)
+        for bucket in buckets:
+            bucket.grant_read_write(role)
+        s3_kms_key.grant_encrypt_decrypt(role)
+
+        # Runs the job in the first private subnet of the data lake VPC, reaching S3 through the gateway endpoint
+        connection = glue.CfnConnection(
+            self,
+            f'{target_environment}{logical_id_prefix}CompactionConnection',
+            catalog_id=self.account,
+            connection_input=glue.CfnConnection.ConnectionInputProperty(
+                connection_type='NETWORK',
+                name=f'{target_environment.lower()}-{resource_name_prefix}-compaction',
+                description='Network connection of the data lake compaction job',
+                physical_connection_requirements=glue.CfnConnection.PhysicalConnectionRequirementsProperty(
+                    availability_zone=import_output(self, AVAILABILITY_ZONE_1, target_environment),
+                    security_group_id_list=[import_output(self, SHARED_SECURITY_GROUP_ID, target_environment)],
+                    subnet_id=import_output(self, SUBNET_ID_1, target_environment),
+                ),
+            ),
+        )
+        job = glue.CfnJob(
+            self,
+            f'{target_environment}{logical_id_prefix}CompactionJob',
+            name=f'{target_environment.lower()}-{resource_name_prefix}-compaction',
+            description='Merges small files of the conformed and purpose-built zones',
+            role=role.role_arn,
+            command=glue.CfnJob.JobCommandProperty(
+                name='pythonshell',
+                python_version='3.9',
+                script_location=script.s3_object_url,
+            ),
+            glue_version='3.0',
+            max_capacity=1,
+            max_retries=0,
+            timeout=8 * 60,
+            connections=glue.CfnJob.ConnectionsListProperty(connections=[connection.ref]),
+            execution_property=glue.CfnJob.ExecutionPropertyProperty(max_concurrent_runs=1),
+            default_arguments={
+                # Includes pyarrow, used to merge Parquet files
+                'library-set': 'analytics',
+                '--buckets': cdk.Fn.join(',', [bucket.bucket_name for bucket in buckets]),
+                '--target-file-bytes': str(mappings[COMPACTION_TARGET_FILE_BYTES]),
+            },
+        )
+        glue.CfnTrigger(
+            self,
+            f'{target_environment}{logical_id_prefix}CompactionTrigger',
+            name=f'{target_environment.lower()}-{resource_name_prefix}-compaction-schedule',
+            type='SCHEDULED',
+            schedule=mappings[COMPACTION_SCHEDULE],
+            start_on_creation=True,
+            actions=[glue.CfnTrigger.ActionProperty(job_name=job.ref)],
+        )
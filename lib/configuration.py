@@ -20,6 +20,21 @@ REGION = 'region'
 LOGICAL_ID_PREFIX = 'logical_id_prefix'
 RESOURCE_NAME_PREFIX = 'resource_name_prefix'
 VPC_CIDR = 'vpc_cidr'
+CODESTAR_CONNECTION_ARN = 'codestar_connection_arn'
+SOURCE_INCLUDE_PATHS = 'source_include_paths'
+SOURCE_EXCLUDE_PATHS = 'source_exclude_paths'
+QUOTA_PREFLIGHT = 'quota_preflight'
+MAX_STACK_RESOURCES = 'max_stack_resources'
+MAX_TEMPLATE_BYTES = 'max_template_bytes'
+SHARDED_STACKS = 'sharded_stacks'
+ENABLE_FLOW_LOGS = 'enable_flow_logs'
+NAT_GATEWAYS = 'nat_gateways'
+ENABLE_INTERFACE_ENDPOINTS = 'enable_interface_endpoints'
+KEY_LAYOUT = 'key_layout'
+ENABLE_COMPACTION = 'enable_compaction'
+COMPACTION_TARGET_FILE_BYTES = 'compaction_target_file_bytes'
+COMPACTION_SCHEDULE = 'compaction_schedule'
+ALLOW_TEARDOWN = 'allow_teardown'
 
 # Secrets Manager Inputs
 GITHUB_TOKEN = 'github_token'
@@ -41,6 +56,23 @@ S3_ACCESS_LOG_BUCKET = 's3_access_log_bucket'
 S3_RAW_BUCKET = 's3_raw_bucket'
 S3_CONFORMED_BUCKET = 's3_conformed_bucket'
 S3_PURPOSE_BUILT_BUCKET = 's3_purpose_built_bucket'
+S3_KEY_LAYOUT = 's3_key_layout'
+
+# Stacks deployed to each target environment
+VPC_STACK = 'vpc_stack'
+S3_BUCKET_ZONES_STACK = 's3_bucket_zones_stack'
+COMPACTION_STACK = 'compaction_stack'
+
+# Data Lake zones
+RAW_ZONE = 'raw'
+CONFORMED_ZONE = 'conformed'
+PURPOSE_BUILT_ZONE = 'purpose-built'
+DATA_LAKE_ZONES = [RAW_ZONE, CONFORMED_ZONE, PURPOSE_BUILT_ZONE]
+
+# Ephemeral environments are named Dev<Branch> and deployed from a feature branch with the Dev configuration.
+# The branch part is shortened further where needed to keep bucket names within the S3 limit
+EPHEMERAL_SUFFIX_MAX_LENGTH = 12
+BUCKET_NAME_MAX_LENGTH = 63
 
 
 def get_local_configuration(environment: str) -> dict:
@@ -67,21 +99,108 @@ def get_local_configuration(environment: str) -> dict:
             # It may only contain alphanumeric characters, hyphens, and cannot contain trailing hyphens
             # E.g. unique-identifier-data-lake
             RESOURCE_NAME_PREFIX: '',
+            # Optional ARN of a CodeStar connection to GitHub. When set, pipelines use the connection
+            # and the source path filters below, otherwise they use a GitHub webhook with the token secret
+            CODESTAR_CONNECTION_ARN: '',
+            # Synth fails when a synthesized template exceeds either budget, see stack_sharding.py.
+            # CloudFormation allows 500 resources per stack and 1 MB per template uploaded through S3
+            MAX_STACK_RESOURCES: 400,
+            MAX_TEMPLATE_BYTES: 800000,
         },
         DEV: {
             ACCOUNT_ID: '',
             REGION: 'us-east-2',
-            VPC_CIDR: '10.20.0.0/24'
+            VPC_CIDR: '10.20.0.0/24',
+            # Glob patterns of changed files that start (include) or never start (exclude) a pipeline run.
+            # Only applied with a CodeStar connection, an empty include list means all files
+            SOURCE_INCLUDE_PATHS: [],
+            SOURCE_EXCLUDE_PATHS: ['README.md', 'resources/**'],
+            # Check service quotas in the target account after synth, before the pipeline deploys
+            QUOTA_PREFLIGHT: False,
+            # Stacks, e.g. S3_BUCKET_ZONES_STACK, whose constructs are split into nested stacks, see stack_sharding.py.
+            # Sharding moves resources to new logical ids, so only add a stack before its first deployment
+            SHARDED_STACKS: [],
+            # Deliver VPC flow logs as hourly partitioned Parquet to an encrypted bucket, see flow_log_analyzer.py
+            ENABLE_FLOW_LOGS: False,
+            # One NAT gateway (and Elastic IP) per availability zone, at least 1 since the private subnets route
+            # through it. Interface endpoints keep Glue, KMS, SSM, Secrets Manager and Step Functions traffic in the VPC
+            NAT_GATEWAYS: 3,
+            ENABLE_INTERFACE_ENDPOINTS: True,
+            # Shard counts of the hashed shard=NN/ key prefix per zone, e.g. {RAW_ZONE: {'2031-01-01': 16}},
+            # see key_layout.py, zones without a count are unsharded. A count applies to partitions from its date on,
+            # so for a zone that already holds data the date must be in the future, check with key_layout.py
+            KEY_LAYOUT: {},
+            # Deploy a scheduled Glue job that merges small files of the conformed and purpose-built zones
+            # into files of about the target size, see compaction_stack.py. Schedule is a Glue cron expression
+            ENABLE_COMPACTION: False,
+            COMPACTION_TARGET_FILE_BYTES: 128 * 1024 * 1024,
+            COMPACTION_SCHEDULE: 'cron(0 3 * * ? *)',
+            # Allow teardown.py to purge the versioned buckets and delete the stacks of the environment,
+            # and delete the access logs bucket with the stack where buckets are not retained
+            ALLOW_TEARDOWN: False,
         },
         TEST: {
             ACCOUNT_ID: '',
             REGION: 'us-east-2',
-            VPC_CIDR: '10.10.0.0/24'
+            VPC_CIDR: '10.10.0.0/24',
+            # Glob patterns of changed files that start (include) or never start (exclude) a pipeline run.
+            # Only applied with a CodeStar connection, an empty include list means all files
+            SOURCE_INCLUDE_PATHS: [],
+            SOURCE_EXCLUDE_PATHS: ['README.md', 'resources/**'],
+            # Check service quotas in the target account after synth, before the pipeline deploys
+            QUOTA_PREFLIGHT: False,
+            # Stacks, e.g. S3_BUCKET_ZONES_STACK, whose constructs are split into nested stacks, see stack_sharding.py.
+            # Sharding moves resources to new logical ids, so only add a stack before its first deployment
+            SHARDED_STACKS: [],
+            # Deliver VPC flow logs as hourly partitioned Parquet to an encrypted bucket, see flow_log_analyzer.py
+            ENABLE_FLOW_LOGS: False,
+            # One NAT gateway (and Elastic IP) per availability zone, at least 1 since the private subnets route
+            # through it. Interface endpoints keep Glue, KMS, SSM, Secrets Manager and Step Functions traffic in the VPC
+            NAT_GATEWAYS: 3,
+            ENABLE_INTERFACE_ENDPOINTS: True,
+            # Shard counts of the hashed shard=NN/ key prefix per zone, e.g. {RAW_ZONE: {'2031-01-01': 16}},
+            # see key_layout.py, zones without a count are unsharded. A count applies to partitions from its date on,
+            # so for a zone that already holds data the date must be in the future, check with key_layout.py
+            KEY_LAYOUT: {},
+            # Deploy a scheduled Glue job that merges small files of the conformed and purpose-built zones
+            # into files of about the target size, see compaction_stack.py. Schedule is a Glue cron expression
+            ENABLE_COMPACTION: False,
+            COMPACTION_TARGET_FILE_BYTES: 128 * 1024 * 1024,
+            COMPACTION_SCHEDULE: 'cron(0 3 * * ? *)',
+            # Allow teardown.py to purge the versioned buckets and delete the stacks of the environment,
+            # and delete the access logs bucket with the stack where buckets are not retained
+            ALLOW_TEARDOWN: False,
         },
         PROD: {
             ACCOUNT_ID: '',
             REGION: 'us-east-2',
-            VPC_CIDR: '10.0.0.0/24'
+            VPC_CIDR: '10.0.0.0/24',
+            # Glob patterns of changed files that start (include) or never start (exclude) a pipeline run.
+            # Only applied with a CodeStar connection, an empty include list means all files
+            SOURCE_INCLUDE_PATHS: [],
+            SOURCE_EXCLUDE_PATHS: ['README.md', 'resources/**'],
+            # Check service quotas in the target account after synth, before the pipeline deploys
+            QUOTA_PREFLIGHT: False,
+            # Stacks, e.g. S3_BUCKET_ZONES_STACK, whose constructs are split into nested stacks, see stack_sharding.py.
+            # Sharding moves resources to new logical ids, so only add a stack before its first deployment
+            SHARDED_STACKS: [],
+            # Deliver VPC flow logs as hourly partitioned Parquet to an encrypted bucket, see flow_log_analyzer.py
+            ENABLE_FLOW_LOGS: False,
+            # One NAT gateway (and Elastic IP) per availability zone, at least 1 since the private subnets route
+            # through it. Interface endpoints keep Glue, KMS, SSM, Secrets Manager and Step Functions traffic in the VPC
+            NAT_GATEWAYS: 3,
+            ENABLE_INTERFACE_ENDPOINTS: True,
+            # Shard counts of the hashed shard=NN/ key prefix per zone, e.g. {RAW_ZONE: {'2031-01-01': 16}},
+            # see key_layout.py, zones without a count are unsharded. A count applies to partitions from its date on,
+            # so for a zone that already holds data the date must be in the future, check with key_layout.py
+            KEY_LAYOUT: {},
+            # Deploy a scheduled Glue job that merges small files of the conformed and purpose-built zones
+            # into files of about the target size, see compaction_stack.py. Schedule is a Glue cron expression
+            ENABLE_COMPACTION: False,
+            COMPACTION_TARGET_FILE_BYTES: 128 * 1024 * 1024,
+            COMPACTION_SCHEDULE: 'cron(0 3 * * ? *)',
+            # Teardown is never allowed for Prod
+            ALLOW_TEARDOWN: False,
         }
     }
 
@@ -93,12 +212,59 @@ def get_local_configuration(environment: str) -> dict:
         raise Exception('Resource names may only contain lowercase Alphanumeric and hyphens '
                         'and cannot contain leading or trailing hyphens')
 
+    if local_mapping[PROD][ALLOW_TEARDOWN]:
+        raise Exception(f'Teardown cannot be allowed for {PROD}')
+
+    if is_ephemeral_environment(environment):
+        # Short-lived copies of Dev share its account, so they get a minimal network
+        return {
+            **local_mapping[DEV],
+            NAT_GATEWAYS: 1,
+            ENABLE_INTERFACE_ENDPOINTS: False,
+            ALLOW_TEARDOWN: True,
+        }
+
     if environment not in local_mapping:
         raise Exception(f'The requested environment: {environment} does not exist in local mappings')
 
     return local_mapping[environment]
 
 
+def get_ephemeral_environment(branch: str) -> str:
+    """
+    Returns the name of the ephemeral environment deployed from a feature branch,
+    e.g. DevFeatureOrders for feature/orders
+
+    @param branch str: The branch name
+    @raises: Exception: Throws an exception if the branch name has no alphanumeric characters
+    @raises: Exception: Throws an exception if Dev bucket names leave no room for the branch
+    @return: str:
+    """
+    suffix = ''.join(part.capitalize() for part in re.split('[^A-Za-z0-9]+', branch))
+    if not suffix:
+        raise Exception(f'Branch {branch} has no alphanumeric characters to name an environment after')
+
+    # The purpose-built zone has the longest bucket name suffix
+    dev_mapping = get_local_configuration(DEV)
+    max_length = min(
+        EPHEMERAL_SUFFIX_MAX_LENGTH,
+        BUCKET_NAME_MAX_LENGTH - len(get_bucket_name(DEV, PURPOSE_BUILT_ZONE, dev_mapping[ACCOUNT_ID],
+                                                     dev_mapping[REGION])),
+    )
+    if max_length < 1:
+        raise Exception('Dev bucket names leave no room to name an ephemeral environment after a branch')
+
+    return f'{DEV}{suffix[:max_length]}'
+
+
+def is_ephemeral_environment(environment: str) -> bool:
+    """
+    @param environment str: The environment name
+    @return: bool: True for environments named by get_ephemeral_environment
+    """
+    return bool(re.fullmatch(f'{DEV}[A-Z0-9][A-Za-z0-9]{{0,{EPHEMERAL_SUFFIX_MAX_LENGTH - 1}}}', environment))
+
+
 def get_environment_configuration(environment: str) -> dict:
     """
     Provides all configuration values for the given target environment
@@ -107,8 +273,22 @@ def get_environment_configuration(environment: str) -> dict:
 
     @return: dict:
     """
-    cloudformation_output_mapping = {
+    return {
         ENVIRONMENT: environment,
+        **get_output_export_names(environment),
+        **get_local_configuration(environment),
+    }
+
+
+def get_output_export_names(environment: str) -> dict:
+    """
+    Provides the CloudFormation export names of the stack outputs for the given target environment
+
+    @param environment str: The environment used to retrieve corresponding export names
+
+    @return: dict:
+    """
+    return {
         VPC_ID: f'{environment}VpcId',
         AVAILABILITY_ZONE_1: f'{environment}AvailabilityZone1',
         AVAILABILITY_ZONE_2: f'{environment}AvailabilityZone2',
@@ -127,8 +307,6 @@ def get_environment_configuration(environment: str) -> dict:
         S3_PURPOSE_BUILT_BUCKET: f'{environment}PurposeBuiltBucketName',
     }
 
-    return {**cloudformation_output_mapping, **get_local_configuration(environment)}
-
 
 def get_all_configurations() -> dict:
     """
@@ -163,3 +341,68 @@ def get_resource_name_prefix() -> str:
     @return: str:
     """
     return get_local_configuration(DEPLOYMENT)[RESOURCE_NAME_PREFIX]
+
+
+def get_bucket_name(environment: str, suffix: str, account_id: str, region: str) -> str:
+    """
+    Returns the globally unique name of a bucket of the given target environment,
+    e.g. dev-<resource_name_prefix>-<account_id>-<region>-raw
+
+    @param environment str: The target environment
+    @param suffix str: The data lake zone, or the purpose of the bucket, e.g. access-logs
+    @param account_id str: The account id of the target environment
+    @param region str: The region of the target environment
+    @return: str:
+    """
+    return f'{environment.lower()}-{get_resource_name_prefix()}-{account_id}-{region}-{suffix}'
+
+
+def get_stack_ids(environment: str) -> dict:
+    """
+    Returns the construct ids of the stacks deployed to the given target environment, including optional stacks
+    that are enabled for it
+
+    @param environment str: The target environment
+    @return: dict:
+    """
+    logical_id_prefix = get_logical_id_prefix()
+    stack_ids = {
+        VPC_STACK: f'{environment}{logical_id_prefix}InfrastructureVpc',
+        S3_BUCKET_ZONES_STACK: f'{environment}{logical_id_prefix}InfrastructureS3BucketZones',
+    }
+    if get_local_configuration(environment)[ENABLE_COMPACTION]:
+        stack_ids[COMPACTION_STACK] = f'{environment}{logical_id_prefix}InfrastructureCompaction'
+
+    return stack_ids
+
+
+def get_stack_names(environment: str) -> dict:
+    """
+    Returns the CloudFormation stack names of the stacks deployed to the given target environment.
+    Stacks are deployed through a stage named after the environment, which prefixes the stack name.
+
+    @param environment str: The target environment
+    @return: dict:
+    """
+    return {key: f'{environment}-{stack_id}' for key, stack_id in get_stack_ids(environment).items()}
+
+
+def get_output_parameter_path(environment: str) -> str:
+    """
+    Returns the SSM Parameter Store path under which the stack outputs of the target environment are published.
+    Each output is a parameter named after its configuration key, e.g. /DataLake/Infrastructure/Dev/vpc_id
+
+    @param environment str: The target environment
+    @return: str:
+    """
+    return f'/DataLake/Infrastructure/{environment}'
+
+
+def get_pipeline_name(environment: str) -> str:
+    """
+    Returns the CodePipeline name of the pipeline that deploys the given target environment
+
+    @param environment str: The target environment
+    @return: str:
+    """
+    return f'{environment.lower()}-{get_resource_name_prefix()}-infrastructure-pipeline'
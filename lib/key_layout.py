@@ -0,0 +1,294 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import datetime
+import hashlib
+import json
+import re
+import sys
+
+from .configuration import (
+    ACCOUNT_ID, DATA_LAKE_ZONES, DEV, KEY_LAYOUT, PROD, REGION, S3_KEY_LAYOUT, TEST, get_bucket_name,
+    get_environment_configuration, get_output_parameter_path
+)
+from .sessions import DEFAULT_MAX_WORKERS, SessionCache, run_concurrently
+
+SHARD_DIGITS = 2
+MAX_SHARDS = 10 ** SHARD_DIGITS
+KEY_PATTERN = re.compile(
+    r'^(?P<prefix>.+?)/year=(?P<year>\d{4})/month=(?P<month>\d{2})/day=(?P<day>\d{2})/(?P<object_name>[^/]+)$'
+)
+# Only applied to the prefix of keys in a sharded date partition, a dataset may itself start with shard=NN/
+SHARD_PATTERN = re.compile(r'^shard=(?P<shard>\d{%d})/(?P<dataset>.+)$' % SHARD_DIGITS)
+
+
+class KeyLayout:
+
+    def __init__(self, shard_counts: dict = None):
+        """
+        Object key layout of a data lake zone: dataset/year=YYYY/month=MM/day=DD/object, prefixed with a shard=NN/
+        prefix when the zone is sharded. The shard is a hash of the rest of the key, so writes to one date partition
+        spread evenly over the shards, and S3 scales each shard prefix separately.
+
+        Shard counts are effective from a partition date on. Raising a count only affects later partitions,
+        so the shard of every existing key stays the same.
+
+        @param shard_counts dict: Shard count per effective date (YYYY-MM-DD), unsharded if empty
+        @raises: Exception: Throws an exception if a shard count is not between 1 and MAX_SHARDS
+        """
+        self.shard_counts = sorted(
+            (datetime.datetime.strptime(effective_date, '%Y-%m-%d').date(), count)
+            for effective_date, count in (shard_counts or {}).items()
+        )
+        for effective_date, count in self.shard_counts:
+            if not 1 <= count <= MAX_SHARDS:
+                raise Exception(f'Shard count {count} from {effective_date} must be between 1 and {MAX_SHARDS}')
+
+    def get_shard_count(self, partition_date: datetime.date) -> int:
+        """
+        Returns the shard count effective for a partition date
+
+        @param partition_date datetime.date: The date partition
+        @return: int: The shard count, 0 if the layout is unsharded for that date
+        """
+        counts = [count for effective_date, count in self.shard_counts if effective_date <= partition_date]
+        return counts[-1] if counts else 0
+
+    @staticmethod
+    def get_partition(dataset: str, partition_date: datetime.date) -> str:
+        """
+        @param dataset str: The dataset, may contain slashes
+        @param partition_date datetime.date: The date partition
+
+        @return: str: The unsharded partition prefix, e.g. orders/year=2021/month=06/day=30/
+        """
+        return f'{dataset}/year={partition_date:%Y}/month={partition_date:%m}/day={partition_date:%d}/'
+
+    def build_key(self, dataset: str, partition_date: datetime.date, object_name: str) -> str:
+        """
+        Returns the object key for a dataset, date partition, and object name
+
+        @param dataset str: The dataset, may contain slashes
+        @param partition_date datetime.date: The date partition
+        @param object_name str: The object name, e.g. part-00000.parquet
+
+        @return: str: The key, e.g. shard=07/orders/year=2021/month=06/day=30/part-00000.parquet
+        """
+        key = f'{self.get_partition(dataset, partition_date)}{object_name}'
+        shard_count = self.get_shard_count(partition_date)
+        if not shard_count:
+            return key
+
+        # md5 only spreads keys evenly, it is not used for security
+        shard = int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16) % shard_count
+        return f'shard={shard:0{SHARD_DIGITS}d}/{key}'
+
+    def parse_key(self, key: str) -> dict:
+        """
+        Splits an object key into its parts
+
+        @param key str: The object key
+
+        @raises: Exception: Throws an exception if the key does not follow the layout
+        @return: dict: shard (None if unsharded), dataset, date, and object_name
+        """
+        match = KEY_PATTERN.match(key)
+        if not match:
+            raise Exception(f'Key {key} does not follow the key layout')
+        partition_date = datetime.date(int(match.group('year')), int(match.group('month')), int(match.group('day')))
+        shard, dataset = None, match.group('prefix')
+        if self.get_shard_count(partition_date):
+            shard_match = SHARD_PATTERN.match(dataset)
+            if not shard_match:
+                raise Exception(f'Key {key} has no shard prefix although its date partition is sharded')
+            shard, dataset = int(shard_match.group('shard')), shard_match.group('dataset')
+        if key != self.build_key(dataset, partition_date, match.group('object_name')):
+            raise Exception(f'Key {key} is not in the shard the key layout assigns it to')
+
+        return {
+            'shard': shard,
+            'dataset': dataset,
+            'date': partition_date,
+            'object_name': match.group('object_name'),
+        }
+
+    def get_partition_prefixes(self, dataset: str, start_date: datetime.date, end_date: datetime.date = None) -> list:
+        """
+        Enumerates the prefixes that hold the objects of a dataset's date partitions, one per shard and date,
+        so readers can list all shards in parallel
+
+        @param dataset str: The dataset, may contain slashes
+        @param start_date datetime.date: The first date partition
+        @param end_date datetime.date: The last date partition, inclusive, defaults to start_date
+
+        @return: list: The prefixes, e.g. shard=00/orders/year=2021/month=06/day=30/
+        """
+        prefixes = []
+        partition_date = start_date
+        while partition_date <= (end_date or start_date):
+            partition = self.get_partition(dataset, partition_date)
+            shard_count = self.get_shard_count(partition_date)
+            if shard_count:
+                prefixes += [f'shard={shard:0{SHARD_DIGITS}d}/{partition}' for shard in range(shard_count)]
+            else:
+                prefixes.append(partition)
+            partition_date += datetime.timedelta(days=1)
+
+        return prefixes
+
+    def to_dict(self) -> dict:
+        """
+        @return: dict: Shard count per effective date, the format of the zone's configuration
+        """
+        return {effective_date.isoformat(): count for effective_date, count in self.shard_counts}
+
+
+def get_key_layouts(environment: str) -> dict:
+    """
+    Returns the key layout of every zone of the target environment from configuration
+
+    @param environment str: The target environment
+    @return: dict: KeyLayout per zone
+    """
+    zone_layouts = get_environment_configuration(environment)[KEY_LAYOUT]
+    return {zone: KeyLayout(zone_layouts.get(zone)) for zone in DATA_LAKE_ZONES}
+
+
+def dump_key_layouts(key_layouts: dict) -> str:
+    """
+    Serializes key layouts, as published in the s3_key_layout SSM parameter
+
+    @param key_layouts dict: KeyLayout per zone
+    @return: str: JSON
+    """
+    return json.dumps({zone: layout.to_dict() for zone, layout in key_layouts.items()}, sort_keys=True)
+
+
+def load_key_layouts(value: str) -> dict:
+    """
+    Loads the key layouts published in the s3_key_layout SSM parameter, e.g. resolved with OutputResolver
+
+    @param value str: JSON, see dump_key_layouts
+    @return: dict: KeyLayout per zone
+    """
+    return {zone: KeyLayout(shard_counts) for zone, shard_counts in json.loads(value).items()}
+
+
+def find_past_layout_changes(published_layouts: dict, configured_layouts: dict, zones_with_data: set,
+                             today: datetime.date = None) -> list:
+    """
+    Compares the configured key layouts with the published ones. A shard count that is added, changed or removed
+    with an effective date up to today would move keys that were already written, so for zones that hold data
+    every such change must be effective from a future date.
+
+    @param published_layouts dict: KeyLayout per zone, as currently published, see load_key_layouts
+    @param configured_layouts dict: KeyLayout per zone, as configured, see get_key_layouts
+    @param zones_with_data set: The zones whose bucket holds objects
+    @param today datetime.date: The current date, defaults to today
+
+    @return: list: (zone, effective date, problem) tuples, empty if the change is safe
+    """
+    today = today or datetime.date.today()
+    changes = []
+    for zone in sorted(zones_with_data):
+        published = set(published_layouts[zone].shard_counts) if zone in published_layouts else set()
+        configured = set(configured_layouts[zone].shard_counts) if zone in configured_layouts else set()
+        changes += [
+            (zone, effective_date, f'shard count {count} added with a past effective date')
+            for effective_date, count in sorted(configured - published) if effective_date <= today
+        ]
+        changes += [
+            (zone, effective_date, f'shard count {count} removed although it is in effect')
+            for effective_date, count in sorted(published - configured) if effective_date <= today
+        ]
+
+    return changes
+
+
+def check_key_layouts(environment: str, session_cache: SessionCache = None, profile_name: str = None,
+                      today: datetime.date = None):
+    """
+    Checks the configured key layouts of an environment against the layouts published by its deployed stack,
+    before deploying a changed layout
+
+    @param environment str: The target environment
+    @param session_cache SessionCache: Shared sessions and clients, a new cache is used if not provided
+    @param profile_name str: The named profile for the target account
+    @param today datetime.date: The current date, defaults to today
+
+    @raises: Exception: Throws an exception listing the changes with past effective dates in zones that hold data
+    """
+    session_cache = session_cache or SessionCache()
+    mappings = get_environment_configuration(environment)
+
+    ssm_client = session_cache.client('ssm', profile_name, mappings[REGION])
+    s3_client = session_cache.client('s3', profile_name, mappings[REGION])
+
+    parameter_name = f'{get_output_parameter_path(environment)}/{S3_KEY_LAYOUT}'
+    try:
+        published_layouts = load_key_layouts(ssm_client.get_parameter(Name=parameter_name)['Parameter']['Value'])
+    except ssm_client.exceptions.ParameterNotFound:
+        # Nothing is deployed yet
+        published_layouts = {}
+
+    zones_with_data = set()
+    for zone in DATA_LAKE_ZONES:
+        bucket = get_bucket_name(environment, zone, mappings[ACCOUNT_ID], mappings[REGION])
+        try:
+            if s3_client.list_objects_v2(Bucket=bucket, MaxKeys=1).get('KeyCount', 0):
+                zones_with_data.add(zone)
+        except s3_client.exceptions.NoSuchBucket:
+            continue
+
+    changes = find_past_layout_changes(published_layouts, get_key_layouts(environment), zones_with_data, today)
+    if changes:
+        raise Exception(
+            f'The key layout of {environment} changes keys that were already written, '
+            'use an effective date in the future:\n'
+            + '\n'.join(f'{zone} {effective_date}: {problem}' for zone, effective_date, problem in changes)
+        )
+
+
+def list_partition_objects(s3_client, bucket: str, prefixes: list, max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """
+    Lists the objects under all prefixes concurrently, e.g. all shards of a date partition
+
+    @param s3_client: S3 client for the bucket's account and region
+    @param bucket str: The bucket name
+    @param prefixes list: The prefixes, see KeyLayout.get_partition_prefixes
+    @param max_workers int: Maximum number of concurrent listings
+
+    @raises: Exception: Throws the first exception raised by a listing
+    @return: list: The object summaries of all prefixes, in the order of prefixes
+    """
+    def list_prefix(prefix):
+        return [
+            summary
+            for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix)
+            for summary in page.get('Contents', [])
+        ]
+
+    objects = []
+    for _, summaries, error in run_concurrently(list_prefix, prefixes, max_workers):
+        if error:
+            raise error
+        objects += summaries
+
+    return objects
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks that a changed key layout only shards partitions from a future date in zones with data'
+    )
+    parser.add_argument('--environment', choices=[DEV, TEST, PROD], required=True)
+    parser.add_argument('--profile', help='Named profile for the target account')
+    arguments = parser.parse_args()
+
+    try:
+        check_key_layouts(arguments.environment, profile_name=arguments.profile)
+    except Exception as layout_error:
+        print(layout_error)
+        sys.exit(1)
+    print(f'The key layout of {arguments.environment} can be deployed')
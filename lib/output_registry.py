@@ -0,0 +1,56 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import aws_cdk.core as cdk
+import aws_cdk.aws_ssm as ssm
+
+from .configuration import ENVIRONMENT, get_output_parameter_path
+
+
+def publish_output(scope: cdk.Construct, construct_id: str, value: str, output_key: str, mappings: dict,
+                   export: bool = True):
+    """
+    Publishes a stack output both as a CloudFormation export and as an SSM parameter in the environment's
+    parameter hierarchy, so consumers can resolve it without Fn::ImportValue (see output_resolver.py)
+
+    @param scope cdk.Construct: The stack the output belongs to
+    @param construct_id str: The construct id of the output
+    @param value str: The output value
+    @param output_key str: The configuration key of the output, e.g. vpc_id
+    @param mappings dict: The environment configuration, see get_environment_configuration
+    @param export bool: Also export the output. Values that change between deployments, e.g. the key layout,
+        are only published to SSM, since an export cannot be updated while another stack imports it
+    """
+    description = f'Value of the stack output {output_key}'
+    if export:
+        cdk.CfnOutput(
+            scope,
+            construct_id,
+            value=value,
+            export_name=mappings[output_key],
+        )
+        description = f'Value of the CloudFormation export {mappings[output_key]}'
+    ssm.StringParameter(
+        scope,
+        f'{construct_id}Parameter',
+        parameter_name=f'{get_output_parameter_path(mappings[ENVIRONMENT])}/{output_key}',
+        string_value=value,
+        description=description,
+    )
+
+
+def import_output(scope: cdk.Construct, output_key: str, target_environment: str) -> str:
+    """
+    Returns a token for a stack output of the environment, read from its SSM parameter when the consuming stack
+    is deployed. Unlike a construct reference or Fn::ImportValue, this adds no export that locks the producing stack.
+    The consuming stack must depend on the producing stack, see cdk.Stack.add_dependency.
+
+    @param scope cdk.Construct: The consuming construct
+    @param output_key str: The configuration key of the output, e.g. vpc_id
+    @param target_environment str: The environment of the producing stack
+
+    @return: str: The token
+    """
+    return ssm.StringParameter.value_for_string_parameter(
+        scope, f'{get_output_parameter_path(target_environment)}/{output_key}'
+    )
@@ -0,0 +1,127 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import time
+
+from .configuration import ACCOUNT_ID, REGION, get_environment_configuration, get_output_parameter_path
+from .sessions import SessionCache
+
+DEFAULT_CACHE_FILE = 'cdk.context.json'
+DEFAULT_TTL_SECONDS = 3600
+
+
+class OutputResolver:
+
+    def __init__(self, environment: str, ssm_client=None, cache_file: str = DEFAULT_CACHE_FILE,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS, clock=time.time, session_cache: SessionCache = None,
+                 profile_name: str = None):
+        """
+        Resolves the infrastructure outputs of an environment from its SSM parameter hierarchy.
+        The whole hierarchy is fetched with one paginated GetParametersByPath call and cached in a
+        cdk.context.json style file, keyed like CDK context lookups. Cached values are used until the TTL expires,
+        so a warm cache resolves every output without an API call.
+
+        @param environment str: The target environment whose outputs to resolve
+        @param ssm_client: SSM client for the environment's account and region, taken from the session cache
+            on first use if not provided
+        @param cache_file str: The JSON file to cache values in, None disables the cache
+        @param ttl_seconds int: Seconds after which cached values are fetched again
+        @param clock: Callable returning the current epoch seconds, replaceable in tests
+        @param session_cache SessionCache: Shared sessions and clients, a new cache is used if not provided
+        @param profile_name str: The named profile for the environment's account
+        """
+        mappings = get_environment_configuration(environment)
+        self.account_id = mappings[ACCOUNT_ID]
+        self.region = mappings[REGION]
+        self.path = get_output_parameter_path(environment)
+        self.ssm_client = ssm_client
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.session_cache = session_cache
+        self.profile_name = profile_name
+        self.values = None
+
+    @property
+    def cache_key(self) -> str:
+        """
+        The key of this environment's entry in the cache file
+        """
+        return f'ssm-parameters-by-path:account={self.account_id}:path={self.path}:region={self.region}'
+
+    def get(self, output_key: str) -> str:
+        """
+        Returns one output value
+
+        @param output_key str: The configuration key of the output, e.g. vpc_id
+
+        @raises: KeyError: Throws an exception if the output is not published
+        @return: str: The output value
+        """
+        values = self.get_all()
+        if output_key not in values:
+            raise KeyError(f'Output {output_key} is not published under {self.path}')
+
+        return values[output_key]
+
+    def get_all(self) -> dict:
+        """
+        Returns all output values, from memory, the cache file, or SSM in that order
+
+        @return: dict: Output value per configuration key
+        """
+        if self.values is None:
+            entry = self.read_cache().get(self.cache_key)
+            if entry and self.clock() - entry['fetchedAt'] < self.ttl_seconds:
+                self.values = entry['values']
+            else:
+                self.refresh()
+
+        return self.values
+
+    def refresh(self) -> dict:
+        """
+        Fetches all output values from SSM and updates the cache file
+
+        @return: dict: Output value per configuration key
+        """
+        if self.ssm_client is None:
+            self.session_cache = self.session_cache or SessionCache()
+            self.ssm_client = self.session_cache.client('ssm', self.profile_name, self.region)
+        values = {}
+        paginator = self.ssm_client.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=self.path, Recursive=True):
+            values.update({
+                parameter['Name'][len(self.path) + 1:]: parameter['Value'] for parameter in page['Parameters']
+            })
+        self.values = values
+        self.write_cache({'values': values, 'fetchedAt': self.clock()})
+
+        return values
+
+    def read_cache(self) -> dict:
+        """
+        Reads the cache file
+
+        @return: dict: The cache file contents, empty if there is no cache file
+        """
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file) as cache:
+            return json.load(cache)
+
+    def write_cache(self, entry: dict):
+        """
+        Stores this environment's entry in the cache file, keeping all other entries
+
+        @param entry dict: The values and the time they were fetched
+        """
+        if not self.cache_file:
+            return
+        contents = {**self.read_cache(), self.cache_key: entry}
+        temporary_file = f'{self.cache_file}.tmp'
+        with open(temporary_file, 'w') as cache:
+            json.dump(contents, cache, indent=2, sort_keys=True)
+        os.replace(temporary_file, self.cache_file)
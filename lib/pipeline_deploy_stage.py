@@ -4,8 +4,9 @@
 import aws_cdk.core as cdk
 from .vpc_stack import VpcStack
 from .s3_bucket_zones_stack import S3BucketZonesStack
+from .compaction_stack import CompactionStack
 from .tagging import tag
-from .configuration import get_logical_id_prefix
+from .configuration import COMPACTION_STACK, S3_BUCKET_ZONES_STACK, VPC_STACK, get_stack_ids
 
 
 class PipelineDeployStage(cdk.Stage):
@@ -27,17 +28,17 @@ class PipelineDeployStage(cdk.Stage):
         """
         super().__init__(scope, construct_id, **kwargs)
 
-        logical_id_prefix = get_logical_id_prefix()
+        stack_ids = get_stack_ids(target_environment)
 
         vpc_stack = VpcStack(
             self,
-            f'{target_environment}{logical_id_prefix}InfrastructureVpc',
+            stack_ids[VPC_STACK],
             target_environment=target_environment,
             **kwargs,
         )
         bucket_stack = S3BucketZonesStack(
             self,
-            f'{target_environment}{logical_id_prefix}InfrastructureS3BucketZones',
+            stack_ids[S3_BUCKET_ZONES_STACK],
             target_environment=target_environment,
             deployment_account_id=deployment_account_id,
             **kwargs,
@@ -45,3 +46,15 @@ class PipelineDeployStage(cdk.Stage):
 
         tag(vpc_stack, target_environment)
         tag(bucket_stack, target_environment)
+
+        if COMPACTION_STACK in stack_ids:
+            compaction_stack = CompactionStack(
+                self,
+                stack_ids[COMPACTION_STACK],
+                target_environment=target_environment,
+                **kwargs,
+            )
+            # Reads the outputs of the other stacks from SSM, so the order is not implied by references
+            compaction_stack.add_dependency(vpc_stack)
+            compaction_stack.add_dependency(bucket_stack)
+            tag(compaction_stack, target_environment)
@@ -0,0 +1,89 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import aws_cdk.core as cdk
+import aws_cdk.pipelines as pipelines
+import aws_cdk.aws_codepipeline as codepipeline
+import aws_cdk.aws_codepipeline_actions as codepipeline_actions
+
+from .configuration import (
+    CODESTAR_CONNECTION_ARN, DEPLOYMENT, GITHUB_REPOSITORY_NAME, GITHUB_REPOSITORY_OWNER_NAME, GITHUB_TOKEN,
+    SOURCE_EXCLUDE_PATHS, SOURCE_INCLUDE_PATHS, get_all_configurations,
+)
+
+SOURCE_ACTION_NAME = 'GitHub'
+
+
+def create_source_action(target_branch: str, source_artifact: codepipeline.Artifact) -> codepipeline.IAction:
+    """
+    Creates the source action for an environment pipeline.
+    When a CodeStar connection is configured the action is connection-based and path filters can be applied
+    (see apply_source_path_filters), otherwise a GitHub webhook triggers the pipeline on push.
+
+    @param target_branch str: The source branch to watch
+    @param source_artifact codepipeline.Artifact: The artifact the source action outputs to
+
+    @return: codepipeline.IAction: The source action
+    """
+    mappings = get_all_configurations()
+    connection_arn = mappings[DEPLOYMENT][CODESTAR_CONNECTION_ARN]
+    if connection_arn:
+        return codepipeline_actions.CodeStarConnectionsSourceAction(
+            action_name=SOURCE_ACTION_NAME,
+            connection_arn=connection_arn,
+            branch=target_branch,
+            output=source_artifact,
+            owner=mappings[DEPLOYMENT][GITHUB_REPOSITORY_OWNER_NAME],
+            repo=mappings[DEPLOYMENT][GITHUB_REPOSITORY_NAME],
+        )
+
+    return codepipeline_actions.GitHubSourceAction(
+        action_name=SOURCE_ACTION_NAME,
+        branch=target_branch,
+        output=source_artifact,
+        oauth_token=cdk.SecretValue.secrets_manager(
+            mappings[DEPLOYMENT][GITHUB_TOKEN]
+        ),
+        trigger=codepipeline_actions.GitHubTrigger.WEBHOOK,
+        owner=mappings[DEPLOYMENT][GITHUB_REPOSITORY_OWNER_NAME],
+        repo=mappings[DEPLOYMENT][GITHUB_REPOSITORY_NAME],
+    )
+
+
+def apply_source_path_filters(pipeline: pipelines.CdkPipeline, target_environment: str, target_branch: str):
+    """
+    Restricts the pipeline to push events that touch the include/exclude paths configured for the environment.
+    Path filtering is a pipeline trigger feature of CodePipeline V2 pipelines with a connection-based source,
+    so this is a no-op when no CodeStar connection is configured.
+
+    @param pipeline pipelines.CdkPipeline: The environment pipeline
+    @param target_environment str: The target environment for stacks in the deploy stage
+    @param target_branch str: The source branch to watch
+    """
+    mappings = get_all_configurations()
+    if not mappings[DEPLOYMENT][CODESTAR_CONNECTION_ARN]:
+        return
+
+    file_paths = {}
+    if mappings[target_environment][SOURCE_INCLUDE_PATHS]:
+        file_paths['Includes'] = mappings[target_environment][SOURCE_INCLUDE_PATHS]
+    if mappings[target_environment][SOURCE_EXCLUDE_PATHS]:
+        file_paths['Excludes'] = mappings[target_environment][SOURCE_EXCLUDE_PATHS]
+    if not file_paths:
+        return
+
+    push_filter = {
+        'Branches': {'Includes': [target_branch]},
+        'FilePaths': file_paths,
+    }
+    cfn_pipeline = pipeline.code_pipeline.node.default_child
+    cfn_pipeline.add_property_override('PipelineType', 'V2')
+    cfn_pipeline.add_property_override('Triggers', [
+        {
+            'ProviderType': 'CodeStarSourceConnection',
+            'GitConfiguration': {
+                'SourceActionName': SOURCE_ACTION_NAME,
+                'Push': [push_filter],
+            },
+        },
+    ])
@@ -5,13 +5,12 @@ import aws_cdk.core as cdk
 import aws_cdk.pipelines as pipelines
 import aws_cdk.aws_iam as iam
 import aws_cdk.aws_codepipeline as codepipeline
-import aws_cdk.aws_codepipeline_actions as codepipeline_actions
 
 from .configuration import (
-    DEPLOYMENT, GITHUB_REPOSITORY_NAME, GITHUB_REPOSITORY_OWNER_NAME, GITHUB_TOKEN,
-    get_logical_id_prefix, get_resource_name_prefix, get_all_configurations
+    QUOTA_PREFLIGHT, get_logical_id_prefix, get_pipeline_name, get_all_configurations
 )
 from .pipeline_deploy_stage import PipelineDeployStage
+from .pipeline_source import apply_source_path_filters, create_source_action
 
 
 class PipelineStack(cdk.Stack):
@@ -29,7 +28,7 @@ class PipelineStack(cdk.Stack):
             The construct ID of this stack. If stackName is not explicitly defined,
             this id (and any parent IDs) will be used to determine the physical ID of the stack.
         @param target_environment str: The target environment for stacks in the deploy stage
-        @param target_branch str: The source branch for polling
+        @param target_branch str: The source branch that triggers the pipeline
         @param target_aws_env dict: The CDK env variable used for stacks in the deploy stage
         """
         super().__init__(scope, construct_id, **kwargs)
@@ -47,29 +46,27 @@ class PipelineStack(cdk.Stack):
         Code Pipeline, Code Build, and ancillary resources.
 
         @param target_environment str: The target environment for stacks in the deploy stage
-        @param target_branch str: The source branch for polling
+        @param target_branch str: The source branch that triggers the pipeline
         @param target_aws_env dict: The CDK env variable used for stacks in the deploy stage
         """
         source_artifact = codepipeline.Artifact()
         cloud_assembly_artifact = codepipeline.Artifact()
         logical_id_prefix = get_logical_id_prefix()
-        resource_name_prefix = get_resource_name_prefix()
+        synth_command = f'export ENV={target_environment} && cdk synth --verbose'
+        if self.mappings[target_environment][QUOTA_PREFLIGHT]:
+            # Fails the synth step, and so stops the pipeline, before any stack is deployed
+            synth_command += (
+                f' && python3 -m lib.prerequisites.preflight_quota_check'
+                f' --environment {target_environment} --assume-lookup-role'
+            )
+        # Every stage downloads and decrypts the cloud assembly, so only what this pipeline deploys is kept
+        synth_command += f' && python3 -m lib.tools.prune_cloud_assembly cdk.out --environment {target_environment}'
         pipeline = pipelines.CdkPipeline(
             self,
             f'{target_environment}{logical_id_prefix}InfrastructurePipeline',
-            pipeline_name=f'{target_environment.lower()}-{resource_name_prefix}-infrastructure-pipeline',
+            pipeline_name=get_pipeline_name(target_environment),
             cloud_assembly_artifact=cloud_assembly_artifact,
-            source_action=codepipeline_actions.GitHubSourceAction(
-                action_name='GitHub',
-                branch=target_branch,
-                output=source_artifact,
-                oauth_token=cdk.SecretValue.secrets_manager(
-                    self.mappings[DEPLOYMENT][GITHUB_TOKEN]
-                ),
-                trigger=codepipeline_actions.GitHubTrigger.POLL,
-                owner=self.mappings[DEPLOYMENT][GITHUB_REPOSITORY_OWNER_NAME],
-                repo=self.mappings[DEPLOYMENT][GITHUB_REPOSITORY_NAME],
-            ),
+            source_action=create_source_action(target_branch, source_artifact),
             synth_action=pipelines.SimpleSynthAction.standard_npm_synth(
                 source_artifact=source_artifact,
                 cloud_assembly_artifact=cloud_assembly_artifact,
@@ -126,10 +123,11 @@ class PipelineStack(cdk.Stack):
                         ],
                     ),
                 ],
-                synth_command=f'export ENV={target_environment} && cdk synth --verbose',
+                synth_command=synth_command,
             ),
             cross_account_keys=True,
         )
+        apply_source_path_filters(pipeline, target_environment, target_branch)
 
         pipeline.add_application_stage(
             PipelineDeployStage(
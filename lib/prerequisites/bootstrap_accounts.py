@@ -0,0 +1,249 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import os
+import subprocess
+import sys
+
+from botocore.exceptions import ClientError
+
+from lib.configuration import (
+    ACCOUNT_ID, DEPLOYMENT, DEV, GITHUB_TOKEN, PROD, REGION, TEST, get_all_configurations
+)
+from lib.reporting import format_table
+from lib.sessions import SessionCache, run_concurrently
+
+BOOTSTRAP_STACK_NAME = 'CDKToolkit'
+# New-style synthesis used by CDK Pipelines requires version 6, the lookup role assumed by the pipeline's quota
+# preflight check exists from version 8
+MINIMUM_BOOTSTRAP_VERSION = 8
+DEFAULT_EXECUTION_POLICY = 'arn:aws:iam::aws:policy/AdministratorAccess'
+# Environment variable holding the GitHub token pushed to the Deployment account
+GITHUB_TOKEN_VARIABLE = 'MY_GITHUB_TOKEN'
+
+OK = 'ok'
+SKIPPED = 'skipped'
+FAILED = 'FAILED'
+
+
+def verify_credentials(sts_client, expected_account_id: str) -> str:
+    """
+    Verifies that the credentials in use belong to the configured account
+
+    @param sts_client: STS client for the account
+    @param expected_account_id str: The account id from configuration
+
+    @raises: Exception: Throws an exception if the credentials belong to another account
+    @return: str: The ARN of the caller
+    """
+    identity = sts_client.get_caller_identity()
+    if expected_account_id and identity['Account'] != expected_account_id:
+        raise Exception(f'Credentials belong to account {identity["Account"]}, expected {expected_account_id}')
+
+    return identity['Arn']
+
+
+def put_secret(secrets_manager_client, secret_name: str, secret_value: str) -> str:
+    """
+    Creates the secret, or stores a new version if the secret exists with a different value
+
+    @param secrets_manager_client: Secrets Manager client for the account
+    @param secret_name str: The name of the secret
+    @param secret_value str: The value of the secret
+
+    @return: str: created, updated or unchanged
+    """
+    try:
+        current_value = secrets_manager_client.get_secret_value(SecretId=secret_name)['SecretString']
+    except secrets_manager_client.exceptions.ResourceNotFoundException:
+        secrets_manager_client.create_secret(Name=secret_name, SecretString=secret_value)
+        return 'created'
+
+    if current_value == secret_value:
+        return 'unchanged'
+    secrets_manager_client.put_secret_value(SecretId=secret_name, SecretString=secret_value)
+
+    return 'updated'
+
+
+def get_bootstrap_version(cloudformation_client) -> int:
+    """
+    Returns the version of the CDK bootstrap stack in the account and region
+
+    @param cloudformation_client: CloudFormation client for the account and region
+
+    @return: int: The bootstrap version, 0 if the account is not bootstrapped
+    """
+    try:
+        stacks = cloudformation_client.describe_stacks(StackName=BOOTSTRAP_STACK_NAME)['Stacks']
+    except ClientError as error:
+        if 'does not exist' in str(error):
+            return 0
+        raise
+
+    outputs = {output['OutputKey']: output['OutputValue'] for output in stacks[0].get('Outputs', [])}
+
+    return int(outputs.get('BootstrapVersion', 0))
+
+
+def run_cdk_bootstrap(environment: str, profile_name: str, account_id: str, region: str,
+                      deployment_account_id: str, execution_policy: str):
+    """
+    Runs cdk bootstrap for one account. Deployment is bootstrapped with the standard template, target accounts
+    trust the Deployment account. Every run writes to its own output directory so runs do not collide.
+
+    @param environment str: The environment of the account
+    @param profile_name str: The named profile for the account
+    @param account_id str: The account id
+    @param region str: The region to bootstrap
+    @param deployment_account_id str: The id of the central Deployment account
+    @param execution_policy str: The CloudFormation execution policy for target accounts
+
+    @raises: Exception: Throws an exception if cdk bootstrap fails
+    """
+    command = ['cdk', 'bootstrap', f'aws://{account_id}/{region}', '--output', f'cdk.out.bootstrap.{environment}']
+    if environment != DEPLOYMENT:
+        command += ['--trust', deployment_account_id, '--cloudformation-execution-policies', execution_policy]
+    env = {**os.environ, 'CDK_NEW_BOOTSTRAP': '1', 'IS_BOOTSTRAP': '1'}
+    if profile_name:
+        env['AWS_PROFILE'] = profile_name
+    result = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if result.returncode != 0:
+        raise Exception(f'cdk bootstrap failed:\n{result.stdout}')
+
+
+def prepare_account(session_cache: SessionCache, mappings: dict, environment: str, profile_name: str,
+                    secrets: dict, bootstrap: bool, execution_policy: str) -> dict:
+    """
+    Verifies credentials, pushes secrets (Deployment account only) and checks or runs the bootstrap
+    for one account. Failures are recorded in the returned status instead of raised,
+    so that one account does not stop the others.
+
+    @param session_cache SessionCache: Shared sessions and clients
+    @param mappings dict: All configurations, see get_all_configurations
+    @param environment str: The environment of the account
+    @param profile_name str: The named profile for the account
+    @param secrets dict: Secret names and values to push to the Deployment account
+    @param bootstrap bool: Run cdk bootstrap when the account is not bootstrapped or outdated
+    @param execution_policy str: The CloudFormation execution policy for target accounts
+
+    @return: dict: Status per step
+    """
+    account_id = mappings[environment][ACCOUNT_ID]
+    region = mappings[environment][REGION]
+    status = {'credentials': SKIPPED, 'secrets': SKIPPED, 'bootstrap': SKIPPED}
+
+    try:
+        verify_credentials(session_cache.client('sts', profile_name, region), account_id)
+        status['credentials'] = OK
+    except Exception as error:
+        status['credentials'] = f'{FAILED}: {error}'
+        return status
+
+    if environment == DEPLOYMENT and secrets:
+        try:
+            secrets_manager_client = session_cache.client('secretsmanager', profile_name, region)
+            status['secrets'] = ', '.join(
+                f'{name} {put_secret(secrets_manager_client, name, value)}' for name, value in secrets.items()
+            )
+        except Exception as error:
+            status['secrets'] = f'{FAILED}: {error}'
+
+    try:
+        cloudformation_client = session_cache.client('cloudformation', profile_name, region)
+        version = get_bootstrap_version(cloudformation_client)
+        if version < MINIMUM_BOOTSTRAP_VERSION and bootstrap:
+            run_cdk_bootstrap(
+                environment, profile_name, account_id, region, mappings[DEPLOYMENT][ACCOUNT_ID], execution_policy
+            )
+            version = get_bootstrap_version(cloudformation_client)
+        if version >= MINIMUM_BOOTSTRAP_VERSION:
+            status['bootstrap'] = f'{OK} (version {version})'
+        elif version:
+            status['bootstrap'] = f'{FAILED}: version {version} < {MINIMUM_BOOTSTRAP_VERSION}'
+        else:
+            status['bootstrap'] = f'{FAILED}: not bootstrapped'
+    except Exception as error:
+        status['bootstrap'] = f'{FAILED}: {error}'
+
+    return status
+
+
+def prepare_accounts(profiles: dict, secrets: dict, bootstrap: bool, execution_policy: str,
+                     session_cache: SessionCache = None, mappings: dict = None) -> list:
+    """
+    Prepares all accounts concurrently
+
+    @param profiles dict: Named profile per environment, environments without a profile are skipped
+    @param secrets dict: Secret names and values to push to the Deployment account
+    @param bootstrap bool: Run cdk bootstrap when an account is not bootstrapped or outdated
+    @param execution_policy str: The CloudFormation execution policy for target accounts
+    @param session_cache SessionCache: Shared sessions and clients, a new cache is used if not provided
+    @param mappings dict: All configurations, loaded from configuration if not provided
+
+    @return: list: (environment, status) tuples
+    """
+    session_cache = session_cache or SessionCache()
+    mappings = mappings or get_all_configurations()
+    results = run_concurrently(
+        lambda environment: prepare_account(
+            session_cache, mappings, environment, profiles[environment], secrets, bootstrap, execution_policy
+        ),
+        list(profiles),
+    )
+
+    return [(environment, status) for environment, status, _ in results]
+
+
+def parse_profiles(values: list) -> dict:
+    """
+    Parses Environment=profile arguments
+
+    @param values list: The raw arguments
+
+    @raises: Exception: Throws an exception if an argument is malformed or names an unknown environment
+    @return: dict: Named profile per environment
+    """
+    profiles = {}
+    for value in values:
+        environment, separator, profile_name = value.partition('=')
+        if not separator or environment not in (DEPLOYMENT, DEV, TEST, PROD):
+            raise Exception(f'Expected Environment=profile with one of {DEPLOYMENT}, {DEV}, {TEST}, {PROD}: {value}')
+        profiles[environment] = profile_name or None
+
+    return profiles
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Verifies credentials, pushes secrets and checks the CDK bootstrap of all accounts concurrently'
+    )
+    parser.add_argument(
+        '--profile', action='append', required=True,
+        help='Environment=profile, e.g. Dev=my-dev-profile. Repeat for every account to prepare',
+    )
+    parser.add_argument('--bootstrap', action='store_true', help='Run cdk bootstrap where required')
+    parser.add_argument('--execution-policy', default=DEFAULT_EXECUTION_POLICY)
+    arguments = parser.parse_args()
+
+    all_mappings = get_all_configurations()
+    github_token = os.environ.get(GITHUB_TOKEN_VARIABLE)
+    account_secrets = {all_mappings[DEPLOYMENT][GITHUB_TOKEN]: github_token} if github_token else {}
+    account_profiles = parse_profiles(arguments.profile)
+
+    account_statuses = prepare_accounts(
+        account_profiles, account_secrets, arguments.bootstrap, arguments.execution_policy, mappings=all_mappings
+    )
+    print(format_table(
+        ['Environment', 'Account', 'Profile', 'Credentials', 'Secrets', 'Bootstrap'],
+        [
+            [
+                environment, all_mappings[environment][ACCOUNT_ID], account_profiles[environment] or 'default',
+                status['credentials'], status['secrets'], status['bootstrap'],
+            ]
+            for environment, status in account_statuses
+        ],
+    ))
+    if any(FAILED in value for _, status in account_statuses for value in status.values()):
+        sys.exit(1)
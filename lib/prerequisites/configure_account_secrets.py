@@ -7,6 +7,7 @@ import boto3
 from lib.configuration import (
     DEPLOYMENT, GITHUB_TOKEN, get_all_configurations
 )
+from lib.prerequisites.bootstrap_accounts import put_secret
 
 MY_GITHUB_TOKEN = ''
 
@@ -15,16 +16,16 @@ if __name__ == '__main__':
     if not bool(MY_GITHUB_TOKEN):
         raise Exception(f'You must provide a value for: {MY_GITHUB_TOKEN}')
 
+    session = boto3.session.Session()
+    secret_name = get_all_configurations()[DEPLOYMENT][GITHUB_TOKEN]
     response = input((
         f'Are you sure you want to add a secret to AWS Secrets Manager with name '
-        f'{get_all_configurations()[DEPLOYMENT][GITHUB_TOKEN]} '
-        f'in account: {boto3.client("sts").get_caller_identity().get("Account")}?\n\n'
+        f'{secret_name} '
+        f'in account: {session.client("sts").get_caller_identity().get("Account")}?\n\n'
         'This should be the Central Deployment Account Id\n\n'
         '(y/n)'
     ))
 
     if response.lower() == 'y':
-        secrets_manager_client = boto3.client('secretsmanager')
-        secret_name = get_all_configurations()[DEPLOYMENT][GITHUB_TOKEN]
         print(f'Pushing secret: {secret_name}')
-        secrets_manager_client.create_secret(Name=secret_name, SecretString=MY_GITHUB_TOKEN)
+        put_secret(session.client('secretsmanager'), secret_name, MY_GITHUB_TOKEN)
@@ -0,0 +1,349 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import collections
+import json
+import sys
+
+from botocore.exceptions import ClientError
+
+from lib.cloud_assembly import NESTED_STACK_RESOURCE, find_nested_templates, find_stack_templates
+from lib.configuration import (
+    ACCOUNT_ID, DEV, PROD, REGION, TEST, VPC_STACK, get_all_configurations, get_stack_names
+)
+from lib.prerequisites.bootstrap_accounts import MINIMUM_BOOTSTRAP_VERSION, parse_profiles
+from lib.reporting import format_table
+from lib.sessions import DEFAULT_MAX_WORKERS, SessionCache, run_concurrently
+
+# Role created by cdk bootstrap with read only access, trusted by the Deployment account
+LOOKUP_ROLE_ARN = 'arn:aws:iam::{account_id}:role/cdk-hnb659fds-lookup-role-{account_id}-{region}'
+
+OK = 'ok'
+EXCEEDED = 'EXCEEDED'
+ERROR = 'ERROR'
+
+QuotaCheck = collections.namedtuple(
+    'QuotaCheck', ['name', 'service_code', 'quota_code', 'default_value', 'matches', 'usage', 'per_vpc']
+)
+
+
+def is_resource_type(resource_type: str):
+    """
+    Returns a predicate matching template resources of the given type
+
+    @param resource_type str: CloudFormation resource type, e.g. AWS::EC2::VPC
+    """
+    return lambda resource: resource['Type'] == resource_type
+
+
+def is_vpc_endpoint(endpoint_type: str):
+    """
+    Returns a predicate matching VPC endpoints of the given type. Endpoints without a type are Gateway endpoints.
+
+    @param endpoint_type str: Interface or Gateway
+    """
+    return lambda resource: (
+        resource['Type'] == 'AWS::EC2::VPCEndpoint'
+        and resource.get('Properties', {}).get('VpcEndpointType', 'Gateway') == endpoint_type
+    )
+
+
+def count_paginated(client, operation: str, key: str, **kwargs) -> int:
+    """
+    Counts the items of a paginated describe/list operation
+
+    @param client: The boto3 client
+    @param operation str: The paginated operation, e.g. describe_vpcs
+    @param key str: The key of the items in every page, e.g. Vpcs
+    @param kwargs: Parameters of the operation
+
+    @return: int: The number of items
+    """
+    return sum(len(page[key]) for page in client.get_paginator(operation).paginate(**kwargs))
+
+
+QUOTA_CHECKS = [
+    QuotaCheck(
+        'VPCs per Region', 'vpc', 'L-F678F1CE', 5, is_resource_type('AWS::EC2::VPC'),
+        lambda clients: count_paginated(clients('ec2'), 'describe_vpcs', 'Vpcs'), False,
+    ),
+    QuotaCheck(
+        'Internet gateways per Region', 'vpc', 'L-A4707A72', 5, is_resource_type('AWS::EC2::InternetGateway'),
+        lambda clients: count_paginated(clients('ec2'), 'describe_internet_gateways', 'InternetGateways'), False,
+    ),
+    QuotaCheck(
+        'EC2-VPC Elastic IPs', 'ec2', 'L-0263D0A3', 5, is_resource_type('AWS::EC2::EIP'),
+        lambda clients: len(
+            clients('ec2').describe_addresses(Filters=[{'Name': 'domain', 'Values': ['vpc']}])['Addresses']
+        ),
+        False,
+    ),
+    QuotaCheck(
+        'VPC security groups per Region', 'vpc', 'L-E79EC296', 2500, is_resource_type('AWS::EC2::SecurityGroup'),
+        lambda clients: count_paginated(clients('ec2'), 'describe_security_groups', 'SecurityGroups'), False,
+    ),
+    QuotaCheck(
+        'Gateway VPC endpoints per Region', 'vpc', 'L-1B52E74A', 20, is_vpc_endpoint('Gateway'),
+        lambda clients: count_paginated(
+            clients('ec2'), 'describe_vpc_endpoints', 'VpcEndpoints',
+            Filters=[{'Name': 'vpc-endpoint-type', 'Values': ['Gateway']}],
+        ),
+        False,
+    ),
+    QuotaCheck(
+        'Interface VPC endpoints per VPC', 'vpc', 'L-29B6F2EB', 50, is_vpc_endpoint('Interface'), None, True,
+    ),
+    # KMS keys per account and Region are not reported by Service Quotas, the documented default is used
+    QuotaCheck(
+        'KMS keys', 'kms', None, 100000, is_resource_type('AWS::KMS::Key'),
+        lambda clients: count_paginated(clients('kms'), 'list_keys', 'Keys'), False,
+    ),
+    QuotaCheck(
+        'General purpose S3 buckets', 's3', 'L-DC2B2D3D', 100, is_resource_type('AWS::S3::Bucket'),
+        lambda clients: len(clients('s3').list_buckets()['Buckets']), False,
+    ),
+]
+
+
+def count_resources(templates, matches) -> int:
+    """
+    Counts the resources matching the predicate across templates
+
+    @param templates: CloudFormation templates
+    @param matches: Predicate taking a template resource
+
+    @return: int: The number of matching resources
+    """
+    return sum(
+        1 for template in templates for resource in template.get('Resources', {}).values() if matches(resource)
+    )
+
+
+def get_deployed_template(cloudformation_client, stack_name: str) -> dict:
+    """
+    Returns the template of the deployed stack
+
+    @param cloudformation_client: CloudFormation client for the target account and region
+    @param stack_name str: The stack name
+
+    @return: dict: The deployed template, empty if the stack does not exist yet
+    """
+    try:
+        template_body = cloudformation_client.get_template(StackName=stack_name)['TemplateBody']
+    except ClientError as error:
+        if 'does not exist' in str(error):
+            return {}
+        raise
+
+    # The SDK decodes JSON templates, YAML templates are returned as a string
+    return json.loads(template_body) if isinstance(template_body, str) else template_body
+
+
+def get_deployed_templates(cloudformation_client, stack_name: str) -> list:
+    """
+    Returns the template of the deployed stack and the templates of its deployed nested stacks
+
+    @param cloudformation_client: CloudFormation client for the target account and region
+    @param stack_name str: The stack name or id
+
+    @return: list: The deployed templates, empty if the stack does not exist yet
+    """
+    template = get_deployed_template(cloudformation_client, stack_name)
+    if not template:
+        return []
+    templates = [template]
+    if any(resource['Type'] == NESTED_STACK_RESOURCE for resource in template.get('Resources', {}).values()):
+        for page in cloudformation_client.get_paginator('list_stack_resources').paginate(StackName=stack_name):
+            for summary in page['StackResourceSummaries']:
+                if summary['ResourceType'] == NESTED_STACK_RESOURCE and summary.get('PhysicalResourceId'):
+                    templates += get_deployed_templates(cloudformation_client, summary['PhysicalResourceId'])
+
+    return templates
+
+
+def load_synthesized_templates(cdk_out: str, stack_names) -> dict:
+    """
+    Returns the synthesized templates of the given stacks, including the templates of their nested stacks,
+    so resources that stack_sharding.py moved to nested stacks are counted too
+
+    @param cdk_out str: The cloud assembly directory containing the synthesized templates
+    @param stack_names: CloudFormation stack names to look for
+
+    @return: dict: List of templates per stack name, the stack's own template first
+    """
+    nested_templates = find_nested_templates(cdk_out, stack_names)
+    return {
+        stack_name: [template, *nested_templates[stack_name]]
+        for stack_name, template in find_stack_templates(cdk_out, stack_names).items()
+    }
+
+
+def get_quota_value(service_quotas_client, check: QuotaCheck) -> float:
+    """
+    Returns the applied quota, falling back to the AWS default and then to the documented default
+
+    @param service_quotas_client: Service Quotas client for the target account and region
+    @param check QuotaCheck: The quota to look up
+
+    @return: float: The quota value
+    """
+    if not check.quota_code:
+        return check.default_value
+    try:
+        return service_quotas_client.get_service_quota(
+            ServiceCode=check.service_code, QuotaCode=check.quota_code
+        )['Quota']['Value']
+    except ClientError:
+        pass
+    try:
+        return service_quotas_client.get_aws_default_service_quota(
+            ServiceCode=check.service_code, QuotaCode=check.quota_code
+        )['Quota']['Value']
+    except ClientError:
+        return check.default_value
+
+
+def run_check(clients, check: QuotaCheck, required: int) -> dict:
+    """
+    Compares the resources a deployment adds against quota and current usage
+
+    @param clients: Callable returning a client for a service in the target account and region
+    @param check QuotaCheck: The quota to check
+    @param required int: The number of resources the deployment adds, or the total per VPC for per_vpc checks
+
+    @return: dict: The check result
+    """
+    limit = get_quota_value(clients('service-quotas'), check)
+    usage = 0 if check.per_vpc else check.usage(clients)
+    return {
+        'required': required,
+        'usage': usage,
+        'limit': limit,
+        'status': OK if usage + required <= limit else EXCEEDED,
+    }
+
+
+def check_environment(session_cache: SessionCache, mappings: dict, environment: str, cdk_out: str,
+                      profile_name: str = None, role_arn: str = None, max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """
+    Checks all quotas for one environment. The resources a deployment adds are the resources of the synthesized
+    templates minus the resources of the currently deployed stacks, both including nested stacks.
+    Quotas are checked concurrently.
+
+    @param session_cache SessionCache: Shared sessions and clients
+    @param mappings dict: All configurations, see get_all_configurations
+    @param environment str: The target environment
+    @param cdk_out str: The cloud assembly directory containing the synthesized templates
+    @param profile_name str: The named profile for the target account
+    @param role_arn str: Optional role to assume in the target account
+    @param max_workers int: Maximum number of concurrent quota checks, 1 makes the call order deterministic
+
+    @raises: Exception: Throws an exception if the environment's stacks are not in the cloud assembly
+    @return: list: (check, result, exception) tuples
+    """
+    region = mappings[environment][REGION]
+    stack_names = get_stack_names(environment)
+    stack_templates = load_synthesized_templates(cdk_out, stack_names.values())
+    if not stack_templates:
+        raise Exception(f'No synthesized stacks for {environment} in {cdk_out}, run cdk synth with ENV={environment}')
+
+    def clients(service_name):
+        return session_cache.client(service_name, profile_name, region, role_arn)
+
+    templates = [template for templates in stack_templates.values() for template in templates]
+    deployed_templates = [
+        template
+        for stack_name in stack_templates for template in get_deployed_templates(clients('cloudformation'), stack_name)
+    ]
+    vpc_templates = stack_templates.get(stack_names[VPC_STACK], [])
+
+    def required(check):
+        if check.per_vpc:
+            return count_resources(vpc_templates, check.matches)
+        return max(
+            0, count_resources(templates, check.matches) - count_resources(deployed_templates, check.matches)
+        )
+
+    return run_concurrently(lambda check: run_check(clients, check, required(check)), QUOTA_CHECKS, max_workers)
+
+
+def check_environments(environments: list, cdk_out: str, profiles: dict = None, assume_lookup_role: bool = False,
+                       session_cache: SessionCache = None, mappings: dict = None,
+                       max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """
+    Checks all quotas for the environments concurrently
+
+    @param environments list: The target environments
+    @param cdk_out str: The cloud assembly directory containing the synthesized templates
+    @param profiles dict: Named profile per environment, the default credential chain is used if not provided
+    @param assume_lookup_role bool: Assume the CDK bootstrap lookup role in each target account
+    @param session_cache SessionCache: Shared sessions and clients, a new cache is used if not provided
+    @param mappings dict: All configurations, loaded from configuration if not provided
+    @param max_workers int: Maximum number of concurrent environments and quota checks per environment
+
+    @return: list: (environment, check name, result) tuples, result has a status and either counts or an error
+    """
+    session_cache = session_cache or SessionCache()
+    mappings = mappings or get_all_configurations()
+    profiles = profiles or {}
+
+    def check(environment):
+        role_arn = None
+        if assume_lookup_role:
+            role_arn = LOOKUP_ROLE_ARN.format(
+                account_id=mappings[environment][ACCOUNT_ID], region=mappings[environment][REGION]
+            )
+            try:
+                session_cache.session(profiles.get(environment), mappings[environment][REGION], role_arn)
+            except ClientError as error:
+                raise Exception(
+                    f'Could not assume {role_arn}, the lookup role exists from CDK bootstrap version '
+                    f'{MINIMUM_BOOTSTRAP_VERSION}, re-bootstrap the account with bootstrap_accounts.py --bootstrap: '
+                    f'{error}'
+                )
+        return check_environment(
+            session_cache, mappings, environment, cdk_out, profiles.get(environment), role_arn, max_workers
+        )
+
+    report = []
+    for environment, checks, error in run_concurrently(check, environments, max_workers):
+        if error:
+            report.append((environment, '-', {'status': ERROR, 'error': error}))
+            continue
+        for quota_check, result, check_error in checks:
+            report.append((
+                environment, quota_check.name, result if not check_error else {'status': ERROR, 'error': check_error}
+            ))
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks service quotas in the target accounts against the synthesized stacks before deployment'
+    )
+    parser.add_argument('--environment', action='append', choices=[DEV, TEST, PROD], required=True)
+    parser.add_argument('--cdk-out', default='cdk.out', help='Cloud assembly directory produced by cdk synth')
+    parser.add_argument('--profile', action='append', default=[], help='Environment=profile, e.g. Dev=my-dev-profile')
+    parser.add_argument(
+        '--assume-lookup-role', action='store_true',
+        help='Assume the CDK bootstrap lookup role in each target account, e.g. from the pipeline synth step',
+    )
+    arguments = parser.parse_args()
+
+    quota_report = check_environments(
+        arguments.environment, arguments.cdk_out, parse_profiles(arguments.profile), arguments.assume_lookup_role
+    )
+    print(format_table(
+        ['Environment', 'Quota', 'Required', 'Usage', 'Limit', 'Status'],
+        [
+            [
+                environment, name, result.get('required', '-'), result.get('usage', '-'), result.get('limit', '-'),
+                result['status'] if 'error' not in result else f'{result["status"]}: {result["error"]}',
+            ]
+            for environment, name, result in quota_report
+        ],
+    ))
+    if any(result['status'] != OK for _, _, result in quota_report):
+        sys.exit(1)
@@ -0,0 +1,48 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Percentiles reported by the tools, e.g. pipeline durations and S3 request latencies
+PERCENTILES = (50, 90, 99)
+
+
+def format_table(headers: list, rows: list) -> str:
+    """
+    Formats rows as a plain text table for console output
+
+    @param headers list: The column names
+    @param rows list: Lists of cell values, one per row
+
+    @return: str: The table
+    """
+    cells = [[str(header) for header in headers]] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[column]) for row in cells) for column in range(len(headers))]
+    lines = ['  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in cells]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+
+    return '\n'.join(lines)
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Returns the percentile of the values, interpolating linearly between the closest ranks
+
+    @param values list: The values, at least one
+    @param percent float: The percentile, 0 to 100
+
+    @return: float:
+    """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def get_percentiles(values: list) -> dict:
+    """
+    @param values list: The values, at least one
+
+    @return: dict: Value per percentile, e.g. {'p50': 120.0, 'p90': 300.0, 'p99': 420.0}
+    """
+    return {f'p{percent}': percentile(values, percent) for percent in PERCENTILES}
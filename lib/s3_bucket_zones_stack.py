@@ -7,9 +7,14 @@ import aws_cdk.aws_kms as kms
 import aws_cdk.aws_s3 as s3
 
 from .configuration import (
-    PROD, S3_ACCESS_LOG_BUCKET, S3_CONFORMED_BUCKET, S3_KMS_KEY, S3_PURPOSE_BUILT_BUCKET, S3_RAW_BUCKET, TEST,
-    get_environment_configuration, get_logical_id_prefix, get_resource_name_prefix,
+    ALLOW_TEARDOWN, CONFORMED_ZONE, PROD, PURPOSE_BUILT_ZONE, RAW_ZONE, S3_BUCKET_ZONES_STACK,
+    S3_ACCESS_LOG_BUCKET, S3_CONFORMED_BUCKET, S3_KEY_LAYOUT, S3_KMS_KEY, S3_PURPOSE_BUILT_BUCKET, S3_RAW_BUCKET, TEST,
+    get_bucket_name, get_environment_configuration, get_logical_id_prefix, get_resource_name_prefix,
 )
+from .key_layout import dump_key_layouts, get_key_layouts
+from .output_registry import publish_output
+from .stack_sharding import StackShards
+from .tagging import tag_zone
 
 
 class S3BucketZonesStack(cdk.Stack):
@@ -38,6 +43,11 @@ class S3BucketZonesStack(cdk.Stack):
         self.removal_policy = cdk.RemovalPolicy.DESTROY
         if (target_environment == PROD or target_environment == TEST):
             self.removal_policy = cdk.RemovalPolicy.RETAIN
+        # The access logs bucket outlives the environment unless teardown is allowed and buckets are not retained
+        self.access_logs_removal_policy = cdk.RemovalPolicy.RETAIN
+        if mappings[ALLOW_TEARDOWN]:
+            self.access_logs_removal_policy = self.removal_policy
+        self.shards = StackShards(self, target_environment, S3_BUCKET_ZONES_STACK)
 
         s3_kms_key = self.create_kms_key(
             deployment_account_id,
@@ -46,58 +56,75 @@ class S3BucketZonesStack(cdk.Stack):
         )
         access_logs_bucket = self.create_access_logs_bucket(
             f'{target_environment}{logical_id_prefix}AccessLogsBucket',
-            f'{target_environment.lower()}-{resource_name_prefix}-{self.account}-{self.region}-access-logs',
+            get_bucket_name(target_environment, 'access-logs', self.account, self.region),
             s3_kms_key,
         )
         raw_bucket = self.create_data_lake_zone_bucket(
             f'{target_environment}{logical_id_prefix}RawBucket',
-            f'{target_environment.lower()}-{resource_name_prefix}-{self.account}-{self.region}-raw',
+            get_bucket_name(target_environment, RAW_ZONE, self.account, self.region),
             access_logs_bucket,
             s3_kms_key,
+            RAW_ZONE,
         )
         conformed_bucket = self.create_data_lake_zone_bucket(
             f'{target_environment}{logical_id_prefix}ConformedBucket',
-            f'{target_environment.lower()}-{resource_name_prefix}-{self.account}-{self.region}-conformed',
+            get_bucket_name(target_environment, CONFORMED_ZONE, self.account, self.region),
             access_logs_bucket,
             s3_kms_key,
+            CONFORMED_ZONE,
         )
         purpose_built_bucket = self.create_data_lake_zone_bucket(
             f'{target_environment}{logical_id_prefix}PurposeBuiltBucket',
-            f'{target_environment.lower()}-{resource_name_prefix}-{self.account}-{self.region}-purpose-built',
+            get_bucket_name(target_environment, PURPOSE_BUILT_ZONE, self.account, self.region),
             access_logs_bucket,
             s3_kms_key,
+            PURPOSE_BUILT_ZONE,
         )
 
-        # Stack Outputs that are programmatically synchronized
-        cdk.CfnOutput(
+        # Stack Outputs that are programmatically synchronized, also published to SSM Parameter Store
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}KmsKeyArn',
             value=s3_kms_key.key_arn,
-            export_name=mappings[S3_KMS_KEY]
+            output_key=S3_KMS_KEY,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}AccessLogsBucketName',
             value=access_logs_bucket.bucket_name,
-            export_name=mappings[S3_ACCESS_LOG_BUCKET]
+            output_key=S3_ACCESS_LOG_BUCKET,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}RawBucketName',
             value=raw_bucket.bucket_name,
-            export_name=mappings[S3_RAW_BUCKET]
+            output_key=S3_RAW_BUCKET,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}ConformedBucketName',
             value=conformed_bucket.bucket_name,
-            export_name=mappings[S3_CONFORMED_BUCKET]
+            output_key=S3_CONFORMED_BUCKET,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}PurposeBuiltBucketName',
             value=purpose_built_bucket.bucket_name,
-            export_name=mappings[S3_PURPOSE_BUILT_BUCKET]
+            output_key=S3_PURPOSE_BUILT_BUCKET,
+            mappings=mappings,
+        )
+        # Producers and consumers build and parse object keys from the published layout, see key_layout.py
+        publish_output(
+            self,
+            f'{target_environment}{logical_id_prefix}S3KeyLayout',
+            value=dump_key_layouts(get_key_layouts(target_environment)),
+            output_key=S3_KEY_LAYOUT,
+            mappings=mappings,
+            export=False,
         )
 
     def create_kms_key(self, deployment_account_id, logical_id_prefix, resource_name_prefix) -> kms.Key:
@@ -136,15 +163,20 @@ class S3BucketZonesStack(cdk.Stack):
 
         return s3_kms_key
 
-    def create_data_lake_zone_bucket(self, logical_id, bucket_name, access_logs_bucket, s3_kms_key) -> s3.Bucket:
+    def create_data_lake_zone_bucket(
+        self, logical_id, bucket_name, access_logs_bucket, s3_kms_key, zone
+    ) -> s3.Bucket:
         """
         Creates an Amazon S3 bucket and attaches bucket policy with necessary guardrails.
         It enables server-side encryption using provided KMS key and leverage S3 bucket key feature.
+        The bucket is tagged with its zone so S3 cost can be split by zone.
+        When the stack is over budget, each zone's bucket is created in a nested stack of its own.
 
         @param logical_id str: The logical id to apply to the bucket
         @param bucket_name str: The name for the bucket resource
         @param access_logs_bucket s3.Bucket: The bucket to target for Access Logging
         @param s3_kms_key kms.Key: The KMS Key to use for encryption of data at rest
+        @param zone str: The data lake zone the bucket belongs to
 
         @return: s3.Bucket: The bucket that was created
         """
@@ -170,7 +202,7 @@ class S3BucketZonesStack(cdk.Stack):
                 )
             ]
         bucket = s3.Bucket(
-            self,
+            self.shards.scope(f'{zone.title().replace("-", "")}Zone'),
             id=logical_id,
             access_control=s3.BucketAccessControl.PRIVATE,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
@@ -215,6 +247,7 @@ class S3BucketZonesStack(cdk.Stack):
             )
         for statement in policy_document_statements:
             bucket.add_to_resource_policy(statement)
+        tag_zone(bucket, zone)
 
         return bucket
 
@@ -239,7 +272,7 @@ class S3BucketZonesStack(cdk.Stack):
             encryption=s3.BucketEncryption.KMS,
             encryption_key=s3_kms_key,
             public_read_access=False,
-            removal_policy=cdk.RemovalPolicy.RETAIN,
+            removal_policy=self.access_logs_removal_policy,
             versioned=True,
             object_ownership=s3.ObjectOwnership.BUCKET_OWNER_PREFERRED,
         )
@@ -0,0 +1,109 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class SessionCache:
+
+    def __init__(self, session_factory=boto3.session.Session):
+        """
+        Thread-safe cache of boto3 sessions and clients, keyed by profile, region and assumed role.
+        boto3 sessions are not thread-safe to create clients from concurrently, so client creation is serialized
+        while the clients themselves are shared between worker threads.
+
+        @param session_factory: Callable returning a boto3 Session, accepts the keyword arguments of boto3 Session.
+            Used for assumed-role sessions too, with the temporary credentials instead of profile_name
+        """
+        self.session_factory = session_factory
+        self.sessions = {}
+        self.clients = {}
+        self.lock = threading.RLock()
+
+    def session(self, profile_name: str = None, region_name: str = None, role_arn: str = None) -> boto3.session.Session:
+        """
+        Returns a cached session for the profile and region, optionally for a role assumed from that profile
+
+        @param profile_name str: The named profile to use, None for the default credential chain
+        @param region_name str: The region of the session
+        @param role_arn str: Optional IAM role to assume with the profile credentials
+
+        @return: boto3.session.Session:
+        """
+        key = (profile_name, region_name, role_arn)
+        with self.lock:
+            if key not in self.sessions:
+                if role_arn:
+                    credentials = self.client('sts', profile_name, region_name).assume_role(
+                        RoleArn=role_arn,
+                        RoleSessionName='DataLakeInfrastructureTooling',
+                    )['Credentials']
+                    self.sessions[key] = self.session_factory(
+                        aws_access_key_id=credentials['AccessKeyId'],
+                        aws_secret_access_key=credentials['SecretAccessKey'],
+                        aws_session_token=credentials['SessionToken'],
+                        region_name=region_name,
+                    )
+                else:
+                    self.sessions[key] = self.session_factory(profile_name=profile_name, region_name=region_name)
+            return self.sessions[key]
+
+    def client(self, service_name: str, profile_name: str = None, region_name: str = None, role_arn: str = None):
+        """
+        Returns a cached client for the service, profile, region and role
+
+        @param service_name str: The AWS service, e.g. cloudformation
+        @param profile_name str: The named profile to use, None for the default credential chain
+        @param region_name str: The region of the client
+        @param role_arn str: Optional IAM role to assume with the profile credentials
+
+        @return: A boto3 client
+        """
+        key = (service_name, profile_name, region_name, role_arn)
+        with self.lock:
+            if key not in self.clients:
+                session = self.session(profile_name, region_name, role_arn)
+                self.clients[key] = session.client(service_name)
+            return self.clients[key]
+
+    def set_client(self, client, service_name: str, profile_name: str = None, region_name: str = None,
+                   role_arn: str = None):
+        """
+        Registers a pre-built client, e.g. one wrapped by botocore Stubber or pointing at a local endpoint
+
+        @param client: The client to return for this key
+        @param service_name str: The AWS service, e.g. cloudformation
+        @param profile_name str: The named profile the client stands in for
+        @param region_name str: The region the client stands in for
+        @param role_arn str: The assumed role the client stands in for
+        """
+        with self.lock:
+            self.clients[(service_name, profile_name, region_name, role_arn)] = client
+
+
+def run_concurrently(function, items: list, max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """
+    Calls the function for every item on a thread pool
+
+    @param function: Callable taking a single item
+    @param items list: The items to process
+    @param max_workers int: Maximum number of worker threads
+
+    @return: list: (item, result, exception) tuples in the order of items, exception is None on success
+    """
+    if not items:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(function, item) for item in items]
+    results = []
+    for item, future in zip(items, futures):
+        exception = future.exception()
+        results.append((item, None if exception else future.result(), exception))
+
+    return results
@@ -0,0 +1,137 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import sys
+
+import aws_cdk.core as cdk
+
+from .cloud_assembly import get_stack_name, iter_stack_artifacts, load_template
+from .configuration import (
+    DEPLOYMENT, MAX_STACK_RESOURCES, MAX_TEMPLATE_BYTES, SHARDED_STACKS, get_local_configuration,
+)
+from .reporting import format_table
+
+
+class StackShards:
+
+    def __init__(self, stack: cdk.Stack, target_environment: str, stack_key: str):
+        """
+        Splits the constructs of a stack into nested stacks, one per shard name, when the stack is listed in
+        sharded_stacks of the environment's configuration.
+        CDK wires references between the parent and its nested stacks through parameters and outputs.
+        Other stacks are left untouched, so their logical ids do not change.
+
+        @param stack cdk.Stack: The stack to shard
+        @param target_environment str: The target environment of the stack
+        @param stack_key str: The configuration key of the stack, e.g. S3_BUCKET_ZONES_STACK
+        """
+        self.stack = stack
+        self.enabled = stack_key in get_local_configuration(target_environment)[SHARDED_STACKS]
+        self.shards = {}
+
+    def scope(self, shard_name: str, default_scope: cdk.Construct = None) -> cdk.Construct:
+        """
+        Returns the scope to create a group of constructs in
+
+        @param shard_name str: The name of the group, e.g. a data lake zone
+        @param default_scope cdk.Construct: The scope used when the stack is not sharded, defaults to the stack
+
+        @return: cdk.Construct: A nested stack for the group if the stack is sharded, otherwise the default scope
+        """
+        if not self.enabled:
+            return default_scope or self.stack
+        if shard_name not in self.shards:
+            self.shards[shard_name] = cdk.NestedStack(self.stack, f'{shard_name}Shard')
+
+        return self.shards[shard_name]
+
+
+def get_stack_budget() -> dict:
+    """
+    Returns the resource count and template size above which a stack is sharded
+
+    @return: dict:
+    """
+    local_mapping = get_local_configuration(DEPLOYMENT)
+    return {
+        MAX_STACK_RESOURCES: local_mapping[MAX_STACK_RESOURCES],
+        MAX_TEMPLATE_BYTES: local_mapping[MAX_TEMPLATE_BYTES],
+    }
+
+
+def measure_template(template: dict) -> tuple:
+    """
+    Measures a synthesized template
+
+    @param template dict: The CloudFormation template
+
+    @return: tuple: (resource count, template bytes)
+    """
+    return len(template.get('Resources', {})), len(json.dumps(template, indent=1).encode('utf-8'))
+
+
+def measure_stacks(cdk_out: str) -> list:
+    """
+    Measures every stack in a cloud assembly
+
+    @param cdk_out str: The cloud assembly directory
+
+    @return: list: (construct path, stack name, resource count, template bytes) tuples
+    """
+    return [
+        (
+            artifact.get('displayName', artifact_id), get_stack_name(artifact_id, artifact),
+            *measure_template(load_template(directory, artifact)),
+        )
+        for directory, artifact_id, artifact in iter_stack_artifacts(cdk_out)
+    ]
+
+
+def find_oversized_stacks(cdk_out: str, budget: dict) -> list:
+    """
+    Returns the stacks that exceed the budget
+
+    @param cdk_out str: The cloud assembly directory
+    @param budget dict: The budget, see get_stack_budget
+
+    @return: list: (construct path, stack name, resource count, template bytes) tuples, see measure_stacks
+    """
+    return [
+        measurement for measurement in measure_stacks(cdk_out)
+        if measurement[2] > budget[MAX_STACK_RESOURCES] or measurement[3] > budget[MAX_TEMPLATE_BYTES]
+    ]
+
+
+def check_stack_budget(cdk_out: str, budget: dict):
+    """
+    Fails synth when a stack exceeds the budget. Stacks are never sharded automatically, because sharding
+    a deployed stack replaces its resources, which fails for named buckets.
+
+    @param cdk_out str: The cloud assembly directory
+    @param budget dict: The budget, see get_stack_budget
+
+    @raises: Exception: Throws an exception listing the stacks over budget
+    """
+    oversized_stacks = find_oversized_stacks(cdk_out, budget)
+    if oversized_stacks:
+        raise Exception(
+            f'Stacks over the budget of {budget[MAX_STACK_RESOURCES]} resources or {budget[MAX_TEMPLATE_BYTES]} '
+            f'template bytes: ' + ', '.join(
+                f'{stack_name} ({resource_count} resources, {template_bytes} bytes)'
+                for _, stack_name, resource_count, template_bytes in oversized_stacks
+            ) + f'. Add stacks that were never deployed to {SHARDED_STACKS} in configuration.py, '
+                f'or raise {MAX_STACK_RESOURCES} or {MAX_TEMPLATE_BYTES}'
+        )
+
+
+if __name__ == '__main__':
+    assembly_directory = sys.argv[1] if sys.argv[1:] else 'cdk.out'
+    oversized_stacks = [measurement[0] for measurement in find_oversized_stacks(assembly_directory, get_stack_budget())]
+    print(format_table(
+        ['Stack', 'Resources', 'Bytes', 'Over budget'],
+        [
+            [stack_name, stack_resources, stack_bytes, stack_path in oversized_stacks]
+            for stack_path, stack_name, stack_resources, stack_bytes in measure_stacks(assembly_directory)
+        ],
+    ))
@@ -1,7 +1,10 @@
 # Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+from functools import lru_cache
+
 import aws_cdk.core as cdk
+import jsii
 
 from .configuration import (
     get_logical_id_prefix, get_resource_name_prefix,
@@ -13,48 +16,95 @@ TAG_ENVIRONMENT = 'TAG_ENVIRONMENT'
 TEAM = 'TEAM'
 APPLICATION = 'APPLICATION'
 
+# Same priority cdk.Tags.of(...).add() uses, so tag precedence is unchanged
+TAG_PRIORITY = 100
+
+
+@jsii.implements(cdk.IAspect)
+class TagSetAspect:
+
+    def __init__(self, tag_set: tuple):
+        """
+        Aspect that applies a whole set of tags during a single traversal of the construct tree,
+        instead of registering one aspect (and one tree walk) per tag.
+
+        @param tag_set tuple: (key, value) pairs to apply to every taggable construct
+        """
+        self.tag_set = tag_set
+
+    def visit(self, construct: cdk.IConstruct) -> None:
+        """
+        Applies the tag set to the construct if it supports tagging
+
+        @param construct cdk.IConstruct: The construct being visited
+        """
+        if not cdk.TagManager.is_taggable(construct):
+            return
+        for key, value in self.tag_set:
+            construct.tags.set_tag(key, value, TAG_PRIORITY, True)
+
 
 def tag(stack, target_environment: str):
     """
-    Adds a tag to all constructs in the stack
+    Adds the standard tags to all constructs in the stack
 
     @param stack: The stack to tag
     @param target_environment: The environment the stack is deployed to
     """
-    cdk.Tags.of(stack).add(*get_tag(COST_CENTER, target_environment))
-    cdk.Tags.of(stack).add(*get_tag(TAG_ENVIRONMENT, target_environment))
-    cdk.Tags.of(stack).add(*get_tag(TEAM, target_environment))
-    cdk.Tags.of(stack).add(*get_tag(APPLICATION, target_environment))
+    cdk.Aspects.of(stack).add(TagSetAspect(get_tag_set(target_environment)))
+
 
+def tag_zone(construct, zone: str):
+    """
+    Adds the data lake zone cost-allocation tag to all constructs within the given construct (e.g. a bucket)
 
-def get_tag(tag_name, target_environment) -> dict:
+    @param construct: The construct to tag
+    @param zone: The data lake zone the construct belongs to, e.g. raw
+    """
+    cdk.Aspects.of(construct).add(TagSetAspect((get_zone_tag(zone),)))
+
+
+@lru_cache(maxsize=None)
+def get_tag_set(target_environment) -> tuple:
+    """
+    Get the standard tags for a target environment. The set is computed once per environment.
+
+    @param target_environment: The environment the tags are applied to
+    @return: tuple: (key, value) pairs for every standard tag
+    """
+    logical_id_prefix = get_logical_id_prefix()
+    resource_name_prefix = get_resource_name_prefix()
+    return (
+        (f'{resource_name_prefix}:cost-center', f'{logical_id_prefix}Infrastructure'),
+        (f'{resource_name_prefix}:environment', target_environment),
+        (f'{resource_name_prefix}:team', f'{logical_id_prefix}Admin'),
+        (f'{resource_name_prefix}:application', f'{logical_id_prefix}Infrastructure'),
+    )
+
+
+def get_tag(tag_name, target_environment) -> list:
     """
     Get a tag for a given parameter and target environment.
 
     @param tag_name: The name of the tag
     @param target_environment: The environment the tag is applied to
     """
-    logical_id_prefix = get_logical_id_prefix()
-    resource_name_prefix = get_resource_name_prefix()
-    tag_map = {
-        COST_CENTER: [
-            f'{resource_name_prefix}:cost-center',
-            f'{logical_id_prefix}Infrastructure',
-        ],
-        TAG_ENVIRONMENT: [
-            f'{resource_name_prefix}:environment',
-            target_environment,
-        ],
-        TEAM: [
-            f'{resource_name_prefix}:team',
-            f'{logical_id_prefix}Admin',
-        ],
-        APPLICATION: [
-            f'{resource_name_prefix}:application',
-            f'{logical_id_prefix}Infrastructure',
-        ],
-    }
+    tag_map = dict(zip(
+        (COST_CENTER, TAG_ENVIRONMENT, TEAM, APPLICATION),
+        (list(pair) for pair in get_tag_set(target_environment)),
+    ))
     if tag_name not in tag_map:
         raise AttributeError(f'Tag map does not contain a key/value for {tag_name}')
 
     return tag_map[tag_name]
+
+
+@lru_cache(maxsize=None)
+def get_zone_tag(zone) -> tuple:
+    """
+    Get the cost-allocation tag for a data lake zone
+
+    @param zone: The data lake zone, e.g. raw
+    @return: tuple: (key, value) of the zone tag
+    """
+    return (f'{get_resource_name_prefix()}:zone', zone)
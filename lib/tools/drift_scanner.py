@@ -0,0 +1,215 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import sys
+import time
+
+from botocore.exceptions import ClientError
+
+from lib.configuration import (
+    DEV, PROD, REGION, TEST, get_all_configurations, get_output_export_names, get_stack_names
+)
+from lib.prerequisites.bootstrap_accounts import parse_profiles
+from lib.reporting import format_table
+from lib.sessions import DEFAULT_MAX_WORKERS, SessionCache, run_concurrently
+
+IN_SYNC = 'IN_SYNC'
+DRIFTED = 'DRIFTED'
+MISSING = 'MISSING'
+UNEXPECTED_STACK = 'UNEXPECTED_STACK'
+FAILED = 'FAILED'
+TIMED_OUT = 'TIMED_OUT'
+
+INITIAL_POLL_SECONDS = 2
+MAXIMUM_POLL_SECONDS = 30
+DEFAULT_TIMEOUT_SECONDS = 900
+
+
+def start_drift_detection(cloudformation_client, stack_name: str) -> str:
+    """
+    Starts drift detection for a stack
+
+    @param cloudformation_client: CloudFormation client for the stack's account and region
+    @param stack_name str: The stack name
+
+    @return: str: The drift detection id, None if the stack does not exist
+    """
+    try:
+        return cloudformation_client.detect_stack_drift(StackName=stack_name)['StackDriftDetectionId']
+    except ClientError as error:
+        if 'does not exist' in str(error):
+            return None
+        raise
+
+
+def get_drifted_resources(cloudformation_client, stack_name: str) -> list:
+    """
+    Returns the logical ids and drift status of the modified or deleted resources of a stack
+
+    @param cloudformation_client: CloudFormation client for the stack's account and region
+    @param stack_name str: The stack name
+
+    @return: list: e.g. ['RawBucket (MODIFIED)']
+    """
+    drifts = []
+    kwargs = {'StackName': stack_name, 'StackResourceDriftStatusFilters': ['MODIFIED', 'DELETED']}
+    while True:
+        response = cloudformation_client.describe_stack_resource_drifts(**kwargs)
+        drifts += [
+            f'{drift["LogicalResourceId"]} ({drift["StackResourceDriftStatus"]})'
+            for drift in response['StackResourceDrifts']
+        ]
+        if not response.get('NextToken'):
+            return drifts
+        kwargs['NextToken'] = response['NextToken']
+
+
+def detect_drift(targets: list, clients, timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS,
+                 max_workers: int = DEFAULT_MAX_WORKERS, sleep=time.sleep, clock=time.monotonic) -> list:
+    """
+    Runs drift detection for all stacks at once. Detection is started for every stack, then all pending detections
+    are polled together in one loop with exponential backoff, so the total time is that of the slowest stack.
+
+    @param targets list: (environment, stack name) tuples
+    @param clients: Callable returning a client for a service and environment
+    @param timeout_seconds int: Give up on detections that have not completed after this time
+    @param max_workers int: Maximum number of concurrent API calls
+    @param sleep: Callable used to wait between polls, replaceable in tests
+    @param clock: Callable returning seconds the timeout is measured with, replaced together with sleep in tests
+
+    @return: list: (environment, stack name, status, detail) tuples in the order of targets
+    """
+    def start(target):
+        environment, stack_name = target
+        return start_drift_detection(clients('cloudformation', environment), stack_name)
+
+    results = {}
+    pending = {}
+    for target, detection_id, error in run_concurrently(start, targets, max_workers):
+        if error:
+            results[target] = (FAILED, str(error))
+        elif detection_id is None:
+            results[target] = (MISSING, 'Stack does not exist')
+        else:
+            pending[target] = detection_id
+
+    def poll(target):
+        return clients('cloudformation', target[0]).describe_stack_drift_detection_status(
+            StackDriftDetectionId=pending[target]
+        )
+
+    def describe(target):
+        return get_drifted_resources(clients('cloudformation', target[0]), target[1])
+
+    delay = INITIAL_POLL_SECONDS
+    deadline = clock() + timeout_seconds
+    while pending and clock() < deadline:
+        sleep(delay)
+        delay = min(delay * 2, MAXIMUM_POLL_SECONDS)
+        drifted = []
+        for target, status, error in run_concurrently(poll, list(pending), max_workers):
+            if error:
+                results[target] = (FAILED, str(error))
+            elif status['DetectionStatus'] == 'DETECTION_IN_PROGRESS':
+                continue
+            elif status['DetectionStatus'] == 'DETECTION_FAILED':
+                results[target] = (FAILED, status.get('DetectionStatusReason', ''))
+            elif status['StackDriftStatus'] == DRIFTED:
+                drifted.append(target)
+            else:
+                results[target] = (status['StackDriftStatus'], '')
+            del pending[target]
+        for target, resources, error in run_concurrently(describe, drifted, max_workers):
+            results[target] = (DRIFTED, str(error) if error else ', '.join(resources))
+    for target in pending:
+        results[target] = (TIMED_OUT, f'Detection {pending[target]} still in progress')
+
+    return [(environment, stack_name, *results[(environment, stack_name)]) for environment, stack_name in targets]
+
+
+def check_exports(cloudformation_client, environment: str) -> list:
+    """
+    Checks that every export name in the environment configuration exists and is exported by one of the
+    environment's stacks
+
+    @param cloudformation_client: CloudFormation client for the environment's account and region
+    @param environment str: The target environment
+
+    @return: list: (environment, export name, status, detail) tuples
+    """
+    exports = {}
+    for page in cloudformation_client.get_paginator('list_exports').paginate():
+        exports.update({export['Name']: export['ExportingStackId'] for export in page['Exports']})
+
+    stack_names = set(get_stack_names(environment).values())
+    results = []
+    for export_name in get_output_export_names(environment).values():
+        if export_name not in exports:
+            results.append((environment, export_name, MISSING, 'Export does not exist'))
+            continue
+        # Stack ids are ARNs: arn:aws:cloudformation:<region>:<account>:stack/<stack name>/<guid>
+        exporting_stack = exports[export_name].split('/')[1]
+        if exporting_stack in stack_names:
+            results.append((environment, export_name, IN_SYNC, exporting_stack))
+        else:
+            results.append((environment, export_name, UNEXPECTED_STACK, f'Exported by {exporting_stack}'))
+
+    return results
+
+
+def scan(environments: list, profiles: dict = None, session_cache: SessionCache = None, mappings: dict = None,
+         timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS, max_workers: int = DEFAULT_MAX_WORKERS,
+         sleep=time.sleep, clock=time.monotonic) -> list:
+    """
+    Scans all stacks of the environments for drift and cross-checks their exports against configuration
+
+    @param environments list: The target environments
+    @param profiles dict: Named profile per environment, the default credential chain is used if not provided
+    @param session_cache SessionCache: Shared sessions and clients, a new cache is used if not provided
+    @param mappings dict: All configurations, loaded from configuration if not provided
+    @param timeout_seconds int: Give up on drift detections that have not completed after this time
+    @param max_workers int: Maximum number of concurrent API calls
+    @param sleep: Callable used to wait between polls, replaceable in tests
+    @param clock: Callable returning seconds the timeout is measured with, replaced together with sleep in tests
+
+    @return: list: (environment, stack or export name, status, detail) tuples
+    """
+    session_cache = session_cache or SessionCache()
+    mappings = mappings or get_all_configurations()
+    profiles = profiles or {}
+
+    def clients(service_name, environment):
+        return session_cache.client(service_name, profiles.get(environment), mappings[environment][REGION])
+
+    targets = [
+        (environment, stack_name)
+        for environment in environments for stack_name in get_stack_names(environment).values()
+    ]
+    report = detect_drift(targets, clients, timeout_seconds, max_workers, sleep, clock)
+    for environment, export_results, error in run_concurrently(
+        lambda environment: check_exports(clients('cloudformation', environment), environment),
+        environments,
+        max_workers,
+    ):
+        report += export_results if not error else [(environment, '-', FAILED, str(error))]
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Detects drift of all deployed stacks and checks the configured exports across environments'
+    )
+    parser.add_argument('--environment', action='append', choices=[DEV, TEST, PROD])
+    parser.add_argument('--profile', action='append', default=[], help='Environment=profile, e.g. Dev=my-dev-profile')
+    parser.add_argument(
+        '--timeout', type=int, default=DEFAULT_TIMEOUT_SECONDS, help='Seconds to wait for drift detection'
+    )
+    arguments = parser.parse_args()
+
+    drift_report = scan(arguments.environment or [DEV, TEST, PROD], parse_profiles(arguments.profile),
+                        timeout_seconds=arguments.timeout)
+    print(format_table(['Environment', 'Stack / Export', 'Status', 'Detail'], drift_report))
+    if any(status != IN_SYNC for _, _, status, _ in drift_report):
+        sys.exit(1)
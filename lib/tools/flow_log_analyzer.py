@@ -0,0 +1,265 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import collections
+import sys
+
+try:
+    import pyarrow.fs as pyarrow_fs
+    import pyarrow.parquet as parquet
+except ImportError:
+    # Only needed to read flow logs, the aggregation itself works on any iterable of records
+    parquet = None
+
+from lib.configuration import DEV, PROD, REGION, TEST, VPC_ID, get_all_configurations
+from lib.output_resolver import OutputResolver
+from lib.reporting import format_table
+from lib.sessions import SessionCache
+
+# Flow log fields read by the analyzer, see FLOW_LOG_FIELDS in vpc_stack.py
+COLUMNS = [
+    'interface_id', 'dstaddr', 'pkt_dstaddr', 'pkt_dst_aws_service', 'flow_direction', 'traffic_path', 'bytes',
+]
+# Data lake services with gateway endpoints in the VPC, traffic to them should never leave through a NAT gateway
+DATA_LAKE_SERVICES = ('S3', 'DYNAMODB')
+TRAFFIC_PATHS = {
+    1: 'Same VPC',
+    2: 'Internet gateway or gateway endpoint',
+    3: 'Virtual private gateway',
+    4: 'Intra-region peering',
+    5: 'Inter-region peering',
+    6: 'Local gateway',
+    7: 'Gateway endpoint',
+    8: 'Internet gateway',
+}
+# Egress to an AWS service through another resource in the VPC (a NAT gateway) or straight to the internet gateway
+BYPASSING_PATHS = (1, 8)
+DEFAULT_BATCH_SIZE = 65536
+DEFAULT_TOP = 10
+
+
+def normalize_column_name(name: str) -> str:
+    """
+    Flow log Parquet files use underscores, e.g. interface_id, while the log format uses hyphens, e.g. interface-id
+
+    @param name str: The column name
+    @return: str: The column name with underscores
+    """
+    return name.strip().replace('-', '_').lower()
+
+
+def list_parquet_files(location: str) -> tuple:
+    """
+    Lists the Parquet files of a flow log location
+
+    @param location str: A local file or directory, or an s3://bucket/prefix URI, e.g. a day=/ or hour=/ partition
+
+    @raises: Exception: Throws an exception if pyarrow is not installed
+    @return: tuple: (filesystem, sorted list of file paths)
+    """
+    if parquet is None:
+        raise Exception('Reading flow logs requires pyarrow, install it with: pip install pyarrow')
+    filesystem, path = pyarrow_fs.FileSystem.from_uri(location) if '://' in location else (
+        pyarrow_fs.LocalFileSystem(), location
+    )
+    if filesystem.get_file_info(path).type == pyarrow_fs.FileType.File:
+        return filesystem, [path]
+
+    return filesystem, sorted(
+        file_info.path
+        for file_info in filesystem.get_file_info(pyarrow_fs.FileSelector(path, recursive=True))
+        if file_info.type == pyarrow_fs.FileType.File and file_info.path.endswith('.parquet')
+    )
+
+
+def iter_records(filesystem, path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Streams the records of a flow log Parquet file in column batches, reading only the analyzed columns,
+    so memory use is bounded by the batch size and not by the file size
+
+    @param filesystem: The pyarrow filesystem of the file
+    @param path str: The file path
+    @param batch_size int: Maximum number of records per batch
+
+    @return: Generator of records, dicts keyed by normalized column name. Missing columns are None.
+    """
+    with filesystem.open_input_file(path) as parquet_input:
+        parquet_file = parquet.ParquetFile(parquet_input)
+        columns = {
+            normalize_column_name(name): name for name in parquet_file.schema_arrow.names
+            if normalize_column_name(name) in COLUMNS
+        }
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(columns.values())):
+            values = [batch.column(name).to_pylist() for name in columns.values()]
+            for row in zip(*values):
+                yield {**dict.fromkeys(COLUMNS), **dict(zip(columns, row))}
+
+
+def get_path(record: dict, nat_interfaces: set) -> str:
+    """
+    @param record dict: The flow log record
+    @param nat_interfaces set: Network interface ids of the NAT gateways
+
+    @return: str: The traffic path of the record, prefixed with NAT gateway for records of NAT gateway interfaces
+    """
+    path = TRAFFIC_PATHS.get(record['traffic_path'], '-') if record['traffic_path'] is not None else '-'
+    if record['interface_id'] in nat_interfaces:
+        return f'NAT gateway / {path}'
+
+    return path
+
+
+def bypasses_endpoints(record: dict, nat_interfaces: set) -> bool:
+    """
+    Data lake traffic bypasses the gateway endpoints when it leaves for S3 or DynamoDB through a NAT gateway
+    or the internet gateway instead
+
+    @param record dict: The flow log record
+    @param nat_interfaces set: Network interface ids of the NAT gateways
+
+    @return: bool:
+    """
+    return (
+        record['pkt_dst_aws_service'] in DATA_LAKE_SERVICES
+        and record['flow_direction'] == 'egress'
+        and (record['traffic_path'] in BYPASSING_PATHS or record['interface_id'] in nat_interfaces)
+    )
+
+
+def aggregate(records, nat_interfaces: set = None) -> dict:
+    """
+    Sums bytes by network interface, destination, AWS service, and traffic path, and separately for data lake
+    traffic that bypasses the gateway endpoints
+
+    @param records: Iterable of flow log records, see iter_records
+    @param nat_interfaces set: Network interface ids of the NAT gateways, traffic through them is labeled as such
+
+    @return: dict: Counter of bytes per dimension, plus the number of records
+    """
+    nat_interfaces = nat_interfaces or set()
+    totals = {dimension: collections.Counter() for dimension in ('interface', 'destination', 'service', 'path')}
+    bypassing = collections.Counter()
+    count = 0
+    for record in records:
+        count += 1
+        record_bytes = record['bytes'] or 0
+        path = get_path(record, nat_interfaces)
+        totals['interface'][record['interface_id']] += record_bytes
+        totals['destination'][record['pkt_dstaddr'] or record['dstaddr']] += record_bytes
+        totals['service'][record['pkt_dst_aws_service'] or '-'] += record_bytes
+        totals['path'][path] += record_bytes
+        if bypasses_endpoints(record, nat_interfaces):
+            bypassing[(record['interface_id'], record['pkt_dst_aws_service'], path)] += record_bytes
+
+    return {**totals, 'bypassing': bypassing, 'records': count}
+
+
+def analyze(location: str, nat_interfaces: set = None, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    Aggregates all flow log files of a location, one batch at a time
+
+    @param location str: A local file or directory, or an s3://bucket/prefix URI
+    @param nat_interfaces set: Network interface ids of the NAT gateways
+    @param batch_size int: Maximum number of records per batch
+
+    @return: dict: The aggregate, see aggregate, and the number of files read
+    """
+    filesystem, paths = list_parquet_files(location)
+    report = aggregate(
+        (record for path in paths for record in iter_records(filesystem, path, batch_size)), nat_interfaces
+    )
+
+    return {**report, 'files': len(paths)}
+
+
+def get_nat_interfaces(ec2_client, vpc_id: str) -> set:
+    """
+    Returns the network interface ids of the NAT gateways of a VPC
+
+    @param ec2_client: EC2 client for the VPC's account and region
+    @param vpc_id str: The VPC id
+
+    @return: set:
+    """
+    return {
+        address['NetworkInterfaceId']
+        for page in ec2_client.get_paginator('describe_nat_gateways').paginate(
+            Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]
+        )
+        for nat_gateway in page['NatGateways'] for address in nat_gateway['NatGatewayAddresses']
+    }
+
+
+def format_bytes(value: int) -> str:
+    """
+    @param value int: Number of bytes
+    @return: str: e.g. 1.5 GiB
+    """
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024:
+            return f'{value:.1f} {unit}' if unit != 'B' else f'{value} B'
+        value /= 1024
+
+    return f'{value:.1f} TiB'
+
+
+def format_report(report: dict, top: int = DEFAULT_TOP) -> str:
+    """
+    Formats the aggregate as plain text tables of the top talkers
+
+    @param report dict: The aggregate, see analyze
+    @param top int: Number of rows per table
+
+    @return: str:
+    """
+    sections = [f'{report["records"]} records in {report["files"]} files']
+    for title, dimension in [
+        ('Network interface', 'interface'), ('Destination', 'destination'), ('AWS service', 'service'),
+        ('Traffic path', 'path'),
+    ]:
+        sections.append(format_table(
+            [title, 'Bytes'], [[key, format_bytes(value)] for key, value in report[dimension].most_common(top)]
+        ))
+    if report['bypassing']:
+        sections.append('Data lake traffic bypassing the gateway endpoints:\n' + format_table(
+            ['Network interface', 'AWS service', 'Traffic path', 'Bytes'],
+            [[*key, format_bytes(value)] for key, value in report['bypassing'].most_common()],
+        ))
+
+    return '\n\n'.join(sections)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Reports the top talkers of VPC flow logs and flags S3 and DynamoDB traffic that bypasses '
+                    'the gateway endpoints'
+    )
+    parser.add_argument(
+        'location', help='Flow log Parquet file or directory, local or s3://bucket/prefix, e.g. an hour=/ partition'
+    )
+    parser.add_argument('--nat-interface', action='append', default=[], help='Network interface id of a NAT gateway')
+    parser.add_argument(
+        '--environment', choices=[DEV, TEST, PROD],
+        help='Look up the NAT gateway interfaces of the environment VPC, published by its VpcStack',
+    )
+    parser.add_argument('--profile', help='Named profile for the environment account')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Number of rows per table')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Records per column batch')
+    arguments = parser.parse_args()
+
+    nat_interface_ids = set(arguments.nat_interface)
+    if arguments.environment:
+        session_cache = SessionCache()
+        region = get_all_configurations()[arguments.environment][REGION]
+        environment_vpc_id = OutputResolver(
+            arguments.environment, session_cache=session_cache, profile_name=arguments.profile
+        ).get(VPC_ID)
+        nat_interface_ids |= get_nat_interfaces(
+            session_cache.client('ec2', arguments.profile, region), environment_vpc_id
+        )
+
+    flow_log_report = analyze(arguments.location, nat_interface_ids, arguments.batch_size)
+    print(format_report(flow_log_report, arguments.top))
+    if flow_log_report['bypassing']:
+        sys.exit(1)
@@ -0,0 +1,501 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import datetime
+import json
+import os
+
+from dateutil import parser as date_parser
+
+from lib.configuration import (
+    DEPLOYMENT, DEV, PROD, REGION, TEST, get_all_configurations, get_pipeline_name
+)
+from lib.reporting import PERCENTILES, format_table, get_percentiles
+from lib.sessions import DEFAULT_MAX_WORKERS, SessionCache, run_concurrently
+
+SUCCEEDED = 'Succeeded'
+DAY = 'day'
+WEEK = 'week'
+DEFAULT_DAYS = 30
+
+# Output variables of the GitHub and CodeStar connection source actions, in order of preference
+COMMIT_TIME_VARIABLES = ('CommitterDate', 'AuthorDate')
+CODEBUILD_BATCH_SIZE = 100
+METRIC_NAMESPACE = 'DataLake/InfrastructurePipelines'
+METRIC_DATA_BATCH_SIZE = 1000
+
+
+def to_datetime(value) -> datetime.datetime:
+    """
+    Returns a timestamp from the SDK, or from a recorded fixture, as a datetime
+
+    @param value: A datetime or an ISO 8601 string
+    @return: datetime.datetime:
+    """
+    return value if isinstance(value, datetime.datetime) else date_parser.isoparse(value)
+
+
+def list_executions(codepipeline_client, pipeline_name: str, since: datetime.datetime = None) -> list:
+    """
+    Lists the executions of a pipeline, newest first
+
+    @param codepipeline_client: CodePipeline client for the Deployment account and region
+    @param pipeline_name str: The pipeline name
+    @param since datetime.datetime: Stop at executions started before this time, all executions if not provided
+
+    @return: list: Pipeline execution summaries
+    """
+    executions = []
+    for page in codepipeline_client.get_paginator('list_pipeline_executions').paginate(pipelineName=pipeline_name):
+        for execution in page['pipelineExecutionSummaries']:
+            if since and to_datetime(execution['startTime']) < since:
+                return executions
+            executions.append(execution)
+
+    return executions
+
+
+def list_action_executions(codepipeline_client, pipeline_name: str, execution_id: str) -> list:
+    """
+    Lists the action executions of one pipeline execution
+
+    @param codepipeline_client: CodePipeline client for the Deployment account and region
+    @param pipeline_name str: The pipeline name
+    @param execution_id str: The pipeline execution id
+
+    @return: list: Action execution details
+    """
+    return [
+        action_execution
+        for page in codepipeline_client.get_paginator('list_action_executions').paginate(
+            pipelineName=pipeline_name, filter={'pipelineExecutionId': execution_id}
+        )
+        for action_execution in page['actionExecutionDetails']
+    ]
+
+
+def get_builds(codebuild_client, build_ids: list, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Returns the CodeBuild builds, fetched concurrently in batches of the BatchGetBuilds maximum
+
+    @param codebuild_client: CodeBuild client for the Deployment account and region
+    @param build_ids list: The build ids
+    @param max_workers int: Maximum number of concurrent API calls
+
+    @raises: Exception: Throws the first exception raised by a batch
+    @return: dict: Build per build id, builds that no longer exist are omitted
+    """
+    batches = [
+        build_ids[index:index + CODEBUILD_BATCH_SIZE] for index in range(0, len(build_ids), CODEBUILD_BATCH_SIZE)
+    ]
+    builds = {}
+    for _, response, error in run_concurrently(
+        lambda batch: codebuild_client.batch_get_builds(ids=batch), batches, max_workers
+    ):
+        if error:
+            raise error
+        builds.update({build['id']: build for build in response['builds']})
+
+    return builds
+
+
+def get_build_id(action_execution: dict) -> str:
+    """
+    Returns the CodeBuild build id of an action execution
+
+    @param action_execution dict: The action execution details
+    @return: str: The build id, None if the action is not a CodeBuild action or has not started a build
+    """
+    if action_execution.get('input', {}).get('actionTypeId', {}).get('provider') != 'CodeBuild':
+        return None
+
+    return action_execution.get('output', {}).get('executionResult', {}).get('externalExecutionId')
+
+
+def fetch_history(clients, pipeline_name: str, since: datetime.datetime = None,
+                  max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Fetches the execution history of a pipeline. Action executions are listed for all executions concurrently,
+    then the builds of all CodeBuild actions are fetched in concurrent batches.
+
+    @param clients: Callable returning a client for a service in the Deployment account and region
+    @param pipeline_name str: The pipeline name
+    @param since datetime.datetime: Only fetch executions started after this time
+    @param max_workers int: Maximum number of concurrent API calls
+
+    @raises: Exception: Throws the first exception raised while listing action executions
+    @return: dict: The executions with their action executions, and the builds by id. This is the fixture format.
+    """
+    codepipeline_client = clients('codepipeline')
+    executions = list_executions(codepipeline_client, pipeline_name, since)
+    for execution, action_executions, error in run_concurrently(
+        lambda item: list_action_executions(codepipeline_client, pipeline_name, item['pipelineExecutionId']),
+        executions,
+        max_workers,
+    ):
+        if error:
+            raise error
+        execution['actionExecutions'] = action_executions
+
+    build_ids = [
+        build_id
+        for execution in executions for action_execution in execution['actionExecutions']
+        for build_id in [get_build_id(action_execution)] if build_id
+    ]
+
+    return {
+        'pipelineName': pipeline_name,
+        'executions': executions,
+        'builds': get_builds(clients('codebuild'), build_ids, max_workers),
+    }
+
+
+def record_history(directory: str, history: dict):
+    """
+    Writes a pipeline history to a fixture file named after the pipeline
+
+    @param directory str: The fixtures directory
+    @param history dict: The history, see fetch_history
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'{history["pipelineName"]}.json'), 'w') as fixture:
+        json.dump(history, fixture, indent=2, default=lambda value: value.isoformat())
+
+
+def load_history(directory: str, pipeline_name: str) -> dict:
+    """
+    Reads a pipeline history from a fixture file, see record_history
+
+    @param directory str: The fixtures directory
+    @param pipeline_name str: The pipeline name
+
+    @return: dict: The history, see fetch_history
+    """
+    with open(os.path.join(directory, f'{pipeline_name}.json')) as fixture:
+        return json.load(fixture)
+
+
+def get_commit_time(action_executions: list) -> datetime.datetime:
+    """
+    Returns the time of the commit that started a pipeline execution, from the source action output variables
+
+    @param action_executions list: The action executions of the pipeline execution
+    @return: datetime.datetime: The commit time, None if the source action does not output it
+    """
+    for action_execution in action_executions:
+        if action_execution.get('input', {}).get('actionTypeId', {}).get('category') != 'Source':
+            continue
+        output_variables = action_execution.get('output', {}).get('outputVariables', {})
+        for variable in COMMIT_TIME_VARIABLES:
+            if output_variables.get(variable):
+                return to_datetime(output_variables[variable])
+
+    return None
+
+
+def seconds_between(start, end) -> float:
+    """
+    @param start: The start datetime or ISO 8601 string
+    @param end: The end datetime or ISO 8601 string
+
+    @return: float: The seconds from start to end
+    """
+    return (to_datetime(end) - to_datetime(start)).total_seconds()
+
+
+def summarize_execution(execution: dict, builds: dict) -> dict:
+    """
+    Computes the durations of one pipeline execution. A stage lasts from the start of its first action to the end
+    of its last action. Lead time is measured from the commit to the end of a successful execution.
+
+    @param execution dict: The execution summary with its action executions
+    @param builds dict: CodeBuild builds by id
+
+    @return: dict: Start time, status, durations in seconds, and durations per stage, action, and build phase
+    """
+    stage_times = {}
+    actions = {}
+    phases = {}
+    for action_execution in sorted(execution['actionExecutions'], key=lambda item: to_datetime(item['startTime'])):
+        start = to_datetime(action_execution['startTime'])
+        end = to_datetime(action_execution['lastUpdateTime'])
+        stage_start, stage_end = stage_times.get(action_execution['stageName'], (start, end))
+        stage_times[action_execution['stageName']] = (min(start, stage_start), max(end, stage_end))
+        actions[f'{action_execution["stageName"]}/{action_execution["actionName"]}'] = seconds_between(start, end)
+        for phase in builds.get(get_build_id(action_execution), {}).get('phases', []):
+            if 'durationInSeconds' in phase:
+                phases[f'{action_execution["actionName"]} {phase["phaseType"]}'] = phase['durationInSeconds']
+
+    start = to_datetime(execution['startTime'])
+    end = to_datetime(execution['lastUpdateTime'])
+    commit_time = get_commit_time(execution['actionExecutions'])
+    succeeded = execution['status'] == SUCCEEDED
+
+    return {
+        'start': start,
+        'status': execution['status'],
+        'duration': seconds_between(start, end),
+        'lead_time': seconds_between(commit_time or start, end) if succeeded else None,
+        'commit_to_start': seconds_between(commit_time, start) if commit_time else None,
+        'stages': {name: seconds_between(*times) for name, times in stage_times.items()},
+        'actions': actions,
+        'phases': phases,
+    }
+
+
+def get_duration_percentiles(summaries: list, field: str) -> list:
+    """
+    Computes the percentile durations of every stage, action, or build phase across executions
+
+    @param summaries list: Execution summaries, see summarize_execution
+    @param field str: stages, actions, or phases
+
+    @return: list: (name, number of executions, percentiles) tuples, in order of first appearance
+    """
+    durations = {}
+    for summary in sorted(summaries, key=lambda item: item['start']):
+        for name, seconds in summary[field].items():
+            durations.setdefault(name, []).append(seconds)
+
+    return [(name, len(values), get_percentiles(values)) for name, values in durations.items()]
+
+
+def get_period(start: datetime.datetime, period: str) -> str:
+    """
+    @param start datetime.datetime: The execution start time
+    @param period str: day or week
+
+    @return: str: The day, e.g. 2021-06-30, or the ISO week, e.g. 2021-W26
+    """
+    if period == DAY:
+        return start.date().isoformat()
+    year, week, _ = start.isocalendar()
+
+    return f'{year}-W{week:02d}'
+
+
+def get_trends(summaries: list, period: str = WEEK) -> list:
+    """
+    Groups executions by day or week
+
+    @param summaries list: Execution summaries, see summarize_execution
+    @param period str: day or week
+
+    @return: list: (period, executions, succeeded, lead time percentiles, duration percentiles) tuples by period,
+        lead time percentiles are None if no execution succeeded in the period
+    """
+    groups = {}
+    for summary in summaries:
+        groups.setdefault(get_period(summary['start'], period), []).append(summary)
+
+    trends = []
+    for name in sorted(groups):
+        lead_times = [summary['lead_time'] for summary in groups[name] if summary['lead_time'] is not None]
+        trends.append((
+            name,
+            len(groups[name]),
+            len(lead_times),
+            get_percentiles(lead_times) if lead_times else None,
+            get_percentiles([summary['duration'] for summary in groups[name]]),
+        ))
+
+    return trends
+
+
+def analyze(history: dict, period: str = WEEK) -> dict:
+    """
+    Computes all figures for one pipeline
+
+    @param history dict: The pipeline history, see fetch_history
+    @param period str: The trend period, day or week
+
+    @return: dict: The report
+    """
+    summaries = [summarize_execution(execution, history['builds']) for execution in history['executions']]
+    lead_times = [summary['lead_time'] for summary in summaries if summary['lead_time'] is not None]
+    commit_to_start = [summary['commit_to_start'] for summary in summaries if summary['commit_to_start'] is not None]
+
+    return {
+        'pipelineName': history['pipelineName'],
+        'executions': len(summaries),
+        'succeeded': len(lead_times),
+        'lead_time': get_percentiles(lead_times) if lead_times else None,
+        'commit_to_start': get_percentiles(commit_to_start) if commit_to_start else None,
+        'stages': get_duration_percentiles(summaries, 'stages'),
+        'actions': get_duration_percentiles(summaries, 'actions'),
+        'phases': get_duration_percentiles(summaries, 'phases'),
+        'trends': get_trends(summaries, period),
+    }
+
+
+def get_metric_data(report: dict, timestamp: datetime.datetime) -> list:
+    """
+    Returns the report figures as CloudWatch metric data, one metric per figure with the percentile as dimension
+
+    @param report dict: The pipeline report, see analyze
+    @param timestamp datetime.datetime: The timestamp of the data points
+
+    @return: list: MetricData entries for PutMetricData
+    """
+    figures = [('LeadTime', [], report['lead_time']), ('CommitToStart', [], report['commit_to_start'])]
+    figures += [('StageDuration', [{'Name': 'Stage', 'Value': name}], values) for name, _, values in report['stages']]
+    figures += [
+        ('ActionDuration', [{'Name': 'Action', 'Value': name}], values) for name, _, values in report['actions']
+    ]
+    figures += [
+        ('BuildPhaseDuration', [{'Name': 'Phase', 'Value': name}], values) for name, _, values in report['phases']
+    ]
+
+    return [
+        {
+            'MetricName': metric_name,
+            'Dimensions': [
+                {'Name': 'Pipeline', 'Value': report['pipelineName']}, *dimensions,
+                {'Name': 'Percentile', 'Value': percent},
+            ],
+            'Timestamp': timestamp,
+            'Value': value,
+            'Unit': 'Seconds',
+        }
+        for metric_name, dimensions, values in figures if values
+        for percent, value in values.items()
+    ]
+
+
+def publish_metrics(cloudwatch_client, reports: list, timestamp: datetime.datetime = None) -> int:
+    """
+    Publishes the figures of the reports as custom CloudWatch metrics
+
+    @param cloudwatch_client: CloudWatch client for the Deployment account and region
+    @param reports list: Pipeline reports, see analyze
+    @param timestamp datetime.datetime: The timestamp of the data points, defaults to now
+
+    @return: int: The number of data points published
+    """
+    timestamp = timestamp or datetime.datetime.now(datetime.timezone.utc)
+    metric_data = [entry for report in reports for entry in get_metric_data(report, timestamp)]
+    for index in range(0, len(metric_data), METRIC_DATA_BATCH_SIZE):
+        cloudwatch_client.put_metric_data(
+            Namespace=METRIC_NAMESPACE, MetricData=metric_data[index:index + METRIC_DATA_BATCH_SIZE]
+        )
+
+    return len(metric_data)
+
+
+def fetch_histories(environments: list, days: int = DEFAULT_DAYS, profile_name: str = None,
+                    session_cache: SessionCache = None, mappings: dict = None,
+                    max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """
+    Fetches the history of the environments' pipelines concurrently
+
+    @param environments list: The target environments whose pipelines to fetch
+    @param days int: Number of days of history to fetch
+    @param profile_name str: The named profile for the Deployment account
+    @param session_cache SessionCache: Shared sessions and clients, a new cache is used if not provided
+    @param mappings dict: All configurations, loaded from configuration if not provided
+    @param max_workers int: Maximum number of concurrent pipelines and API calls per pipeline
+
+    @raises: Exception: Throws the first exception raised while fetching a pipeline
+    @return: list: Pipeline histories in the order of environments, see fetch_history
+    """
+    session_cache = session_cache or SessionCache()
+    mappings = mappings or get_all_configurations()
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+
+    def clients(service_name):
+        return session_cache.client(service_name, profile_name, mappings[DEPLOYMENT][REGION])
+
+    histories = []
+    for _, history, error in run_concurrently(
+        lambda environment: fetch_history(clients, get_pipeline_name(environment), since, max_workers),
+        environments,
+        max_workers,
+    ):
+        if error:
+            raise error
+        histories.append(history)
+
+    return histories
+
+
+def format_percentiles(values: dict) -> list:
+    """
+    @param values dict: Seconds per percentile, None if there are no values
+
+    @return: list: The percentiles formatted as minutes and seconds, e.g. ['2m05s', '7m40s', '9m12s']
+    """
+    if not values:
+        return ['-'] * len(PERCENTILES)
+
+    return [f'{int(values[f"p{percent}"] // 60)}m{int(values[f"p{percent}"] % 60):02d}s' for percent in PERCENTILES]
+
+
+def format_report(report: dict) -> str:
+    """
+    Formats a pipeline report as plain text tables
+
+    @param report dict: The pipeline report, see analyze
+    @return: str:
+    """
+    headers = [f'p{percent}' for percent in PERCENTILES]
+    sections = [
+        f'{report["pipelineName"]}: {report["executions"]} executions, {report["succeeded"]} succeeded',
+        format_table(['Lead time', *headers], [
+            ['Commit to Succeeded', *format_percentiles(report['lead_time'])],
+            ['Commit to start', *format_percentiles(report['commit_to_start'])],
+        ]),
+    ]
+    for title, field in [('Stage', 'stages'), ('Action', 'actions'), ('CodeBuild phase', 'phases')]:
+        sections.append(format_table(
+            [title, 'Runs', *headers],
+            [[name, runs, *format_percentiles(values)] for name, runs, values in report[field]],
+        ))
+    sections.append(format_table(
+        ['Period', 'Executions', 'Succeeded', *[f'Lead time {header}' for header in headers], 'Duration p50'],
+        [
+            [name, executions, succeeded, *format_percentiles(lead_times), format_percentiles(durations)[0]]
+            for name, executions, succeeded, lead_times, durations in report['trends']
+        ],
+    ))
+
+    return '\n\n'.join(sections)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Reports lead time and stage, action, and CodeBuild phase durations of the environment pipelines'
+    )
+    parser.add_argument('--environment', action='append', choices=[DEV, TEST, PROD])
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='Days of history to fetch')
+    parser.add_argument('--period', choices=[DAY, WEEK], default=WEEK, help='Period of the trend table')
+    parser.add_argument('--profile', help='Named profile for the Deployment account')
+    parser.add_argument('--record', metavar='DIRECTORY', help='Also write the fetched history as JSON fixtures')
+    parser.add_argument(
+        '--from-fixtures', metavar='DIRECTORY', help='Read the history from JSON fixtures instead of AWS'
+    )
+    parser.add_argument(
+        '--publish-metrics', action='store_true',
+        help=f'Publish the figures as CloudWatch metrics in {METRIC_NAMESPACE}',
+    )
+    arguments = parser.parse_args()
+
+    target_environments = arguments.environment or [DEV, TEST, PROD]
+    if arguments.from_fixtures:
+        pipeline_histories = [
+            load_history(arguments.from_fixtures, get_pipeline_name(environment)) for environment in target_environments
+        ]
+    else:
+        pipeline_histories = fetch_histories(target_environments, arguments.days, arguments.profile)
+    if arguments.record:
+        for pipeline_history in pipeline_histories:
+            record_history(arguments.record, pipeline_history)
+
+    pipeline_reports = [analyze(pipeline_history, arguments.period) for pipeline_history in pipeline_histories]
+    print('\n\n'.join(format_report(pipeline_report) for pipeline_report in pipeline_reports))
+    if arguments.publish_metrics:
+        published = publish_metrics(
+            SessionCache().client('cloudwatch', arguments.profile, get_all_configurations()[DEPLOYMENT][REGION]),
+            pipeline_reports,
+        )
+        print(f'\nPublished {published} data points to {METRIC_NAMESPACE}')
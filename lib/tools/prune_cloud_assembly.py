@@ -0,0 +1,215 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import glob
+import io
+import json
+import os
+import shutil
+import zipfile
+
+from lib.cloud_assembly import (
+    ASSET_MANIFEST_ARTIFACT, MANIFEST_FILE, NESTED_ASSEMBLY_ARTIFACT, STACK_ARTIFACT, load_manifest
+)
+from lib.configuration import DEV, PROD, TEST, get_logical_id_prefix
+from lib.reporting import format_table
+
+TREE_ARTIFACT = 'cdk:tree'
+PATH_METADATA = 'aws:cdk:path'
+DEFAULT_CLOUD_ASSEMBLY_DIRECTORY = 'cdk.out'
+
+
+def get_artifact_paths(artifact: dict) -> list:
+    """
+    @param artifact dict: The artifact from the manifest
+    @return: list: The files and directories of the artifact, relative to its assembly directory
+    """
+    properties = artifact.get('properties', {})
+    if artifact['type'] == STACK_ARTIFACT:
+        return [properties['templateFile'], f'{properties["templateFile"]}.config.json']
+    if artifact['type'] == NESTED_ASSEMBLY_ARTIFACT:
+        return [properties['directoryName']]
+    if artifact['type'] in (TREE_ARTIFACT, ASSET_MANIFEST_ARTIFACT):
+        return [properties['file']]
+
+    return []
+
+
+def get_kept_artifacts(manifest: dict, environment: str = None) -> set:
+    """
+    Returns the artifacts the pipeline of an environment needs: its pipeline stack, whose self-mutation deploys it
+    from the assembly, the assets of that stack, and the nested assembly of its deploy stage. The tree is never kept.
+
+    @param manifest dict: The top-level manifest of the cloud assembly
+    @param environment str: The target environment of the pipeline, None to keep the artifacts of all environments
+
+    @return: set: The ids of the artifacts to keep
+    """
+    artifacts = manifest.get('artifacts', {})
+    pipeline_stack_id = f'{environment}{get_logical_id_prefix()}InfrastructurePipeline'
+    kept = {
+        artifact_id for artifact_id, artifact in artifacts.items()
+        if artifact['type'] != TREE_ARTIFACT and (
+            environment is None
+            or artifact_id == pipeline_stack_id
+            or artifact_id.startswith(f'{pipeline_stack_id}.')
+            or artifact_id.startswith(f'assembly-{pipeline_stack_id}-')
+        )
+    }
+    pending = list(kept)
+    while pending:
+        for dependency in artifacts[pending.pop()].get('dependencies', []):
+            if dependency not in kept and dependency in artifacts:
+                kept.add(dependency)
+                pending.append(dependency)
+
+    return kept
+
+
+def strip_metadata(manifest: dict) -> dict:
+    """
+    Removes the construct stack traces from the metadata entries of every artifact. The entries themselves,
+    e.g. stack tags read by cdk deploy, are kept.
+
+    @param manifest dict: The manifest of a cloud assembly
+    @return: dict: The manifest
+    """
+    for artifact in manifest.get('artifacts', {}).values():
+        for entries in artifact.get('metadata', {}).values():
+            for entry in entries:
+                entry.pop('trace', None)
+
+    return manifest
+
+
+def strip_template(template: dict) -> dict:
+    """
+    Removes the construct path metadata of every resource, which CloudFormation does not use
+
+    @param template dict: The CloudFormation template
+    @return: dict: The template
+    """
+    for resource in template.get('Resources', {}).values():
+        metadata = resource.get('Metadata')
+        if metadata and PATH_METADATA in metadata:
+            del metadata[PATH_METADATA]
+            if not metadata:
+                del resource['Metadata']
+
+    return template
+
+
+def write_minified(path: str, value: dict):
+    """
+    @param path str: The JSON file to write
+    @param value dict: The value to write without indentation
+    """
+    with open(path, 'w') as json_file:
+        json.dump(value, json_file, separators=(',', ':'))
+
+
+def measure_assembly(directory: str) -> dict:
+    """
+    Measures a cloud assembly as the pipeline transfers it, a zip file of the directory
+
+    @param directory str: The cloud assembly directory
+    @return: dict: Number of files, bytes, and zipped bytes
+    """
+    paths = [
+        os.path.join(parent, file_name)
+        for parent, _, file_names in os.walk(directory) for file_name in file_names
+    ]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for path in paths:
+            zip_file.write(path, os.path.relpath(path, directory))
+
+    return {
+        'files': len(paths),
+        'bytes': sum(os.path.getsize(path) for path in paths),
+        'zippedBytes': archive.getbuffer().nbytes,
+    }
+
+
+def prune_assembly(directory: str, kept: set = None):
+    """
+    Prunes a cloud assembly directory in place, recursing into the nested assemblies that are kept:
+    1. Removes the artifacts that are not kept from the manifest, and deletes their files
+    2. Removes stack traces from the manifest metadata
+    3. Removes construct path metadata from the templates, including nested stack templates, and minifies them
+
+    Template files are published under the hash of the synthesized template, so a pruned template is still
+    published to the same object key on every synth of the same source.
+
+    @param directory str: The cloud assembly directory
+    @param kept set: The ids of the artifacts to keep, None to keep all artifacts except the tree
+    """
+    manifest = load_manifest(directory)
+    artifacts = manifest.get('artifacts', {})
+    if kept is None:
+        kept = {artifact_id for artifact_id, artifact in artifacts.items() if artifact['type'] != TREE_ARTIFACT}
+
+    for artifact_id in [artifact_id for artifact_id in artifacts if artifact_id not in kept]:
+        for path in get_artifact_paths(artifacts.pop(artifact_id)):
+            path = os.path.join(directory, path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+    write_minified(os.path.join(directory, MANIFEST_FILE), strip_metadata(manifest))
+
+    for template_path in glob.glob(os.path.join(directory, '*.template.json')):
+        with open(template_path) as template_file:
+            template = json.load(template_file)
+        write_minified(template_path, strip_template(template))
+
+    for artifact in artifacts.values():
+        if artifact['type'] == NESTED_ASSEMBLY_ARTIFACT:
+            prune_assembly(os.path.join(directory, artifact['properties']['directoryName']))
+
+
+def prune(directory: str, environment: str = None) -> dict:
+    """
+    Prunes a cloud assembly to what the pipeline of an environment deploys, see prune_assembly
+
+    @param directory str: The cloud assembly directory, e.g. cdk.out
+    @param environment str: The target environment of the pipeline, None to keep the artifacts of all environments
+
+    @return: dict: The measurements before and after pruning, see measure_assembly
+    """
+    before = measure_assembly(directory)
+    prune_assembly(directory, get_kept_artifacts(load_manifest(directory), environment))
+
+    return {'before': before, 'after': measure_assembly(directory)}
+
+
+def format_report(report: dict) -> str:
+    """
+    @param report dict: The measurements, see prune
+    @return: str: A plain text table
+    """
+    rows = [
+        [label, report['before'][field], report['after'][field],
+         f'{100 * (1 - report["after"][field] / report["before"][field]):.0f}%' if report['before'][field] else '-']
+        for label, field in [('Files', 'files'), ('Bytes', 'bytes'), ('Zipped bytes', 'zippedBytes')]
+    ]
+
+    return format_table(['', 'Before', 'After', 'Saved'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Prunes a synthesized cloud assembly to what the pipeline of an environment deploys, '
+                    'and strips the debug metadata'
+    )
+    parser.add_argument(
+        'directory', nargs='?', default=DEFAULT_CLOUD_ASSEMBLY_DIRECTORY, help='The cloud assembly directory'
+    )
+    parser.add_argument(
+        '--environment', choices=[DEV, TEST, PROD],
+        help='Drop the artifacts of the other environments\' pipelines, e.g. after a synth without ENV',
+    )
+    arguments = parser.parse_args()
+
+    print(format_report(prune(arguments.directory, arguments.environment)))
@@ -0,0 +1,423 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import datetime
+import io
+import json
+import os
+import re
+import sys
+import time
+import uuid
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+from lib.configuration import (
+    ACCOUNT_ID, DATA_LAKE_ZONES, DEV, PROD, REGION, TEST, get_bucket_name, get_environment_configuration
+)
+from lib.reporting import PERCENTILES, format_table, get_percentiles
+from lib.sessions import DEFAULT_MAX_WORKERS, run_concurrently
+
+PUT = 'put'
+GET = 'get'
+LIST = 'list'
+WORKLOADS = [PUT, GET, LIST]
+DEFAULT_OBJECT_SIZES = ['4KiB', '1MiB', '16MiB']
+DEFAULT_OBJECTS = 50
+DEFAULT_PREFIXES = 4
+DEFAULT_MULTIPART_THRESHOLD = '8MiB'
+DEFAULT_RESULTS_DIRECTORY = 'benchmark-results'
+DELETE_OBJECTS_BATCH_SIZE = 1000
+SIZE_UNITS = {'': 1, 'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """
+    @param value str: A size, e.g. 512, 4KiB, or 16MiB
+
+    @raises: Exception: Throws an exception if the size cannot be parsed
+    @return: int: The size in bytes
+    """
+    match = re.fullmatch(r'(\d+)\s*(B|KiB|MiB|GiB)?', value.strip())
+    if not match:
+        raise Exception(f'Invalid size {value}, use a number of bytes or a number with KiB, MiB or GiB')
+
+    return int(match.group(1)) * SIZE_UNITS[match.group(2) or '']
+
+
+def get_bucket_layout(environment: str) -> dict:
+    """
+    Returns the zone buckets of an environment with the encryption settings of S3BucketZonesStack,
+    which encrypts with the data lake KMS key and the S3 bucket key
+
+    @param environment str: The target environment
+
+    @return: dict: Bucket name and encryption settings per zone
+    """
+    mappings = get_environment_configuration(environment)
+    return {
+        zone: {
+            'bucket': get_bucket_name(environment, zone, mappings[ACCOUNT_ID], mappings[REGION]),
+            'serverSideEncryption': 'aws:kms',
+            'bucketKeyEnabled': True,
+        }
+        for zone in DATA_LAKE_ZONES
+    }
+
+
+def get_encryption_arguments(layout: dict, kms_key_id: str) -> dict:
+    """
+    Returns the PutObject encryption arguments for a zone bucket
+
+    @param layout dict: The zone's bucket and encryption settings, see get_bucket_layout
+    @param kms_key_id str: The KMS key to encrypt with, None to rely on the stand-in's default encryption
+
+    @return: dict:
+    """
+    if not kms_key_id:
+        return {}
+
+    # The bucket key is a bucket setting, see create_buckets
+    return {
+        'ServerSideEncryption': layout['serverSideEncryption'],
+        'SSEKMSKeyId': kms_key_id,
+    }
+
+
+def get_keys(run_id: str, object_size: int, objects: int, prefixes: int) -> list:
+    """
+    Returns the object keys of a workload, spread round robin over the prefixes
+
+    @param run_id str: The benchmark run id, all keys of a run share it
+    @param object_size int: The object size in bytes
+    @param objects int: Number of objects
+    @param prefixes int: Number of prefixes to fan out over
+
+    @return: list: The keys
+    """
+    return [
+        f'benchmark/{run_id}/prefix-{index % prefixes:03d}/{object_size}/object-{index:06d}' for index in range(objects)
+    ]
+
+
+def run_workload(function, items: list, max_workers: int) -> dict:
+    """
+    Runs one operation per item on a thread pool and measures it
+
+    @param function: Callable taking an item, returning the number of bytes transferred
+    @param items list: The items to operate on
+    @param max_workers int: Number of concurrent workers
+
+    @return: dict: Operation count, errors, wall clock seconds, throughput and latency percentiles
+    """
+    latencies = []
+    transferred = []
+
+    def measure(item):
+        start = time.perf_counter()
+        item_bytes = function(item)
+        latencies.append(time.perf_counter() - start)
+        transferred.append(item_bytes)
+
+    start = time.perf_counter()
+    outcomes = run_concurrently(measure, items, max_workers)
+    seconds = time.perf_counter() - start
+    errors = [str(error) for _, _, error in outcomes if error]
+
+    return {
+        'operations': len(items),
+        'errors': len(errors),
+        'errorRate': len(errors) / len(items) if items else 0,
+        'firstError': errors[0] if errors else None,
+        'seconds': seconds,
+        'operationsPerSecond': len(latencies) / seconds if seconds else 0,
+        'bytesPerSecond': sum(transferred) / seconds if seconds else 0,
+        'latency': get_percentiles(latencies) if latencies else None,
+    }
+
+
+def delete_objects(s3_client, bucket: str, keys: list, max_workers: int = DEFAULT_MAX_WORKERS):
+    """
+    Deletes the objects in batches of the DeleteObjects maximum
+
+    @param s3_client: S3 client
+    @param bucket str: The bucket name
+    @param keys list: The object keys
+    @param max_workers int: Number of concurrent DeleteObjects calls
+    """
+    batches = [
+        keys[index:index + DELETE_OBJECTS_BATCH_SIZE] for index in range(0, len(keys), DELETE_OBJECTS_BATCH_SIZE)
+    ]
+    run_concurrently(
+        lambda batch: s3_client.delete_objects(
+            Bucket=bucket, Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        ),
+        batches,
+        max_workers,
+    )
+
+
+def benchmark_zone(s3_client, zone: str, layout: dict, workloads: list, object_sizes: list, objects: int,
+                   prefixes: int, max_workers: int, multipart_threshold: int, kms_key_id: str = None,
+                   keep_objects: bool = False) -> list:
+    """
+    Runs the workloads against one zone bucket. GET and LIST read the objects written by PUT in the same run.
+
+    @param s3_client: S3 client for the stand-in endpoint
+    @param zone str: The data lake zone
+    @param layout dict: The zone's bucket and encryption settings, see get_bucket_layout
+    @param workloads list: put, get, and/or list
+    @param object_sizes list: Object sizes in bytes, each size is a separate workload
+    @param objects int: Number of objects per size
+    @param prefixes int: Number of prefixes the objects fan out over
+    @param max_workers int: Number of concurrent workers
+    @param multipart_threshold int: Objects of this size and larger are uploaded and downloaded in parts
+    @param kms_key_id str: The KMS key to encrypt with, None to rely on the stand-in's default encryption
+    @param keep_objects bool: Keep the benchmark objects instead of deleting them after the run
+
+    @return: list: One result per workload and object size
+    """
+    bucket = layout['bucket']
+    encryption_arguments = get_encryption_arguments(layout, kms_key_id)
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold, multipart_chunksize=multipart_threshold, max_concurrency=1
+    )
+    run_id = uuid.uuid4().hex[:12]
+    results = []
+    written_keys = []
+    for object_size in object_sizes:
+        body = os.urandom(object_size)
+        keys = get_keys(run_id, object_size, objects, prefixes)
+
+        def put(key):
+            s3_client.upload_fileobj(
+                io.BytesIO(body), bucket, key, ExtraArgs=encryption_arguments, Config=transfer_config
+            )
+            return object_size
+
+        def get(key):
+            download = io.BytesIO()
+            s3_client.download_fileobj(bucket, key, download, Config=transfer_config)
+            return download.tell()
+
+        def list_prefix(prefix):
+            for _ in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+                pass
+            return 0
+
+        prefix_names = sorted({key.rsplit('/', 1)[0] + '/' for key in keys})
+        for workload, function, items in [(PUT, put, keys), (GET, get, keys), (LIST, list_prefix, prefix_names)]:
+            if workload in workloads:
+                results.append({
+                    'zone': zone, 'bucket': bucket, 'workload': workload, 'objectSize': object_size,
+                    **run_workload(function, items, max_workers),
+                })
+        written_keys += keys
+
+    if PUT in workloads and not keep_objects:
+        delete_objects(s3_client, bucket, written_keys, max_workers)
+
+    return results
+
+
+def run_benchmark(s3_client, environment: str, zones: list, workloads: list, object_sizes: list, objects: int,
+                  prefixes: int, max_workers: int, multipart_threshold: int, kms_key_id: str = None,
+                  keep_objects: bool = False) -> dict:
+    """
+    Benchmarks the zone buckets one zone at a time, so zones do not compete for workers
+
+    @param s3_client: S3 client for the stand-in endpoint
+    @param environment str: The target environment whose bucket layout to use
+    @param zones list: The data lake zones to benchmark
+    @param workloads list: put, get, and/or list
+    @param object_sizes list: Object sizes in bytes
+    @param objects int: Number of objects per size
+    @param prefixes int: Number of prefixes the objects fan out over
+    @param max_workers int: Number of concurrent workers
+    @param multipart_threshold int: Objects of this size and larger are uploaded and downloaded in parts
+    @param kms_key_id str: The KMS key to encrypt with, None to rely on the stand-in's default encryption
+    @param keep_objects bool: Keep the benchmark objects instead of deleting them after the run
+
+    @raises: Exception: Throws an exception if GET or LIST is requested without PUT
+    @return: dict: The settings and results of the run, the format of the results file
+    """
+    if PUT not in workloads:
+        raise Exception('The get and list workloads read the objects of the put workload, include put')
+    layout = get_bucket_layout(environment)
+    settings = {
+        'environment': environment,
+        'endpointUrl': s3_client.meta.endpoint_url,
+        'workloads': workloads,
+        'objectSizes': object_sizes,
+        'objects': objects,
+        'prefixes': prefixes,
+        'workers': max_workers,
+        'multipartThreshold': multipart_threshold,
+        'sseKms': bool(kms_key_id),
+    }
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    results = [
+        result
+        for zone in zones
+        for result in benchmark_zone(
+            s3_client, zone, layout[zone], workloads, object_sizes, objects, prefixes, max_workers,
+            multipart_threshold, kms_key_id, keep_objects,
+        )
+    ]
+
+    return {'startedAt': started_at, 'settings': settings, 'results': results}
+
+
+def create_buckets(s3_client, environment: str, zones: list, kms_key_id: str = None):
+    """
+    Creates the zone buckets in the stand-in if they do not exist, with the default encryption of the zone buckets
+    when a KMS key is given
+
+    @param s3_client: S3 client for the stand-in endpoint
+    @param environment str: The target environment whose bucket layout to use
+    @param zones list: The data lake zones
+    @param kms_key_id str: The KMS key to encrypt with by default, None to keep the stand-in's default encryption
+    """
+    existing = {bucket['Name'] for bucket in s3_client.list_buckets()['Buckets']}
+    layout = get_bucket_layout(environment)
+    # us-east-1 is the only region that rejects an explicit location constraint
+    location = {}
+    if s3_client.meta.region_name != 'us-east-1':
+        location = {'CreateBucketConfiguration': {'LocationConstraint': s3_client.meta.region_name}}
+    for zone in zones:
+        if layout[zone]['bucket'] in existing:
+            continue
+        s3_client.create_bucket(Bucket=layout[zone]['bucket'], **location)
+        if kms_key_id:
+            s3_client.put_bucket_encryption(
+                Bucket=layout[zone]['bucket'],
+                ServerSideEncryptionConfiguration={
+                    'Rules': [{
+                        'ApplyServerSideEncryptionByDefault': {
+                            'SSEAlgorithm': layout[zone]['serverSideEncryption'],
+                            'KMSMasterKeyID': kms_key_id,
+                        },
+                        'BucketKeyEnabled': layout[zone]['bucketKeyEnabled'],
+                    }],
+                },
+            )
+
+
+def save_results(directory: str, run: dict) -> str:
+    """
+    Stores the results of a run as JSON, named after its start time so files sort chronologically
+
+    @param directory str: The results directory
+    @param run dict: The run, see run_benchmark
+
+    @return: str: The path of the results file
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{run["startedAt"].replace(":", "").split(".")[0]}.json')
+    with open(path, 'w') as results_file:
+        json.dump(run, results_file, indent=2)
+
+    return path
+
+
+def load_results(path: str) -> dict:
+    """
+    @param path str: A results file, see save_results
+    @return: dict: The run
+    """
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def format_seconds(value: float) -> str:
+    """
+    @param value float: Seconds
+    @return: str: Milliseconds, e.g. 12.3ms
+    """
+    return f'{value * 1000:.1f}ms'
+
+
+def format_results(run: dict, baseline: dict = None) -> str:
+    """
+    Formats the results of a run as a plain text table, optionally with the change against a baseline run
+
+    @param run dict: The run, see run_benchmark
+    @param baseline dict: An earlier run with the same workloads
+
+    @return: str:
+    """
+    baseline_results = {
+        (result['zone'], result['workload'], result['objectSize']): result
+        for result in (baseline or {}).get('results', [])
+    }
+    headers = [
+        'Zone', 'Workload', 'Size', 'Ops', 'Errors', 'Ops/s', 'MiB/s', *[f'p{percent}' for percent in PERCENTILES]
+    ]
+    if baseline:
+        headers += ['Ops/s change', 'p99 change']
+    rows = []
+    for result in run['results']:
+        latency = result['latency'] or {}
+        row = [
+            result['zone'], result['workload'], result['objectSize'], result['operations'],
+            f'{result["errorRate"]:.1%}', f'{result["operationsPerSecond"]:.1f}',
+            f'{result["bytesPerSecond"] / SIZE_UNITS["MiB"]:.1f}',
+            *[format_seconds(latency[f'p{percent}']) if latency else '-' for percent in PERCENTILES],
+        ]
+        if baseline:
+            previous = baseline_results.get((result['zone'], result['workload'], result['objectSize']))
+            if previous and previous['operationsPerSecond'] and previous['latency'] and latency:
+                row += [
+                    f'{result["operationsPerSecond"] / previous["operationsPerSecond"] - 1:+.1%}',
+                    f'{latency["p99"] / previous["latency"]["p99"] - 1:+.1%}',
+                ]
+            else:
+                row += ['-', '-']
+        rows.append(row)
+
+    return format_table(headers, rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmarks PUT, GET, and LIST against the data lake zone buckets in a local S3-compatible '
+                    'stand-in, e.g. MinIO or moto_server'
+    )
+    parser.add_argument('--endpoint-url', required=True, help='Endpoint of the S3-compatible stand-in')
+    parser.add_argument('--environment', choices=[DEV, TEST, PROD], default=DEV, help='Bucket layout to use')
+    parser.add_argument('--zone', action='append', choices=DATA_LAKE_ZONES)
+    parser.add_argument('--workload', action='append', choices=WORKLOADS)
+    parser.add_argument('--object-size', action='append', help='e.g. 4KiB, 1MiB, 64MiB')
+    parser.add_argument('--objects', type=int, default=DEFAULT_OBJECTS, help='Objects per zone and size')
+    parser.add_argument('--prefixes', type=int, default=DEFAULT_PREFIXES, help='Prefixes the objects fan out over')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help='Concurrent workers')
+    parser.add_argument(
+        '--multipart-threshold', default=DEFAULT_MULTIPART_THRESHOLD, help='Size from which parts are used'
+    )
+    parser.add_argument('--sse-kms-key-id', help='Encrypt with SSE-KMS and the bucket key, like the zone buckets')
+    parser.add_argument('--create-buckets', action='store_true', help='Create missing zone buckets in the stand-in')
+    parser.add_argument('--keep-objects', action='store_true', help='Do not delete the benchmark objects')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIRECTORY, help='Directory to store results in')
+    parser.add_argument('--compare', metavar='RESULTS_FILE', help='Show the change against an earlier run')
+    arguments = parser.parse_args()
+
+    stand_in_client = boto3.client(
+        's3', endpoint_url=arguments.endpoint_url,
+        region_name=get_environment_configuration(arguments.environment)[REGION],
+    )
+    benchmark_zones = arguments.zone or DATA_LAKE_ZONES
+    if arguments.create_buckets:
+        create_buckets(stand_in_client, arguments.environment, benchmark_zones, arguments.sse_kms_key_id)
+
+    benchmark_run = run_benchmark(
+        stand_in_client, arguments.environment, benchmark_zones, arguments.workload or WORKLOADS,
+        [parse_size(size) for size in arguments.object_size or DEFAULT_OBJECT_SIZES], arguments.objects,
+        arguments.prefixes, arguments.workers, parse_size(arguments.multipart_threshold),
+        arguments.sse_kms_key_id, arguments.keep_objects,
+    )
+    print(format_results(benchmark_run, load_results(arguments.compare) if arguments.compare else None))
+    print(f'\nResults stored in {save_results(arguments.results_dir, benchmark_run)}')
+    if any(result['errors'] for result in benchmark_run['results']):
+        sys.exit(1)
@@ -0,0 +1,352 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError, WaiterError
+
+from lib.configuration import (
+    ACCOUNT_ID, ALLOW_TEARDOWN, COMPACTION_STACK, DATA_LAKE_ZONES, DEV, ENABLE_FLOW_LOGS, PROD, REGION, TEST,
+    get_bucket_name, get_environment_configuration, get_ephemeral_environment, get_stack_names,
+)
+from lib.reporting import format_table
+from lib.sessions import DEFAULT_MAX_WORKERS, SessionCache, run_concurrently
+
+ACCESS_LOGS = 'access-logs'
+FLOW_LOGS = 'flow-logs'
+DELETE_OBJECTS_BATCH_SIZE = 1000
+DEFAULT_ATTEMPTS = 3
+# Stacks that import outputs of the other stacks are deleted first
+STACK_DELETION_ORDER = [[COMPACTION_STACK]]
+STACK_WAITER_CONFIG = {'Delay': 10, 'MaxAttempts': 360}
+
+
+def check_teardown_allowed(environment: str):
+    """
+    @param environment str: The target environment
+
+    @raises: Exception: Throws an exception for Prod, and for environments that do not allow teardown
+    """
+    if environment == PROD:
+        raise Exception(f'Teardown is never allowed for {PROD}')
+    if not get_environment_configuration(environment)[ALLOW_TEARDOWN]:
+        raise Exception(f'Teardown is not allowed for {environment}, set {ALLOW_TEARDOWN} in configuration.py')
+
+
+def get_teardown_buckets(environment: str) -> list:
+    """
+    Returns the names of the buckets created for an environment, the access logs bucket last
+    because the other buckets deliver their server access logs to it
+
+    @param environment str: The target environment
+    @return: list:
+    """
+    mappings = get_environment_configuration(environment)
+    suffixes = DATA_LAKE_ZONES + ([FLOW_LOGS] if mappings[ENABLE_FLOW_LOGS] else []) + [ACCESS_LOGS]
+    return [get_bucket_name(environment, suffix, mappings[ACCOUNT_ID], mappings[REGION]) for suffix in suffixes]
+
+
+def list_existing_buckets(s3_client, buckets: list) -> list:
+    """
+    @param s3_client: S3 client for the environment's account and region
+    @param buckets list: The bucket names
+
+    @return: list: The buckets that exist, in the order of buckets
+    """
+    existing_buckets = []
+    for bucket in buckets:
+        try:
+            s3_client.head_bucket(Bucket=bucket)
+            existing_buckets.append(bucket)
+        except ClientError as error:
+            if error.response['Error']['Code'] not in ('404', 'NoSuchBucket'):
+                raise
+
+    return existing_buckets
+
+
+def stop_access_logging(s3_client, buckets: list):
+    """
+    Disables server access logging, so purging a bucket does not keep filling the access logs bucket
+
+    @param s3_client: S3 client for the environment's account and region
+    @param buckets list: The bucket names
+    """
+    for bucket in buckets:
+        s3_client.put_bucket_logging(Bucket=bucket, BucketLoggingStatus={})
+
+
+def purge_bucket(s3_client, bucket: str, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Permanently deletes all object versions and delete markers of a bucket. Every page of versions is deleted
+    with batched DeleteObjects calls on a thread pool while the next page is listed.
+
+    @param s3_client: S3 client for the bucket's account and region
+    @param bucket str: The bucket name
+    @param max_workers int: Number of concurrent DeleteObjects calls
+
+    @return: dict: Number of versions and delete markers listed, objects that failed to delete, and seconds taken
+    """
+    start = time.perf_counter()
+    result = {'bucket': bucket, 'versions': 0, 'deleteMarkers': 0, 'errors': 0}
+    lock = threading.Lock()
+    # Bounds the batches waiting for a worker, so listing does not run ahead of deleting
+    pending_batches = threading.BoundedSemaphore(max_workers * 2)
+
+    def delete_batch(batch):
+        try:
+            response = s3_client.delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+            errors = len(response.get('Errors', []))
+        except (BotoCoreError, ClientError):
+            errors = len(batch)
+        finally:
+            pending_batches.release()
+        with lock:
+            result['errors'] += errors
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for page in s3_client.get_paginator('list_object_versions').paginate(Bucket=bucket):
+            result['versions'] += len(page.get('Versions', []))
+            result['deleteMarkers'] += len(page.get('DeleteMarkers', []))
+            objects = [
+                {'Key': version['Key'], 'VersionId': version['VersionId']}
+                for version in page.get('Versions', []) + page.get('DeleteMarkers', [])
+            ]
+            for index in range(0, len(objects), DELETE_OBJECTS_BATCH_SIZE):
+                pending_batches.acquire()
+                executor.submit(delete_batch, objects[index:index + DELETE_OBJECTS_BATCH_SIZE])
+
+    return {**result, 'seconds': time.perf_counter() - start}
+
+
+def purge_buckets(s3_client, buckets: list, max_workers: int = DEFAULT_MAX_WORKERS) -> list:
+    """
+    Purges the buckets concurrently, see purge_bucket
+
+    @param s3_client: S3 client for the environment's account and region
+    @param buckets list: The bucket names
+    @param max_workers int: Number of concurrent DeleteObjects calls per bucket
+
+    @raises: Exception: Throws the first exception raised by a purge
+    @return: list: The result per bucket
+    """
+    results = []
+    for _, result, error in run_concurrently(lambda bucket: purge_bucket(s3_client, bucket, max_workers), buckets,
+                                             len(buckets)):
+        if error:
+            raise error
+        results.append(result)
+
+    return results
+
+
+def delete_bucket(s3_client, bucket: str, max_workers: int = DEFAULT_MAX_WORKERS,
+                  attempts: int = DEFAULT_ATTEMPTS) -> list:
+    """
+    Purges and deletes a bucket, purging again when objects were delivered in the meantime, e.g. access logs
+
+    @param s3_client: S3 client for the bucket's account and region
+    @param bucket str: The bucket name
+    @param max_workers int: Number of concurrent DeleteObjects calls
+    @param attempts int: Maximum number of purges
+
+    @return: list: The result of every purge
+    """
+    results = []
+    for attempt in range(1, attempts + 1):
+        results.append(purge_bucket(s3_client, bucket, max_workers))
+        try:
+            s3_client.delete_bucket(Bucket=bucket)
+            return results
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'BucketNotEmpty' or attempt == attempts:
+                raise
+
+    return results
+
+
+def get_stack_status(cloudformation_client, stack_name: str) -> str:
+    """
+    @param cloudformation_client: CloudFormation client for the environment's account and region
+    @param stack_name str: The stack name
+
+    @return: str: The stack status, None if the stack does not exist
+    """
+    try:
+        return cloudformation_client.describe_stacks(StackName=stack_name)['Stacks'][0]['StackStatus']
+    except ClientError as error:
+        if 'does not exist' in error.response['Error']['Message']:
+            return None
+        raise
+
+
+def delete_stack(cloudformation_client, stack_name: str, before_retry=None, attempts: int = DEFAULT_ATTEMPTS) -> str:
+    """
+    Deletes a stack and waits for the deletion to complete. Deleting a bucket fails while it has objects,
+    so a failed deletion is retried after calling before_retry, e.g. to purge buckets again.
+
+    @param cloudformation_client: CloudFormation client for the environment's account and region
+    @param stack_name str: The stack name
+    @param before_retry: Optional callable without arguments, called before every retry
+    @param attempts int: Maximum number of deletions
+
+    @raises: Exception: Throws an exception if the stack is not deleted after the last attempt
+    @return: str: DELETE_COMPLETE, or NOT_FOUND if the stack does not exist
+    """
+    if get_stack_status(cloudformation_client, stack_name) is None:
+        return 'NOT_FOUND'
+
+    for attempt in range(1, attempts + 1):
+        cloudformation_client.delete_stack(StackName=stack_name)
+        try:
+            cloudformation_client.get_waiter('stack_delete_complete').wait(
+                StackName=stack_name, WaiterConfig=STACK_WAITER_CONFIG,
+            )
+            return 'DELETE_COMPLETE'
+        except WaiterError as error:
+            if attempt == attempts:
+                raise Exception(f'Stack {stack_name} was not deleted after {attempts} attempts: {error}')
+            if before_retry:
+                before_retry()
+
+
+def delete_stacks(cloudformation_client, environment: str, before_retry=None) -> list:
+    """
+    Deletes the stacks of an environment, the stacks that import outputs of others first, then the rest concurrently
+
+    @param cloudformation_client: CloudFormation client for the environment's account and region
+    @param environment str: The target environment
+    @param before_retry: Optional callable without arguments, called before a failed deletion is retried
+
+    @raises: Exception: Throws the first exception raised by a deletion
+    @return: list: (stack name, status) tuples
+    """
+    stack_names = get_stack_names(environment)
+    ordered_keys = [key for keys in STACK_DELETION_ORDER for key in keys]
+    groups = [[stack_names[key] for key in keys if key in stack_names] for keys in STACK_DELETION_ORDER]
+    groups.append([stack_name for key, stack_name in stack_names.items() if key not in ordered_keys])
+
+    results = []
+    for group in groups:
+        for stack_name, status, error in run_concurrently(
+            lambda name: delete_stack(cloudformation_client, name, before_retry), group, len(group) or 1
+        ):
+            if error:
+                raise error
+            results.append((stack_name, status))
+
+    return results
+
+
+def teardown(environment: str, s3_client, cloudformation_client=None, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Tears an environment down:
+    1. Stops server access logging and purges all object versions and delete markers of the environment's buckets
+    2. Deletes the stacks, purging again if a bucket deletion failed because objects were delivered meanwhile
+    3. Purges and deletes the buckets that are still there, the retained ones
+
+    @param environment str: The target environment, see check_teardown_allowed
+    @param s3_client: S3 client for the environment's account and region, or for a local S3 stand-in
+    @param cloudformation_client: CloudFormation client for the environment, None to only purge and delete buckets
+    @param max_workers int: Number of concurrent DeleteObjects calls per bucket
+
+    @raises: Exception: Throws an exception if teardown is not allowed for the environment
+    @return: dict: Purge results per bucket and pass, and the status per stack
+    """
+    check_teardown_allowed(environment)
+    start = time.perf_counter()
+    buckets = list_existing_buckets(s3_client, get_teardown_buckets(environment))
+    stop_access_logging(s3_client, [bucket for bucket in buckets if not bucket.endswith(ACCESS_LOGS)])
+    purges = purge_buckets(s3_client, buckets, max_workers)
+
+    stacks = []
+    if cloudformation_client:
+        def purge_remaining_buckets():
+            purges.extend(purge_buckets(s3_client, list_existing_buckets(s3_client, buckets), max_workers))
+
+        stacks = delete_stacks(cloudformation_client, environment, purge_remaining_buckets)
+
+    for _, results, error in run_concurrently(
+        lambda bucket: delete_bucket(s3_client, bucket, max_workers), list_existing_buckets(s3_client, buckets)
+    ):
+        if error:
+            raise error
+        purges.extend(results)
+
+    return {
+        'environment': environment,
+        'purges': purges,
+        'stacks': stacks,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def format_report(report: dict) -> str:
+    """
+    Formats the teardown report as plain text tables, with the purge passes of each bucket summed
+
+    @param report dict: The report, see teardown
+    @return: str:
+    """
+    totals = {}
+    for purge in report['purges']:
+        total = totals.setdefault(purge['bucket'], {'versions': 0, 'deleteMarkers': 0, 'errors': 0, 'seconds': 0})
+        for field in total:
+            total[field] += purge[field]
+    sections = [format_table(
+        ['Bucket', 'Versions', 'Delete markers', 'Errors', 'Seconds'],
+        [
+            [bucket, total['versions'], total['deleteMarkers'], total['errors'], f'{total["seconds"]:.1f}']
+            for bucket, total in totals.items()
+        ],
+    )]
+    if report['stacks']:
+        sections.append(format_table(['Stack', 'Status'], report['stacks']))
+    sections.append(f'Tore down {report["environment"]} in {report["seconds"]:.1f} seconds')
+
+    return '\n\n'.join(sections)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Purges the versioned buckets and deletes the stacks of a non-Prod environment that allows '
+                    f'teardown ({ALLOW_TEARDOWN} in configuration.py), or of an ephemeral branch environment'
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--environment', choices=[DEV, TEST])
+    target.add_argument('--branch', help='Feature branch of an ephemeral environment, deployed with EPHEMERAL_BRANCH')
+    parser.add_argument('--profile', help='Named profile for the environment account')
+    parser.add_argument(
+        '--endpoint-url', help='Endpoint of a local S3-compatible stand-in, e.g. moto_server, implies --skip-stacks'
+    )
+    parser.add_argument('--skip-stacks', action='store_true', help='Only purge and delete the buckets')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help='DeleteObjects calls per bucket')
+    parser.add_argument('--yes', action='store_true', help='Do not ask for confirmation')
+    arguments = parser.parse_args()
+
+    target_environment = arguments.environment or get_ephemeral_environment(arguments.branch)
+    check_teardown_allowed(target_environment)
+    if not arguments.yes and input(
+        f'Permanently delete all data and stacks of {target_environment}? Type the environment name to confirm: '
+    ) != target_environment:
+        sys.exit('Teardown cancelled')
+
+    session_cache = SessionCache()
+    region = get_environment_configuration(target_environment)[REGION]
+    environment_s3_client = session_cache.session(arguments.profile, region).client(
+        's3', endpoint_url=arguments.endpoint_url
+    )
+    environment_cloudformation_client = None
+    if not arguments.skip_stacks and not arguments.endpoint_url:
+        environment_cloudformation_client = session_cache.client('cloudformation', arguments.profile, region)
+
+    teardown_report = teardown(
+        target_environment, environment_s3_client, environment_cloudformation_client, arguments.workers
+    )
+    print(format_report(teardown_report))
+    if any(purge['errors'] for purge in teardown_report['purges']):
+        sys.exit(1)
@@ -3,11 +3,24 @@
 
 import aws_cdk.core as cdk
 import aws_cdk.aws_ec2 as ec2
+import aws_cdk.aws_iam as iam
+import aws_cdk.aws_kms as kms
+import aws_cdk.aws_s3 as s3
 from .configuration import (
-    AVAILABILITY_ZONE_1, AVAILABILITY_ZONE_2, AVAILABILITY_ZONE_3, ROUTE_TABLE_1, ROUTE_TABLE_2, ROUTE_TABLE_3,
-    SHARED_SECURITY_GROUP_ID, SUBNET_ID_1, SUBNET_ID_2, SUBNET_ID_3, VPC_CIDR, VPC_ID,
-    get_environment_configuration, get_logical_id_prefix
+    AVAILABILITY_ZONE_1, AVAILABILITY_ZONE_2, AVAILABILITY_ZONE_3, ENABLE_FLOW_LOGS, ENABLE_INTERFACE_ENDPOINTS,
+    NAT_GATEWAYS, PROD, ROUTE_TABLE_1, ROUTE_TABLE_2, ROUTE_TABLE_3, SHARED_SECURITY_GROUP_ID, SUBNET_ID_1,
+    SUBNET_ID_2, SUBNET_ID_3, TEST, VPC_CIDR, VPC_ID, VPC_STACK, get_bucket_name, get_environment_configuration,
+    get_logical_id_prefix, get_resource_name_prefix
 )
+from .output_registry import publish_output
+from .stack_sharding import StackShards
+
+# Flow log record fields, including the fields that show which path and AWS service the traffic takes
+FLOW_LOG_FIELDS = [
+    'version', 'account-id', 'interface-id', 'srcaddr', 'dstaddr', 'srcport', 'dstport', 'protocol', 'packets',
+    'bytes', 'start', 'end', 'action', 'log-status', 'vpc-id', 'subnet-id', 'instance-id', 'type', 'pkt-srcaddr',
+    'pkt-dstaddr', 'pkt-src-aws-service', 'pkt-dst-aws-service', 'flow-direction', 'traffic-path',
+]
 
 
 class VpcStack(cdk.Stack):
@@ -28,7 +41,7 @@ class VpcStack(cdk.Stack):
         mappings = get_environment_configuration(target_environment)
         vpc_cidr = mappings[VPC_CIDR]
         logical_id_prefix = get_logical_id_prefix()
-        vpc = ec2.Vpc(self, f'{logical_id_prefix}Vpc', cidr=vpc_cidr)
+        vpc = ec2.Vpc(self, f'{logical_id_prefix}Vpc', cidr=vpc_cidr, nat_gateways=mappings[NAT_GATEWAYS])
         shared_security_group_ingress = ec2.SecurityGroup(
             self,
             f'{target_environment}{logical_id_prefix}SharedIngressSecurityGroup',
@@ -49,96 +62,219 @@ class VpcStack(cdk.Stack):
             f'{target_environment}{logical_id_prefix}DynamoEndpoint',
             service=ec2.GatewayVpcEndpointAwsService.DYNAMODB
         )
-        vpc.add_interface_endpoint(
-            f'{target_environment}{logical_id_prefix}GlueEndpoint',
-            service=ec2.InterfaceVpcEndpointAwsService.GLUE,
-            security_groups=[shared_security_group_ingress],
-        )
-        vpc.add_interface_endpoint(
-            f'{target_environment}{logical_id_prefix}KmsEndpoint',
-            service=ec2.InterfaceVpcEndpointAwsService.KMS,
-            security_groups=[shared_security_group_ingress],
-        )
-        vpc.add_interface_endpoint(
-            f'{target_environment}{logical_id_prefix}SsmEndpoint',
-            service=ec2.InterfaceVpcEndpointAwsService.SSM,
-            security_groups=[shared_security_group_ingress],
-        )
-        vpc.add_interface_endpoint(
-            f'{target_environment}{logical_id_prefix}SecretsManagerEndpoint',
-            service=ec2.InterfaceVpcEndpointAwsService.SECRETS_MANAGER,
-            security_groups=[shared_security_group_ingress],
-        )
-        vpc.add_interface_endpoint(
-            f'{target_environment}{logical_id_prefix}StepFunctionsEndpoint',
-            service=ec2.InterfaceVpcEndpointAwsService.STEP_FUNCTIONS,
-            security_groups=[shared_security_group_ingress],
-        )
+        if mappings[ENABLE_INTERFACE_ENDPOINTS]:
+            self.create_interface_endpoints(vpc, shared_security_group_ingress, target_environment, logical_id_prefix)
+        if mappings[ENABLE_FLOW_LOGS]:
+            self.create_flow_logs(vpc, target_environment, logical_id_prefix)
 
-        # Stack Outputs that are programmatically synchronized
-        cdk.CfnOutput(
+        # Stack Outputs that are programmatically synchronized, also published to SSM Parameter Store
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}Vpc',
             value=vpc.vpc_id,
-            export_name=mappings[VPC_ID],
+            output_key=VPC_ID,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcAvailabilityZone1',
             value=vpc.availability_zones[0],
-            export_name=mappings[AVAILABILITY_ZONE_1],
+            output_key=AVAILABILITY_ZONE_1,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcAvailabilityZone2',
             value=vpc.availability_zones[1],
-            export_name=mappings[AVAILABILITY_ZONE_2],
+            output_key=AVAILABILITY_ZONE_2,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcAvailabilityZone3',
             value=vpc.availability_zones[2],
-            export_name=mappings[AVAILABILITY_ZONE_3],
+            output_key=AVAILABILITY_ZONE_3,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcPrivateSubnet1',
             value=vpc.private_subnets[0].subnet_id,
-            export_name=mappings[SUBNET_ID_1],
+            output_key=SUBNET_ID_1,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcPrivateSubnet2',
             value=vpc.private_subnets[1].subnet_id,
-            export_name=mappings[SUBNET_ID_2],
+            output_key=SUBNET_ID_2,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcPrivateSubnet3',
             value=vpc.private_subnets[2].subnet_id,
-            export_name=mappings[SUBNET_ID_3],
+            output_key=SUBNET_ID_3,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcRouteTable1',
             value=vpc.private_subnets[0].route_table.route_table_id,
-            export_name=mappings[ROUTE_TABLE_1],
+            output_key=ROUTE_TABLE_1,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcRouteTable2',
             value=vpc.private_subnets[1].route_table.route_table_id,
-            export_name=mappings[ROUTE_TABLE_2],
+            output_key=ROUTE_TABLE_2,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}VpcRouteTable3',
             value=vpc.private_subnets[2].route_table.route_table_id,
-            export_name=mappings[ROUTE_TABLE_3],
+            output_key=ROUTE_TABLE_3,
+            mappings=mappings,
         )
-        cdk.CfnOutput(
+        publish_output(
             self,
             f'{target_environment}{logical_id_prefix}SharedSecurityGroup',
             value=shared_security_group_ingress.security_group_id,
-            export_name=mappings[SHARED_SECURITY_GROUP_ID]
+            output_key=SHARED_SECURITY_GROUP_ID,
+            mappings=mappings,
         )
+
+    def create_interface_endpoints(self, vpc: ec2.Vpc, security_group: ec2.SecurityGroup, target_environment: str,
+                                   logical_id_prefix: str):
+        """
+        Creates the interface endpoints of the services the data lake calls from the VPC.
+        The endpoints move to a nested stack when the stack is sharded.
+
+        @param vpc ec2.Vpc: The VPC to create the endpoints in
+        @param security_group ec2.SecurityGroup: The security group attached to the endpoints
+        @param target_environment str: The target environment for stacks in the deploy stage
+        @param logical_id_prefix str: The logical id prefix to apply to all CloudFormation resources
+        """
+        endpoint_scope = StackShards(self, target_environment, VPC_STACK).scope('Endpoints', default_scope=vpc)
+        for endpoint_name, endpoint_service in (
+            ('Glue', ec2.InterfaceVpcEndpointAwsService.GLUE),
+            ('Kms', ec2.InterfaceVpcEndpointAwsService.KMS),
+            ('Ssm', ec2.InterfaceVpcEndpointAwsService.SSM),
+            ('SecretsManager', ec2.InterfaceVpcEndpointAwsService.SECRETS_MANAGER),
+            ('StepFunctions', ec2.InterfaceVpcEndpointAwsService.STEP_FUNCTIONS),
+        ):
+            ec2.InterfaceVpcEndpoint(
+                endpoint_scope,
+                f'{target_environment}{logical_id_prefix}{endpoint_name}Endpoint',
+                vpc=vpc,
+                service=endpoint_service,
+                security_groups=[security_group],
+            )
+
+    def create_flow_logs(self, vpc: ec2.Vpc, target_environment: str, logical_id_prefix: str) -> s3.Bucket:
+        """
+        Creates VPC flow logs delivered to an encrypted Amazon S3 bucket as Parquet files
+        in Hive-compatible hourly partitions, which Athena and the flow log analyzer can read directly.
+
+        @param vpc ec2.Vpc: The VPC to capture traffic of
+        @param target_environment str: The target environment for stacks in the deploy stage
+        @param logical_id_prefix str: The logical id prefix to apply to all CloudFormation resources
+
+        @return: s3.Bucket: The bucket the flow logs are delivered to
+        """
+        removal_policy = cdk.RemovalPolicy.DESTROY
+        if (target_environment == PROD or target_environment == TEST):
+            removal_policy = cdk.RemovalPolicy.RETAIN
+        log_delivery_principal = iam.ServicePrincipal('delivery.logs.amazonaws.com')
+        flow_logs_key = kms.Key(
+            self,
+            f'{target_environment}{logical_id_prefix}FlowLogsKey',
+            admins=[iam.AccountPrincipal(self.account)],
+            description='Key used for encrypting VPC flow logs',
+            removal_policy=removal_policy,
+            alias=f'{target_environment.lower()}-{get_resource_name_prefix()}-flow-logs-kms-key'
+        )
+        # Log delivery encrypts the objects it writes with the bucket's key
+        flow_logs_key.add_to_resource_policy(
+            iam.PolicyStatement(
+                principals=[log_delivery_principal],
+                actions=[
+                    'kms:Encrypt',
+                    'kms:Decrypt',
+                    'kms:ReEncrypt*',
+                    'kms:GenerateDataKey*',
+                    'kms:DescribeKey',
+                ],
+                resources=['*'],
+            )
+        )
+        flow_logs_bucket = s3.Bucket(
+            self,
+            f'{target_environment}{logical_id_prefix}FlowLogsBucket',
+            access_control=s3.BucketAccessControl.PRIVATE,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            bucket_key_enabled=True,
+            bucket_name=get_bucket_name(target_environment, 'flow-logs', self.account, self.region),
+            encryption=s3.BucketEncryption.KMS,
+            encryption_key=flow_logs_key,
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    enabled=True,
+                    expiration=cdk.Duration.days(90),
+                )
+            ],
+            public_read_access=False,
+            removal_policy=removal_policy,
+        )
+        flow_logs_bucket.add_to_resource_policy(
+            iam.PolicyStatement(
+                sid='AWSLogDeliveryWrite',
+                principals=[log_delivery_principal],
+                actions=['s3:PutObject'],
+                resources=[flow_logs_bucket.arn_for_objects('AWSLogs/*')],
+                conditions={
+                    'StringEquals': {
+                        's3:x-amz-acl': 'bucket-owner-full-control',
+                        'aws:SourceAccount': self.account,
+                    },
+                },
+            )
+        )
+        flow_logs_bucket.add_to_resource_policy(
+            iam.PolicyStatement(
+                sid='AWSLogDeliveryAclCheck',
+                principals=[log_delivery_principal],
+                actions=['s3:GetBucketAcl'],
+                resources=[flow_logs_bucket.bucket_arn],
+                conditions={
+                    'StringEquals': {
+                        'aws:SourceAccount': self.account,
+                    },
+                },
+            )
+        )
+        flow_log = ec2.FlowLog(
+            self,
+            f'{target_environment}{logical_id_prefix}VpcFlowLog',
+            resource_type=ec2.FlowLogResourceType.from_vpc(vpc),
+            destination=ec2.FlowLogDestination.to_s3(flow_logs_bucket),
+            traffic_type=ec2.FlowLogTrafficType.ALL,
+        )
+        # Not exposed by the FlowLog construct in this CDK version
+        cfn_flow_log = flow_log.node.find_child('FlowLog')
+        cfn_flow_log.add_property_override(
+            'LogFormat', ' '.join(f'${{{field}}}' for field in FLOW_LOG_FIELDS)
+        )
+        cfn_flow_log.add_property_override(
+            'DestinationOptions',
+            {
+                'FileFormat': 'parquet',
+                'HiveCompatiblePartitions': True,
+                'PerHourPartition': True,
+            },
+        )
+        flow_log.node.add_dependency(flow_logs_bucket.policy)
+
+        return flow_logs_bucket
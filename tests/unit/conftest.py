@@ -0,0 +1,103 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+import aws_cdk.core as cdk
+import pytest
+
+import lib.configuration
+import lib.stack_sharding
+from lib.configuration import (
+    ACCOUNT_ID, ALLOW_TEARDOWN, CODESTAR_CONNECTION_ARN, COMPACTION_SCHEDULE, COMPACTION_TARGET_FILE_BYTES, DEPLOYMENT,
+    DEV, ENABLE_COMPACTION, ENABLE_FLOW_LOGS, ENABLE_INTERFACE_ENDPOINTS, GITHUB_REPOSITORY_NAME,
+    GITHUB_REPOSITORY_OWNER_NAME, KEY_LAYOUT, LOGICAL_ID_PREFIX, MAX_STACK_RESOURCES, MAX_TEMPLATE_BYTES, NAT_GATEWAYS,
+    PROD, QUOTA_PREFLIGHT, REGION, RESOURCE_NAME_PREFIX, SHARDED_STACKS, SOURCE_EXCLUDE_PATHS, SOURCE_INCLUDE_PATHS,
+    TEST, VPC_CIDR, is_ephemeral_environment,
+)
+from lib.pipeline_deploy_stage import PipelineDeployStage
+
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_cdk_context() -> dict:
+    with open(os.path.join(PROJECT_DIRECTORY, 'cdk.json')) as cdk_json:
+        return json.load(cdk_json)['context']
+
+
+def create_target_configuration(account_id: str, vpc_cidr: str) -> dict:
+    return {
+        ACCOUNT_ID: account_id,
+        REGION: 'us-east-2',
+        VPC_CIDR: vpc_cidr,
+        SOURCE_INCLUDE_PATHS: [],
+        SOURCE_EXCLUDE_PATHS: ['README.md', 'resources/**'],
+        QUOTA_PREFLIGHT: False,
+        SHARDED_STACKS: [],
+        ENABLE_FLOW_LOGS: False,
+        NAT_GATEWAYS: 3,
+        ENABLE_INTERFACE_ENDPOINTS: True,
+        KEY_LAYOUT: {},
+        ENABLE_COMPACTION: False,
+        COMPACTION_TARGET_FILE_BYTES: 128 * 1024 * 1024,
+        COMPACTION_SCHEDULE: 'cron(0 3 * * ? *)',
+        ALLOW_TEARDOWN: False,
+    }
+
+
+@pytest.fixture
+def configuration(monkeypatch):
+    """
+    Replaces the local configuration, which ships without accounts and prefixes, with a filled-in one.
+    Tests may change the returned mappings before they are read.
+    """
+    local_mapping = {
+        DEPLOYMENT: {
+            ACCOUNT_ID: '111111111111',
+            REGION: 'us-east-2',
+            GITHUB_REPOSITORY_OWNER_NAME: 'owner',
+            GITHUB_REPOSITORY_NAME: 'repository',
+            LOGICAL_ID_PREFIX: 'DataLakeTest',
+            RESOURCE_NAME_PREFIX: 'unit-test',
+            CODESTAR_CONNECTION_ARN: '',
+            MAX_STACK_RESOURCES: 400,
+            MAX_TEMPLATE_BYTES: 800000,
+        },
+        DEV: create_target_configuration('222222222222', '10.20.0.0/24'),
+        TEST: create_target_configuration('333333333333', '10.10.0.0/24'),
+        PROD: create_target_configuration('444444444444', '10.0.0.0/24'),
+    }
+
+    def get_local_configuration(environment):
+        if is_ephemeral_environment(environment):
+            return {**local_mapping[DEV], NAT_GATEWAYS: 1, ENABLE_INTERFACE_ENDPOINTS: False, ALLOW_TEARDOWN: True}
+        return local_mapping[environment]
+
+    monkeypatch.setattr(lib.configuration, 'get_local_configuration', get_local_configuration)
+    monkeypatch.setattr(lib.stack_sharding, 'get_local_configuration', get_local_configuration)
+
+    return local_mapping
+
+
+@pytest.fixture
+def synthesize_stage(configuration, tmp_path):
+    """
+    Returns a function that synthesizes the deploy stage of an environment, as the pipeline deploys it,
+    and returns the cloud assembly directory
+    """
+    def synthesize(environment: str = DEV) -> str:
+        app = cdk.App(outdir=str(tmp_path / 'cdk.out'), context=get_cdk_context())
+        PipelineDeployStage(
+            app,
+            environment,
+            target_environment=environment,
+            deployment_account_id=configuration[DEPLOYMENT][ACCOUNT_ID],
+            env=cdk.Environment(
+                account=configuration[environment][ACCOUNT_ID], region=configuration[environment][REGION]
+            ),
+        )
+        return app.synth().directory
+
+    return synthesize
@@ -0,0 +1,151 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from lib.configuration import ACCOUNT_ID, DEPLOYMENT, DEV, REGION, TEST
+from lib.prerequisites.bootstrap_accounts import (
+    BOOTSTRAP_STACK_NAME, FAILED, OK, SKIPPED, get_bootstrap_version, prepare_accounts, put_secret,
+)
+from lib.sessions import SessionCache
+
+REGION_NAME = 'us-east-2'
+SECRET_NAME = '/DataLake/GitHubToken'
+MAPPINGS = {
+    DEPLOYMENT: {ACCOUNT_ID: '111111111111', REGION: REGION_NAME},
+    DEV: {ACCOUNT_ID: '222222222222', REGION: REGION_NAME},
+    TEST: {ACCOUNT_ID: '333333333333', REGION: REGION_NAME},
+}
+
+
+def create_client(service_name):
+    return boto3.client(
+        service_name, region_name=REGION_NAME, aws_access_key_id='testing', aws_secret_access_key='testing'
+    )
+
+
+def bootstrap_stack(outputs):
+    return {'Stacks': [{
+        'StackName': BOOTSTRAP_STACK_NAME,
+        'CreationTime': datetime.datetime(2021, 6, 30),
+        'StackStatus': 'UPDATE_COMPLETE',
+        'Outputs': [{'OutputKey': key, 'OutputValue': value} for key, value in outputs.items()],
+    }]}
+
+
+@pytest.fixture
+def secrets_manager():
+    client = create_client('secretsmanager')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def cloudformation():
+    client = create_client('cloudformation')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_put_secret_creates_a_missing_secret(secrets_manager):
+    client, stubber = secrets_manager
+    stubber.add_client_error('get_secret_value', 'ResourceNotFoundException', expected_params={
+        'SecretId': SECRET_NAME,
+    })
+    stubber.add_response('create_secret', {}, {'Name': SECRET_NAME, 'SecretString': 'token'})
+
+    assert put_secret(client, SECRET_NAME, 'token') == 'created'
+
+
+def test_put_secret_leaves_an_equal_value_unchanged(secrets_manager):
+    client, stubber = secrets_manager
+    stubber.add_response('get_secret_value', {'SecretString': 'token'}, {'SecretId': SECRET_NAME})
+
+    assert put_secret(client, SECRET_NAME, 'token') == 'unchanged'
+
+
+def test_put_secret_stores_a_new_version_of_a_changed_value(secrets_manager):
+    client, stubber = secrets_manager
+    stubber.add_response('get_secret_value', {'SecretString': 'old'}, {'SecretId': SECRET_NAME})
+    stubber.add_response('put_secret_value', {}, {'SecretId': SECRET_NAME, 'SecretString': 'token'})
+
+    assert put_secret(client, SECRET_NAME, 'token') == 'updated'
+
+
+def test_get_bootstrap_version_reads_the_stack_output(cloudformation):
+    client, stubber = cloudformation
+    stubber.add_response(
+        'describe_stacks', bootstrap_stack({'BootstrapVersion': '8'}), {'StackName': BOOTSTRAP_STACK_NAME}
+    )
+    stubber.add_response('describe_stacks', bootstrap_stack({}), {'StackName': BOOTSTRAP_STACK_NAME})
+
+    assert get_bootstrap_version(client) == 8
+    assert get_bootstrap_version(client) == 0
+
+
+def test_get_bootstrap_version_of_an_account_that_is_not_bootstrapped(cloudformation):
+    client, stubber = cloudformation
+    stubber.add_client_error(
+        'describe_stacks', 'ValidationError', f'Stack with id {BOOTSTRAP_STACK_NAME} does not exist'
+    )
+    stubber.add_client_error('describe_stacks', 'AccessDenied', 'Not authorized')
+
+    assert get_bootstrap_version(client) == 0
+    with pytest.raises(ClientError):
+        get_bootstrap_version(client)
+
+
+def test_prepare_accounts_isolates_failures_per_account():
+    session_cache = SessionCache()
+    stubbers = []
+
+    def stub(service_name, environment):
+        client = create_client(service_name)
+        session_cache.set_client(client, service_name, environment.lower(), REGION_NAME)
+        stubbers.append(Stubber(client))
+        return stubbers[-1]
+
+    for environment in MAPPINGS:
+        sts = stub('sts', environment)
+        if environment == DEV:
+            sts.add_client_error('get_caller_identity', 'ExpiredToken', 'The security token has expired')
+        else:
+            sts.add_response('get_caller_identity', {
+                'Account': MAPPINGS[environment][ACCOUNT_ID], 'Arn': 'arn:aws:iam::111111111111:user/admin',
+            })
+            cloudformation = stub('cloudformation', environment)
+            if environment == TEST:
+                cloudformation.add_client_error('describe_stacks', 'AccessDenied', 'Not authorized')
+            else:
+                cloudformation.add_response('describe_stacks', bootstrap_stack({'BootstrapVersion': '8'}))
+    stub('secretsmanager', DEPLOYMENT).add_client_error('get_secret_value', 'AccessDeniedException', 'Not authorized')
+    for stubber in stubbers:
+        stubber.activate()
+
+    statuses = dict(prepare_accounts(
+        {environment: environment.lower() for environment in MAPPINGS},
+        {SECRET_NAME: 'token'},
+        bootstrap=False,
+        execution_policy='',
+        session_cache=session_cache,
+        mappings=MAPPINGS,
+    ))
+
+    assert statuses[DEPLOYMENT]['credentials'] == OK
+    assert statuses[DEPLOYMENT]['secrets'].startswith(FAILED)
+    assert statuses[DEPLOYMENT]['bootstrap'] == f'{OK} (version 8)'
+    # Without valid credentials the account's other steps are skipped
+    assert statuses[DEV]['credentials'].startswith(FAILED)
+    assert statuses[DEV]['bootstrap'] == SKIPPED
+    assert statuses[TEST]['credentials'] == OK
+    assert statuses[TEST]['secrets'] == SKIPPED
+    assert statuses[TEST]['bootstrap'].startswith(FAILED)
+    for stubber in stubbers:
+        stubber.assert_no_pending_responses()
@@ -0,0 +1,29 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from lib.cloud_assembly import find_nested_templates, find_stack_templates
+from lib.configuration import DEV, SHARDED_STACKS, VPC_STACK, get_stack_names
+from lib.prerequisites.preflight_quota_check import count_resources, is_vpc_endpoint, load_synthesized_templates
+
+
+def count_interface_endpoints(cdk_out):
+    templates = load_synthesized_templates(cdk_out, [get_stack_names(DEV)[VPC_STACK]])
+    return count_resources(templates[get_stack_names(DEV)[VPC_STACK]], is_vpc_endpoint('Interface'))
+
+
+def test_unsharded_stacks_have_no_nested_templates(synthesize_stage):
+    cdk_out = synthesize_stage(DEV)
+
+    assert find_nested_templates(cdk_out, [get_stack_names(DEV)[VPC_STACK]]) == {get_stack_names(DEV)[VPC_STACK]: []}
+    assert count_interface_endpoints(cdk_out) == 5
+
+
+def test_resources_of_sharded_stacks_are_counted_from_nested_templates(configuration, synthesize_stage):
+    configuration[DEV][SHARDED_STACKS] = [VPC_STACK]
+    cdk_out = synthesize_stage(DEV)
+    vpc_stack_name = get_stack_names(DEV)[VPC_STACK]
+
+    # The interface endpoints moved out of the top-level template
+    assert count_resources(find_stack_templates(cdk_out, [vpc_stack_name]).values(), is_vpc_endpoint('Interface')) == 0
+    assert len(find_nested_templates(cdk_out, [vpc_stack_name])[vpc_stack_name]) == 1
+    assert count_interface_endpoints(cdk_out) == 5
@@ -0,0 +1,105 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import json
+
+import pytest
+
+from lib.compaction.compactor import (
+    MANIFEST_NAME, LocalObjectStore, compact, compact_partition, get_live_keys, get_staged_key, read_manifest,
+)
+
+PARTITION = 'orders/year=2021/month=06/day=30/'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalObjectStore(str(tmp_path))
+
+
+def put_lines(store, key, *lines):
+    store.put(key, ''.join(f'{json.dumps(line)}\n' for line in lines).encode('utf-8'))
+
+
+def read_lines(store, keys):
+    return [json.loads(line) for key in keys for line in store.get(key).decode('utf-8').splitlines()]
+
+
+def test_compact_merges_small_objects_of_a_partition(store):
+    for index in range(3):
+        put_lines(store, f'{PARTITION}part-{index}.json', {'id': index})
+    store.put(f'{PARTITION}_SUCCESS', b'')
+
+    results = compact(store, target_file_bytes=1024)
+
+    assert results == [{'partition': PARTITION, 'replaced': 3, 'written': 1}]
+    live_keys = get_live_keys(store, PARTITION)
+    assert len(live_keys) == 1
+    assert read_lines(store, live_keys) == [{'id': 0}, {'id': 1}, {'id': 2}]
+    assert sorted(store.list(PARTITION)) == sorted(live_keys + [f'{PARTITION}_SUCCESS', f'{PARTITION}{MANIFEST_NAME}'])
+
+
+def test_compact_leaves_objects_of_the_target_size_alone(store):
+    put_lines(store, f'{PARTITION}large.json', {'payload': 'x' * 100})
+    put_lines(store, f'{PARTITION}small.json', {'id': 1})
+
+    assert compact(store, target_file_bytes=64) == []
+    assert get_live_keys(store, PARTITION) == [f'{PARTITION}large.json', f'{PARTITION}small.json']
+
+
+def test_staged_objects_are_hidden_until_the_manifest_lists_them(store):
+    put_lines(store, f'{PARTITION}part-0.json', {'id': 0})
+    put_lines(store, f'{PARTITION}part-1.json', {'id': 1})
+    # An earlier run wrote a staged object but failed before writing the manifest
+    put_lines(store, get_staged_key(f'{PARTITION}compacted-old-00000.json'), {'id': 0}, {'id': 1})
+
+    assert get_live_keys(store, PARTITION) == [f'{PARTITION}part-0.json', f'{PARTITION}part-1.json']
+
+    compact_partition(store, PARTITION, target_file_bytes=1024, run_id='new')
+
+    assert get_live_keys(store, PARTITION) == [f'{PARTITION}compacted-new-00000.json']
+    assert read_lines(store, get_live_keys(store, PARTITION)) == [{'id': 0}, {'id': 1}]
+
+
+def test_interrupted_run_is_finished_from_the_manifest(store):
+    put_lines(store, f'{PARTITION}part-0.json', {'id': 0})
+    put_lines(store, f'{PARTITION}part-1.json', {'id': 1})
+    compacted_key = f'{PARTITION}compacted-old-00000.json'
+    put_lines(store, get_staged_key(compacted_key), {'id': 0}, {'id': 1})
+    # An earlier run wrote the manifest but failed before moving the staged object and deleting the replaced ones
+    store.put(f'{PARTITION}{MANIFEST_NAME}', json.dumps({
+        'runId': 'old',
+        'compacted': [compacted_key],
+        'staged': {get_staged_key(compacted_key): compacted_key},
+        'replaced': [f'{PARTITION}part-0.json', f'{PARTITION}part-1.json'],
+    }).encode('utf-8'))
+
+    assert get_live_keys(store, PARTITION) == [get_staged_key(compacted_key)]
+
+    compact_partition(store, PARTITION, target_file_bytes=1024, run_id='new')
+
+    assert get_live_keys(store, PARTITION) == [compacted_key]
+    assert sorted(store.list(PARTITION)) == [f'{PARTITION}{MANIFEST_NAME}', compacted_key]
+
+
+def test_partition_that_fails_to_merge_is_skipped(store):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    pyarrow = pytest.importorskip('pyarrow')
+    failing_partition = 'events/year=2021/month=06/day=30/'
+    for index, table in enumerate([pyarrow.table({'id': [1]}), pyarrow.table({'name': ['a']})]):
+        body = io.BytesIO()
+        parquet.write_table(table, body)
+        store.put(f'{failing_partition}part-{index}.parquet', body.getvalue())
+    for index in range(2):
+        put_lines(store, f'{PARTITION}part-{index}.json', {'id': index})
+
+    results = compact(store, target_file_bytes=1024 * 1024)
+
+    assert [result['partition'] for result in results] == [failing_partition, PARTITION]
+    assert 'error' in results[0]
+    assert results[1]['written'] == 1
+    assert sorted(store.list(failing_partition)) == [
+        f'{failing_partition}part-0.parquet', f'{failing_partition}part-1.parquet',
+    ]
+    assert read_manifest(store, failing_partition)['compacted'] == []
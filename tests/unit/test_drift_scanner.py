@@ -0,0 +1,135 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from lib.tools import drift_scanner
+from lib.tools.drift_scanner import (
+    DRIFTED, FAILED, IN_SYNC, MISSING, TIMED_OUT, UNEXPECTED_STACK, check_exports, detect_drift,
+)
+
+ENVIRONMENT = 'Dev'
+STACK_ID = 'arn:aws:cloudformation:us-east-2:222222222222:stack/{stack_name}/0f1e2d3c'
+TIMESTAMP = datetime.datetime(2021, 6, 30)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def cloudformation():
+    client = boto3.client(
+        'cloudformation', region_name='us-east-2', aws_access_key_id='testing', aws_secret_access_key='testing'
+    )
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def add_detection_status(stubber, detection_id, stack_name, detection_status, drift_status=None):
+    response = {
+        'StackId': STACK_ID.format(stack_name=stack_name),
+        'StackDriftDetectionId': detection_id,
+        'DetectionStatus': detection_status,
+        'Timestamp': TIMESTAMP,
+    }
+    if drift_status:
+        response['StackDriftStatus'] = drift_status
+    stubber.add_response(
+        'describe_stack_drift_detection_status', response, {'StackDriftDetectionId': detection_id}
+    )
+
+
+def test_detect_drift_reports_every_stack(cloudformation):
+    client, stubber = cloudformation
+    stubber.add_response('detect_stack_drift', {'StackDriftDetectionId': 'in-sync'}, {'StackName': 'InSync'})
+    stubber.add_response('detect_stack_drift', {'StackDriftDetectionId': 'drifted'}, {'StackName': 'Drifted'})
+    stubber.add_client_error(
+        'detect_stack_drift', 'ValidationError', 'Stack with id Missing does not exist', expected_params={
+            'StackName': 'Missing'
+        },
+    )
+    stubber.add_response('detect_stack_drift', {'StackDriftDetectionId': 'failed'}, {'StackName': 'Failed'})
+    add_detection_status(stubber, 'in-sync', 'InSync', 'DETECTION_IN_PROGRESS')
+    add_detection_status(stubber, 'drifted', 'Drifted', 'DETECTION_COMPLETE', DRIFTED)
+    add_detection_status(stubber, 'failed', 'Failed', 'DETECTION_FAILED')
+    stubber.add_response(
+        'describe_stack_resource_drifts',
+        {'StackResourceDrifts': [{
+            'StackId': STACK_ID.format(stack_name='Drifted'),
+            'LogicalResourceId': 'RawBucket',
+            'ResourceType': 'AWS::S3::Bucket',
+            'StackResourceDriftStatus': 'MODIFIED',
+            'Timestamp': TIMESTAMP,
+        }]},
+        {'StackName': 'Drifted', 'StackResourceDriftStatusFilters': ['MODIFIED', 'DELETED']},
+    )
+    add_detection_status(stubber, 'in-sync', 'InSync', 'DETECTION_COMPLETE', IN_SYNC)
+    clock = FakeClock()
+
+    report = detect_drift(
+        [(ENVIRONMENT, name) for name in ['InSync', 'Drifted', 'Missing', 'Failed']],
+        lambda service_name, environment: client,
+        max_workers=1,
+        sleep=clock.sleep,
+        clock=clock.monotonic,
+    )
+
+    assert [(name, status) for _, name, status, _ in report] == [
+        ('InSync', IN_SYNC), ('Drifted', DRIFTED), ('Missing', MISSING), ('Failed', FAILED),
+    ]
+    assert report[1][3] == 'RawBucket (MODIFIED)'
+    assert clock.sleeps == [2, 4]
+
+
+def test_detect_drift_times_out_on_the_injected_clock(cloudformation):
+    client, stubber = cloudformation
+    stubber.add_response('detect_stack_drift', {'StackDriftDetectionId': 'slow'}, {'StackName': 'Slow'})
+    for _ in range(3):
+        add_detection_status(stubber, 'slow', 'Slow', 'DETECTION_IN_PROGRESS')
+    clock = FakeClock()
+
+    report = detect_drift(
+        [(ENVIRONMENT, 'Slow')],
+        lambda service_name, environment: client,
+        timeout_seconds=10,
+        max_workers=1,
+        sleep=clock.sleep,
+        clock=clock.monotonic,
+    )
+
+    assert report == [(ENVIRONMENT, 'Slow', TIMED_OUT, 'Detection slow still in progress')]
+    assert clock.sleeps == [2, 4, 8]
+
+
+def test_check_exports_cross_checks_configured_export_names(cloudformation, monkeypatch):
+    client, stubber = cloudformation
+    monkeypatch.setattr(drift_scanner, 'get_stack_names', lambda environment: {'vpc_stack': 'Dev-Vpc'})
+    monkeypatch.setattr(drift_scanner, 'get_output_export_names', lambda environment: {
+        'vpc_id': 'DevVpcId', 'subnet_id_1': 'DevSubnetId1', 'subnet_id_2': 'DevSubnetId2',
+    })
+    stubber.add_response('list_exports', {'Exports': [
+        {'ExportingStackId': STACK_ID.format(stack_name='Dev-Vpc'), 'Name': 'DevVpcId', 'Value': 'vpc-1'},
+        {'ExportingStackId': STACK_ID.format(stack_name='Other'), 'Name': 'DevSubnetId1', 'Value': 'subnet-1'},
+    ]}, {})
+
+    assert check_exports(client, ENVIRONMENT) == [
+        (ENVIRONMENT, 'DevVpcId', IN_SYNC, 'Dev-Vpc'),
+        (ENVIRONMENT, 'DevSubnetId1', UNEXPECTED_STACK, 'Exported by Other'),
+        (ENVIRONMENT, 'DevSubnetId2', MISSING, 'Export does not exist'),
+    ]
@@ -0,0 +1,94 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from lib.tools.flow_log_analyzer import COLUMNS, aggregate, analyze, bypasses_endpoints, format_report
+
+NAT_INTERFACE = 'eni-0a1b2c3d4e5f00001'
+APP_INTERFACE = 'eni-0a1b2c3d4e5f00002'
+# (interface, destination, AWS service, direction, traffic path, bytes)
+RECORDS = [
+    (NAT_INTERFACE, '52.219.100.1', 'S3', 'egress', 8, 1000),
+    (NAT_INTERFACE, '52.94.0.1', 'DYNAMODB', 'egress', 2, 40),
+    (NAT_INTERFACE, '54.239.0.1', 'AMAZON', 'egress', 8, 50),
+    (APP_INTERFACE, '52.219.100.2', 'S3', 'egress', 1, 500),
+    (APP_INTERFACE, '52.94.0.2', 'DYNAMODB', 'egress', 8, 300),
+    (APP_INTERFACE, '52.219.100.3', 'S3', 'egress', 7, 2000),
+    (APP_INTERFACE, '52.219.100.4', 'S3', 'ingress', 1, 100),
+    (APP_INTERFACE, '10.20.0.10', None, 'egress', None, None),
+]
+
+
+def to_record(row: tuple) -> dict:
+    interface_id, address, service, direction, traffic_path, record_bytes = row
+    return {
+        'interface_id': interface_id,
+        'dstaddr': address,
+        'pkt_dstaddr': address,
+        'pkt_dst_aws_service': service,
+        'flow_direction': direction,
+        'traffic_path': traffic_path,
+        'bytes': record_bytes,
+    }
+
+
+@pytest.fixture
+def flow_logs(tmp_path):
+    """
+    Writes the records as two flow log Parquet files, the second with the hyphenated column names
+    of the log format and a column the analyzer does not read
+    """
+    parquet = pytest.importorskip('pyarrow.parquet')
+    pyarrow = pytest.importorskip('pyarrow')
+    directory = tmp_path / 'hour=00'
+    directory.mkdir()
+    records = [to_record(row) for row in RECORDS]
+    first = pyarrow.table({column: [record[column] for record in records[:4]] for column in COLUMNS})
+    second = pyarrow.table({
+        **{column.replace('_', '-'): [record[column] for record in records[4:]] for column in COLUMNS},
+        'action': ['ACCEPT'] * len(records[4:]),
+    })
+    parquet.write_table(first, str(directory / 'part-0.parquet'))
+    parquet.write_table(second, str(directory / 'part-1.parquet'))
+
+    return str(directory)
+
+
+def test_bypasses_endpoints_flags_nat_egress_and_traffic_paths_1_and_8_to_data_lake_services():
+    flagged = [row for row in RECORDS if bypasses_endpoints(to_record(row), {NAT_INTERFACE})]
+
+    assert flagged == [RECORDS[0], RECORDS[1], RECORDS[3], RECORDS[4]]
+    # Without the NAT interfaces only traffic paths 1 and 8 are flagged
+    assert [row for row in RECORDS if bypasses_endpoints(to_record(row), set())] == [
+        RECORDS[0], RECORDS[3], RECORDS[4],
+    ]
+
+
+def test_aggregate_sums_bytes_per_dimension():
+    report = aggregate((to_record(row) for row in RECORDS), {NAT_INTERFACE})
+
+    assert report['records'] == len(RECORDS)
+    assert report['interface'] == {NAT_INTERFACE: 1090, APP_INTERFACE: 2900}
+    assert report['service'] == {'S3': 3600, 'DYNAMODB': 340, 'AMAZON': 50, '-': 0}
+    assert report['path'] == {
+        'NAT gateway / Internet gateway': 1050,
+        'NAT gateway / Internet gateway or gateway endpoint': 40,
+        'Same VPC': 600,
+        'Internet gateway': 300,
+        'Gateway endpoint': 2000,
+        '-': 0,
+    }
+    assert report['bypassing'] == {
+        (NAT_INTERFACE, 'S3', 'NAT gateway / Internet gateway'): 1000,
+        (NAT_INTERFACE, 'DYNAMODB', 'NAT gateway / Internet gateway or gateway endpoint'): 40,
+        (APP_INTERFACE, 'S3', 'Same VPC'): 500,
+        (APP_INTERFACE, 'DYNAMODB', 'Internet gateway'): 300,
+    }
+
+
+def test_analyze_streams_parquet_files_in_batches(flow_logs):
+    report = analyze(flow_logs, {NAT_INTERFACE}, batch_size=3)
+
+    assert report == {**aggregate((to_record(row) for row in RECORDS), {NAT_INTERFACE}), 'files': 2}
+    assert 'Data lake traffic bypassing the gateway endpoints:' in format_report(report)
@@ -0,0 +1,108 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from lib.configuration import CONFORMED_ZONE, DEV, KEY_LAYOUT, PURPOSE_BUILT_ZONE, RAW_ZONE
+from lib.key_layout import KeyLayout, check_key_layouts, dump_key_layouts, find_past_layout_changes
+from lib.sessions import SessionCache
+
+SHARDED_FROM = datetime.date(2021, 6, 1)
+
+
+@pytest.fixture
+def layout():
+    return KeyLayout({SHARDED_FROM.isoformat(): 16})
+
+
+def test_build_key_shards_from_the_effective_date(layout):
+    assert layout.build_key('orders', datetime.date(2021, 5, 31), 'part-0.json') == \
+        'orders/year=2021/month=05/day=31/part-0.json'
+    assert layout.build_key('orders', SHARDED_FROM, 'part-0.json').startswith('shard=')
+
+
+def test_parse_key_round_trips_sharded_keys(layout):
+    key = layout.build_key('sales/orders', SHARDED_FROM, 'part-0.json')
+
+    parsed = layout.parse_key(key)
+
+    assert parsed['dataset'] == 'sales/orders'
+    assert parsed['date'] == SHARDED_FROM
+    assert parsed['object_name'] == 'part-0.json'
+    assert key.startswith(f'shard={parsed["shard"]:02d}/')
+
+
+def test_parse_key_keeps_a_shard_like_dataset_prefix_of_unsharded_keys(layout):
+    unsharded_date = datetime.date(2021, 5, 31)
+    key = layout.build_key('shard=03/orders', unsharded_date, 'part-0.json')
+
+    assert layout.parse_key(key) == {
+        'shard': None, 'dataset': 'shard=03/orders', 'date': unsharded_date, 'object_name': 'part-0.json',
+    }
+    assert KeyLayout().parse_key(key)['dataset'] == 'shard=03/orders'
+
+
+def test_parse_key_keeps_a_shard_like_dataset_prefix_of_sharded_keys(layout):
+    key = layout.build_key('shard=03/orders', SHARDED_FROM, 'part-0.json')
+
+    assert layout.parse_key(key)['dataset'] == 'shard=03/orders'
+
+
+def test_parse_key_rejects_keys_outside_the_layout(layout):
+    with pytest.raises(Exception, match='no shard prefix'):
+        layout.parse_key('orders/year=2021/month=06/day=01/part-0.json')
+    with pytest.raises(Exception, match='does not follow'):
+        layout.parse_key('orders/part-0.json')
+    wrong_shard = (layout.parse_key(layout.build_key('orders', SHARDED_FROM, 'part-0.json'))['shard'] + 1) % 16
+    with pytest.raises(Exception, match='not in the shard'):
+        layout.parse_key(f'shard={wrong_shard:02d}/orders/year=2021/month=06/day=01/part-0.json')
+
+
+def test_find_past_layout_changes_only_rejects_past_dates_of_zones_with_data():
+    today = datetime.date(2021, 6, 30)
+    published = {RAW_ZONE: KeyLayout({'2021-01-01': 4}), CONFORMED_ZONE: KeyLayout()}
+    configured = {
+        RAW_ZONE: KeyLayout({'2021-01-01': 8, '2021-07-01': 16}),
+        CONFORMED_ZONE: KeyLayout({'2021-06-30': 4}),
+        PURPOSE_BUILT_ZONE: KeyLayout({'2021-01-01': 4}),
+    }
+
+    assert find_past_layout_changes(published, configured, {RAW_ZONE, CONFORMED_ZONE}, today) == [
+        (CONFORMED_ZONE, today, 'shard count 4 added with a past effective date'),
+        (RAW_ZONE, datetime.date(2021, 1, 1), 'shard count 8 added with a past effective date'),
+        (RAW_ZONE, datetime.date(2021, 1, 1), 'shard count 4 removed although it is in effect'),
+    ]
+    assert find_past_layout_changes(published, configured, set(), today) == []
+    assert find_past_layout_changes(
+        published, {RAW_ZONE: KeyLayout({'2021-01-01': 4, '2021-07-01': 16})}, {RAW_ZONE}, today
+    ) == []
+
+
+def test_check_key_layouts_reads_the_published_layout_and_the_zone_buckets(configuration):
+    configuration[DEV][KEY_LAYOUT] = {RAW_ZONE: {'2021-06-01': 16}}
+    session_cache = SessionCache()
+    ssm = boto3.client('ssm', region_name='us-east-2', aws_access_key_id='testing', aws_secret_access_key='testing')
+    s3 = boto3.client('s3', region_name='us-east-2', aws_access_key_id='testing', aws_secret_access_key='testing')
+    session_cache.set_client(ssm, 'ssm', None, 'us-east-2')
+    session_cache.set_client(s3, 's3', None, 'us-east-2')
+    with Stubber(ssm) as ssm_stubber, Stubber(s3) as s3_stubber:
+        ssm_stubber.add_response('get_parameter', {'Parameter': {
+            'Name': '/DataLake/Infrastructure/Dev/s3_key_layout',
+            'Value': dump_key_layouts({RAW_ZONE: KeyLayout(), CONFORMED_ZONE: KeyLayout()}),
+        }}, {'Name': '/DataLake/Infrastructure/Dev/s3_key_layout'})
+        s3_stubber.add_response('list_objects_v2', {'KeyCount': 1}, {
+            'Bucket': 'dev-unit-test-222222222222-us-east-2-raw', 'MaxKeys': 1,
+        })
+        s3_stubber.add_response('list_objects_v2', {'KeyCount': 0}, {
+            'Bucket': 'dev-unit-test-222222222222-us-east-2-conformed', 'MaxKeys': 1,
+        })
+        s3_stubber.add_client_error('list_objects_v2', 'NoSuchBucket', expected_params={
+            'Bucket': 'dev-unit-test-222222222222-us-east-2-purpose-built', 'MaxKeys': 1,
+        })
+
+        with pytest.raises(Exception, match='raw 2021-06-01: shard count 16 added with a past effective date'):
+            check_key_layouts(DEV, session_cache, today=datetime.date(2021, 6, 30))
@@ -0,0 +1,122 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from lib import output_resolver
+from lib.configuration import DEV, S3_RAW_BUCKET, VPC_ID
+from lib.output_resolver import OutputResolver
+from lib.sessions import SessionCache
+
+PATH = '/DataLake/Infrastructure/Dev'
+CACHE_KEY = f'ssm-parameters-by-path:account=222222222222:path={PATH}:region=us-east-2'
+OTHER_CACHE_KEY = 'ssm-parameters-by-path:account=333333333333:path=/DataLake/Infrastructure/Test:region=us-east-2'
+RAW_BUCKET_NAME = 'dev-unit-test-222222222222-us-east-2-raw'
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1625000000
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def ssm():
+    client = boto3.client('ssm', region_name='us-east-2', aws_access_key_id='testing', aws_secret_access_key='testing')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    path = tmp_path / 'cdk.context.json'
+    path.write_text(json.dumps({OTHER_CACHE_KEY: {'values': {VPC_ID: 'vpc-test'}, 'fetchedAt': 0}}))
+
+    return str(path)
+
+
+def add_parameters(stubber):
+    """
+    Adds the two pages of the Dev hierarchy
+    """
+    stubber.add_response('get_parameters_by_path', {
+        'Parameters': [{'Name': f'{PATH}/{VPC_ID}', 'Value': 'vpc-dev'}], 'NextToken': 'page-2',
+    }, {'Path': PATH, 'Recursive': True})
+    stubber.add_response('get_parameters_by_path', {
+        'Parameters': [{'Name': f'{PATH}/{S3_RAW_BUCKET}', 'Value': RAW_BUCKET_NAME}],
+    }, {'Path': PATH, 'Recursive': True, 'NextToken': 'page-2'})
+
+
+def test_refresh_reads_every_page_of_the_hierarchy(configuration, ssm):
+    client, stubber = ssm
+    add_parameters(stubber)
+
+    resolver = OutputResolver(DEV, ssm_client=client, cache_file=None)
+
+    assert resolver.get_all() == {VPC_ID: 'vpc-dev', S3_RAW_BUCKET: RAW_BUCKET_NAME}
+    with pytest.raises(KeyError, match=f'not published under {PATH}'):
+        resolver.get('subnet_id_3')
+
+
+def test_cached_values_are_used_until_the_ttl_expires(configuration, ssm, cache_file):
+    client, stubber = ssm
+    clock = FakeClock()
+    add_parameters(stubber)
+
+    assert OutputResolver(DEV, client, cache_file, ttl_seconds=60, clock=clock.time).get(VPC_ID) == 'vpc-dev'
+    with open(cache_file) as cache:
+        assert json.load(cache)[CACHE_KEY] == {
+            'values': {VPC_ID: 'vpc-dev', S3_RAW_BUCKET: RAW_BUCKET_NAME}, 'fetchedAt': clock.now,
+        }
+
+    # A warm cache resolves without an API call, the stubber has no responses left
+    clock.now += 59
+    assert OutputResolver(DEV, client, cache_file, ttl_seconds=60, clock=clock.time).get(VPC_ID) == 'vpc-dev'
+
+    clock.now += 1
+    add_parameters(stubber)
+    assert OutputResolver(DEV, client, cache_file, ttl_seconds=60, clock=clock.time).get(VPC_ID) == 'vpc-dev'
+    stubber.assert_no_pending_responses()
+
+
+def test_cache_file_is_replaced_atomically(configuration, ssm, cache_file, monkeypatch):
+    client, stubber = ssm
+    add_parameters(stubber)
+    OutputResolver(DEV, client, cache_file).refresh()
+
+    with open(cache_file) as cache:
+        assert set(json.load(cache)) == {CACHE_KEY, OTHER_CACHE_KEY}
+    assert os.listdir(os.path.dirname(cache_file)) == ['cdk.context.json']
+
+    # A write that fails before the replace leaves the previous cache file intact
+    def fail_to_replace(source, destination):
+        raise OSError('No space left on device')
+
+    with open(cache_file) as cache:
+        previous_contents = cache.read()
+    monkeypatch.setattr(output_resolver.os, 'replace', fail_to_replace)
+    add_parameters(stubber)
+    with pytest.raises(OSError):
+        OutputResolver(DEV, client, cache_file).refresh()
+    with open(cache_file) as cache:
+        assert cache.read() == previous_contents
+
+
+def test_ssm_client_is_taken_from_the_session_cache(configuration, ssm):
+    client, stubber = ssm
+    session_cache = SessionCache()
+    session_cache.set_client(client, 'ssm', 'dev', 'us-east-2')
+    add_parameters(stubber)
+
+    resolver = OutputResolver(DEV, cache_file=None, session_cache=session_cache, profile_name='dev')
+
+    assert resolver.get(S3_RAW_BUCKET) == RAW_BUCKET_NAME
@@ -0,0 +1,76 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+
+import pytest
+
+from lib.configuration import DEV, get_pipeline_name
+from lib.tools.pipeline_analytics import (
+    DAY, analyze, format_report, load_history, record_history, summarize_execution,
+)
+
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fixtures', 'pipeline_analytics')
+
+
+@pytest.fixture
+def history(configuration):
+    # In the format written by pipeline_analytics --record
+    # Two successful executions in the week of 2021-06-28, one failed build in the week after
+    return load_history(FIXTURE_DIRECTORY, get_pipeline_name(DEV))
+
+
+def test_summarize_execution_measures_stages_actions_and_build_phases(history):
+    failed, _, succeeded = history['executions']
+
+    summary = summarize_execution(succeeded, history['builds'])
+
+    assert summary['status'] == 'Succeeded'
+    assert summary['duration'] == 1200
+    assert summary['stages'] == {'Source': 30, 'Build': 480, 'Dev': 690}
+    assert summary['actions'] == {'Source/GitHub': 30, 'Build/Synth': 480, 'Dev/Deploy': 690}
+    assert summary['phases'] == {'Synth INSTALL': 60, 'Synth BUILD': 300}
+    assert summarize_execution(failed, history['builds'])['phases'] == {'Synth INSTALL': 50, 'Synth BUILD': 200}
+
+
+def test_lead_time_runs_from_the_commit_to_the_end_of_a_successful_execution(history):
+    failed, _, succeeded = history['executions']
+
+    summary = summarize_execution(succeeded, history['builds'])
+    assert summary['lead_time'] == 1500
+    assert summary['commit_to_start'] == 300
+
+    summary = summarize_execution(failed, history['builds'])
+    assert summary['lead_time'] is None
+    assert summary['commit_to_start'] == 60
+
+
+def test_analyze_computes_percentiles_and_weekly_trends(history):
+    report = analyze(history)
+
+    assert report['executions'] == 3
+    assert report['succeeded'] == 2
+    assert report['lead_time'] == {'p50': 1950, 'p90': 2310, 'p99': 2391}
+    assert report['commit_to_start'] == {'p50': 300, 'p90': 540, 'p99': 594}
+    assert [(name, runs) for name, runs, _ in report['actions']] == [
+        ('Source/GitHub', 3), ('Build/Synth', 3), ('Dev/Deploy', 2),
+    ]
+    assert report['trends'] == [
+        ('2021-W26', 2, 2, {'p50': 1950, 'p90': 2310, 'p99': 2391}, {'p50': 1500, 'p90': 1740, 'p99': 1794}),
+        ('2021-W27', 1, 0, None, {'p50': 300, 'p90': 300, 'p99': 300}),
+    ]
+    assert [trend[0] for trend in analyze(history, DAY)['trends']] == ['2021-06-28', '2021-06-29', '2021-07-06']
+
+
+def test_format_report_prints_minutes_and_seconds(history):
+    lines = format_report(analyze(history)).splitlines()
+
+    assert lines[0] == 'dev-unit-test-infrastructure-pipeline: 3 executions, 2 succeeded'
+    assert ['Commit', 'to', 'Succeeded', '32m30s', '38m30s', '39m51s'] in [line.split() for line in lines]
+    assert ['2021-W27', '1', '0', '-', '-', '-', '5m00s'] in [line.split() for line in lines]
+
+
+def test_recorded_history_loads_unchanged(history, tmp_path):
+    record_history(str(tmp_path), history)
+
+    assert load_history(str(tmp_path), history['pipelineName']) == history
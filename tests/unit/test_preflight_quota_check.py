@@ -0,0 +1,162 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import runpy
+import sys
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+import lib.sessions
+from lib.configuration import DEV, VPC_STACK, get_stack_names
+from lib.prerequisites import preflight_quota_check
+from lib.prerequisites.preflight_quota_check import (
+    EXCEEDED, LOOKUP_ROLE_ARN, OK, QUOTA_CHECKS, check_environment, get_quota_value, load_synthesized_templates,
+)
+from lib.sessions import SessionCache
+
+REGION_NAME = 'us-east-2'
+CHECKS = {check.name: check for check in QUOTA_CHECKS}
+NESTED_STACK_ID = 'arn:aws:cloudformation:us-east-2:222222222222:stack/Dev-Vpc-Endpoints-1A2B3C/0f1e2d3c'
+
+
+def create_client(service_name):
+    return boto3.client(
+        service_name, region_name=REGION_NAME, aws_access_key_id='testing', aws_secret_access_key='testing'
+    )
+
+
+def quota(value):
+    return {'Quota': {'Value': value}}
+
+
+@pytest.fixture
+def service_quotas():
+    client = create_client('service-quotas')
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_get_quota_value_falls_back_to_the_aws_default_and_the_documented_default(service_quotas):
+    client, stubber = service_quotas
+    check = CHECKS['VPCs per Region']
+    expected_params = {'ServiceCode': 'vpc', 'QuotaCode': 'L-F678F1CE'}
+    stubber.add_response('get_service_quota', quota(10.0), expected_params)
+    stubber.add_client_error('get_service_quota', 'NoSuchResourceException', expected_params=expected_params)
+    stubber.add_response('get_aws_default_service_quota', quota(5.0), expected_params)
+    stubber.add_client_error('get_service_quota', 'AccessDeniedException', expected_params=expected_params)
+    stubber.add_client_error(
+        'get_aws_default_service_quota', 'AccessDeniedException', expected_params=expected_params
+    )
+
+    assert get_quota_value(client, check) == 10.0
+    assert get_quota_value(client, check) == 5.0
+    assert get_quota_value(client, check) == check.default_value
+    # Quotas that Service Quotas does not report are never looked up
+    assert get_quota_value(client, CHECKS['KMS keys']) == 100000
+
+
+def test_check_environment_counts_what_the_deployment_adds(configuration, synthesize_stage, monkeypatch):
+    cdk_out = synthesize_stage(DEV)
+    monkeypatch.setattr(preflight_quota_check, 'QUOTA_CHECKS', [
+        CHECKS['VPCs per Region'], CHECKS['EC2-VPC Elastic IPs'], CHECKS['Interface VPC endpoints per VPC'],
+    ])
+    session_cache = SessionCache()
+    stubbers = {}
+    for service_name in ('cloudformation', 'service-quotas', 'ec2'):
+        client = create_client(service_name)
+        session_cache.set_client(client, service_name, None, REGION_NAME)
+        stubbers[service_name] = Stubber(client)
+
+    # The VPC is deployed already, in a nested stack of the VPC stack, the other stacks are new
+    vpc_stack_name = get_stack_names(DEV)[VPC_STACK]
+    for stack_name in load_synthesized_templates(cdk_out, get_stack_names(DEV).values()):
+        if stack_name != vpc_stack_name:
+            stubbers['cloudformation'].add_client_error(
+                'get_template', 'ValidationError', f'Stack with id {stack_name} does not exist',
+                expected_params={'StackName': stack_name},
+            )
+            continue
+        stubbers['cloudformation'].add_response('get_template', {'TemplateBody': json.dumps({'Resources': {
+            'Endpoints': {'Type': 'AWS::CloudFormation::Stack', 'Properties': {'TemplateURL': 'https://...'}},
+        }})}, {'StackName': stack_name})
+        stubbers['cloudformation'].add_response('list_stack_resources', {'StackResourceSummaries': [{
+            'LogicalResourceId': 'Endpoints',
+            'PhysicalResourceId': NESTED_STACK_ID,
+            'ResourceType': 'AWS::CloudFormation::Stack',
+            'LastUpdatedTimestamp': '2021-06-30T00:00:00Z',
+            'ResourceStatus': 'UPDATE_COMPLETE',
+        }]}, {'StackName': stack_name})
+        stubbers['cloudformation'].add_response('get_template', {'TemplateBody': json.dumps({'Resources': {
+            'Vpc': {'Type': 'AWS::EC2::VPC', 'Properties': {}},
+        }})}, {'StackName': NESTED_STACK_ID})
+
+    stubbers['service-quotas'].add_response('get_service_quota', quota(5.0))
+    stubbers['ec2'].add_response('describe_vpcs', {'Vpcs': [{'VpcId': f'vpc-{index}'} for index in range(5)]})
+    stubbers['service-quotas'].add_response('get_service_quota', quota(5.0))
+    stubbers['ec2'].add_response('describe_addresses', {'Addresses': [{'AllocationId': 'eipalloc-1'}]})
+    stubbers['service-quotas'].add_response('get_service_quota', quota(50.0))
+    for stubber in stubbers.values():
+        stubber.activate()
+
+    results = {
+        check.name: result
+        for check, result, error in check_environment(session_cache, configuration, DEV, cdk_out, max_workers=1)
+    }
+
+    # The deployed VPC is not counted again, so the fifth VPC of the account fits
+    assert results['VPCs per Region'] == {'required': 0, 'usage': 5, 'limit': 5.0, 'status': OK}
+    # One Elastic IP per NAT gateway
+    assert results['EC2-VPC Elastic IPs'] == {'required': 3, 'usage': 1, 'limit': 5.0, 'status': OK}
+    assert results['Interface VPC endpoints per VPC'] == {'required': 5, 'usage': 0, 'limit': 50.0, 'status': OK}
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+
+
+def test_check_environment_reports_exceeded_quotas(configuration, synthesize_stage, monkeypatch):
+    cdk_out = synthesize_stage(DEV)
+    monkeypatch.setattr(preflight_quota_check, 'QUOTA_CHECKS', [CHECKS['EC2-VPC Elastic IPs']])
+    monkeypatch.setattr(preflight_quota_check, 'get_deployed_templates', lambda client, stack_name: [])
+    session_cache = SessionCache()
+    service_quotas_client = create_client('service-quotas')
+    ec2_client = create_client('ec2')
+    session_cache.set_client(service_quotas_client, 'service-quotas', None, REGION_NAME)
+    session_cache.set_client(ec2_client, 'ec2', None, REGION_NAME)
+
+    with Stubber(service_quotas_client) as service_quotas_stubber, Stubber(ec2_client) as ec2_stubber:
+        service_quotas_stubber.add_response('get_service_quota', quota(5.0))
+        ec2_stubber.add_response('describe_addresses', {
+            'Addresses': [{'AllocationId': f'eipalloc-{index}'} for index in range(3)],
+        })
+
+        [(_, result, error)] = check_environment(session_cache, configuration, DEV, cdk_out, max_workers=1)
+
+    assert error is None
+    assert result == {'required': 3, 'usage': 3, 'limit': 5.0, 'status': EXCEEDED}
+
+
+# runpy warns that it executes the already imported module again, as __main__
+@pytest.mark.filterwarnings('ignore:.*found in sys.modules:RuntimeWarning')
+def test_failing_checks_exit_with_an_error(configuration, synthesize_stage, monkeypatch, capsys):
+    cdk_out = synthesize_stage(DEV)
+    session_cache = SessionCache()
+    sts = create_client('sts')
+    session_cache.set_client(sts, 'sts', None, REGION_NAME)
+    monkeypatch.setattr(lib.sessions, 'SessionCache', lambda: session_cache)
+    monkeypatch.setattr(sys, 'argv', [
+        'preflight_quota_check.py', '--environment', DEV, '--cdk-out', cdk_out, '--assume-lookup-role',
+    ])
+
+    with Stubber(sts) as stubber:
+        stubber.add_client_error('assume_role', 'AccessDenied', 'Not authorized', expected_params={
+            'RoleArn': LOOKUP_ROLE_ARN.format(account_id='222222222222', region=REGION_NAME),
+            'RoleSessionName': 'DataLakeInfrastructureTooling',
+        })
+        with pytest.raises(SystemExit) as exit_info:
+            runpy.run_module('lib.prerequisites.preflight_quota_check', run_name='__main__')
+
+    assert exit_info.value.code == 1
+    assert 'ERROR: Could not assume' in capsys.readouterr().out
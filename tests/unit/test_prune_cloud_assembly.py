@@ -0,0 +1,93 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import glob
+import json
+import os
+
+import pytest
+from aws_cdk import cx_api
+
+from app import create_app
+from lib.cloud_assembly import MANIFEST_FILE, NESTED_ASSEMBLY_ARTIFACT, load_manifest
+from lib.tools.prune_cloud_assembly import PATH_METADATA, prune
+
+from .conftest import get_cdk_context
+
+DEV_PIPELINE_STACK = 'DevDataLakeTestInfrastructurePipeline'
+
+
+@pytest.fixture
+def cdk_out(configuration, tmp_path, monkeypatch):
+    """
+    Synthesizes the pipelines of all environments, with the construct path metadata the CDK CLI enables
+    """
+    monkeypatch.delenv('ENV', raising=False)
+    monkeypatch.delenv('IS_BOOTSTRAP', raising=False)
+    monkeypatch.delenv('EPHEMERAL_BRANCH', raising=False)
+    context = {**get_cdk_context(), 'aws:cdk:enable-path-metadata': True}
+
+    return create_app(str(tmp_path / 'cdk.out'), context).synth().directory
+
+
+def iter_metadata_entries(directory: str):
+    manifest = load_manifest(directory)
+    for artifact in manifest['artifacts'].values():
+        for entries in artifact.get('metadata', {}).values():
+            yield from entries
+        if artifact['type'] == NESTED_ASSEMBLY_ARTIFACT:
+            yield from iter_metadata_entries(os.path.join(directory, artifact['properties']['directoryName']))
+
+
+def read_templates(directory: str) -> list:
+    templates = []
+    for template_path in glob.glob(os.path.join(directory, '**', '*.template.json'), recursive=True):
+        with open(template_path) as template_file:
+            templates.append(template_file.read())
+
+    return templates
+
+
+def test_prune_keeps_what_the_pipeline_of_the_environment_deploys(cdk_out):
+    assert os.path.exists(os.path.join(cdk_out, 'tree.json'))
+    assert 'TestDataLakeTestInfrastructurePipeline' in load_manifest(cdk_out)['artifacts']
+
+    report = prune(cdk_out, 'Dev')
+
+    assert report['after']['bytes'] < report['before']['bytes']
+    artifacts = load_manifest(cdk_out)['artifacts']
+    assert sorted(artifacts) == [
+        DEV_PIPELINE_STACK, f'{DEV_PIPELINE_STACK}.assets', f'assembly-{DEV_PIPELINE_STACK}-Dev',
+    ]
+    assert sorted(path for path in os.listdir(cdk_out) if not path.startswith('asset.')) == sorted([
+        'cdk.out', MANIFEST_FILE, f'{DEV_PIPELINE_STACK}.template.json', f'{DEV_PIPELINE_STACK}.assets.json',
+        f'assembly-{DEV_PIPELINE_STACK}-Dev',
+    ])
+    # The assets of the kept pipeline stack survive
+    with open(os.path.join(cdk_out, f'{DEV_PIPELINE_STACK}.assets.json')) as assets_file:
+        for asset in json.load(assets_file).get('files', {}).values():
+            assert os.path.exists(os.path.join(cdk_out, asset['source']['path']))
+
+
+def test_prune_removes_the_tree_and_the_debug_metadata(cdk_out):
+    assert any('trace' in entry for entry in iter_metadata_entries(cdk_out))
+    assert any(PATH_METADATA in template for template in read_templates(cdk_out))
+
+    prune(cdk_out, 'Dev')
+
+    assert glob.glob(os.path.join(cdk_out, '**', 'tree.json'), recursive=True) == []
+    entries = list(iter_metadata_entries(cdk_out))
+    assert entries and all('trace' not in entry for entry in entries)
+    assert all(PATH_METADATA not in template for template in read_templates(cdk_out))
+
+
+def test_pruned_manifest_still_loads(cdk_out):
+    prune(cdk_out, 'Dev')
+
+    assembly = cx_api.CloudAssembly(cdk_out)
+    nested_assembly = assembly.get_nested_assembly(f'assembly-{DEV_PIPELINE_STACK}-Dev')
+
+    assert [stack.id for stack in assembly.stacks] == [DEV_PIPELINE_STACK]
+    assert len(nested_assembly.stacks) > 0
+    for stack in nested_assembly.stacks:
+        assert stack.template['Resources']
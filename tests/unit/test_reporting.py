@@ -0,0 +1,20 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from lib.reporting import format_table, get_percentiles
+
+
+def test_get_percentiles_interpolates_between_the_closest_ranks():
+    assert get_percentiles([4, 1, 3, 2, 5]) == {'p50': 3, 'p90': 4.6, 'p99': pytest.approx(4.96)}
+    assert get_percentiles([7]) == {'p50': 7, 'p90': 7, 'p99': 7}
+
+
+def test_format_table_pads_columns_to_the_widest_cell():
+    assert format_table(['Stack', 'Resources'], [['Dev-Vpc', 42], ['Dev-S3BucketZones', 7]]).splitlines() == [
+        'Stack              Resources',
+        '-----------------  ---------',
+        'Dev-Vpc            42',
+        'Dev-S3BucketZones  7',
+    ]
@@ -0,0 +1,70 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import collections
+
+import pytest
+
+from lib.configuration import CONFORMED_ZONE, RAW_ZONE
+from lib.tools.s3_benchmark import GET, PUT, format_results, get_keys, parse_size, run_workload
+
+
+def benchmark_result(zone, workload, operations_per_second, p99):
+    return {
+        'zone': zone, 'bucket': f'dev-unit-test-222222222222-us-east-2-{zone}', 'workload': workload,
+        'objectSize': 4096, 'operations': 50, 'errors': 0, 'errorRate': 0, 'firstError': None, 'seconds': 1.0,
+        'operationsPerSecond': operations_per_second, 'bytesPerSecond': operations_per_second * 4096,
+        'latency': {'p50': p99 / 2, 'p90': p99 * 0.9, 'p99': p99},
+    }
+
+
+def test_parse_size_accepts_bytes_and_binary_units():
+    assert parse_size('512') == 512
+    assert parse_size('512B') == 512
+    assert parse_size('4KiB') == 4096
+    assert parse_size(' 16 MiB ') == 16 * 1024 ** 2
+    assert parse_size('1GiB') == 1024 ** 3
+    for value in ('4KB', '1.5MiB', 'MiB', ''):
+        with pytest.raises(Exception, match='Invalid size'):
+            parse_size(value)
+
+
+def test_get_keys_fans_out_round_robin_over_the_prefixes():
+    keys = get_keys('run1', 4096, 10, 4)
+
+    assert len(set(keys)) == 10
+    assert keys[0] == 'benchmark/run1/prefix-000/4096/object-000000'
+    assert keys[5] == 'benchmark/run1/prefix-001/4096/object-000005'
+    assert collections.Counter(key.split('/')[2] for key in keys) == {
+        'prefix-000': 3, 'prefix-001': 3, 'prefix-002': 2, 'prefix-003': 2,
+    }
+
+
+def test_run_workload_counts_errors_and_measures_the_successful_operations():
+    def operation(item):
+        if item % 2:
+            raise Exception(f'SlowDown on object {item}')
+        return 1024
+
+    result = run_workload(operation, [0, 1, 2, 3], max_workers=2)
+
+    assert (result['operations'], result['errors'], result['errorRate']) == (4, 2, 0.5)
+    assert result['firstError'] == 'SlowDown on object 1'
+    assert set(result['latency']) == {'p50', 'p90', 'p99'}
+    assert result['bytesPerSecond'] == pytest.approx(2048 / result['seconds'])
+    assert run_workload(operation, [], max_workers=2)['errorRate'] == 0
+
+
+def test_format_results_compares_against_the_baseline():
+    run = {'results': [benchmark_result(RAW_ZONE, PUT, 100.0, 0.020), benchmark_result(RAW_ZONE, GET, 200.0, 0.010)]}
+    baseline = {'results': [
+        benchmark_result(RAW_ZONE, PUT, 80.0, 0.025), benchmark_result(CONFORMED_ZONE, GET, 200.0, 0.010),
+    ]}
+
+    lines = format_results(run, baseline).splitlines()
+
+    assert lines[0].split()[-4:] == ['Ops/s', 'change', 'p99', 'change']
+    assert lines[2].split()[-2:] == ['+25.0%', '-20.0%']
+    # A workload the baseline did not run has nothing to compare against
+    assert lines[3].split()[-2:] == ['-', '-']
+    assert 'change' not in format_results(run)
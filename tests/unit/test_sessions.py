@@ -0,0 +1,40 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+
+import boto3
+from botocore.stub import Stubber
+
+from lib.sessions import SessionCache
+
+ROLE_ARN = 'arn:aws:iam::222222222222:role/cdk-hnb659fds-lookup-role-222222222222-us-east-2'
+
+
+def test_assumed_role_sessions_are_created_by_the_session_factory():
+    calls = []
+
+    def session_factory(**kwargs):
+        calls.append(kwargs)
+        return boto3.session.Session(region_name=kwargs['region_name'])
+
+    session_cache = SessionCache(session_factory)
+    sts = boto3.client('sts', region_name='us-east-2', aws_access_key_id='testing', aws_secret_access_key='testing')
+    session_cache.set_client(sts, 'sts', 'dev', 'us-east-2')
+    with Stubber(sts) as stubber:
+        stubber.add_response('assume_role', {'Credentials': {
+            'AccessKeyId': 'ASIAEXAMPLEEXAMPLE',
+            'SecretAccessKey': 'secret',
+            'SessionToken': 'token',
+            'Expiration': datetime.datetime(2021, 6, 30),
+        }}, {'RoleArn': ROLE_ARN, 'RoleSessionName': 'DataLakeInfrastructureTooling'})
+
+        session = session_cache.session('dev', 'us-east-2', ROLE_ARN)
+
+    assert session is session_cache.session('dev', 'us-east-2', ROLE_ARN)
+    assert calls == [{
+        'aws_access_key_id': 'ASIAEXAMPLEEXAMPLE',
+        'aws_secret_access_key': 'secret',
+        'aws_session_token': 'token',
+        'region_name': 'us-east-2',
+    }]
@@ -0,0 +1,55 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from lib.cloud_assembly import find_nested_templates, find_stack_templates
+from lib.configuration import (
+    DEPLOYMENT, DEV, MAX_STACK_RESOURCES, MAX_TEMPLATE_BYTES, S3_BUCKET_ZONES_STACK, SHARDED_STACKS, VPC_STACK,
+    get_stack_names,
+)
+from lib.stack_sharding import check_stack_budget, get_stack_budget
+
+
+def get_buckets(templates: list) -> dict:
+    """
+    @return: dict: Tags as a dict per bucket logical id, across the templates
+    """
+    return {
+        logical_id: {item['Key']: item['Value'] for item in resource['Properties'].get('Tags', [])}
+        for template in templates for logical_id, resource in template['Resources'].items()
+        if resource['Type'] == 'AWS::S3::Bucket'
+    }
+
+
+def test_stack_over_budget_fails_unless_it_is_sharded(configuration, synthesize_stage):
+    # The VPC stack has a few resources more than the budget, its interface endpoints move to a nested stack
+    configuration[DEPLOYMENT][MAX_STACK_RESOURCES] = 50
+    vpc_stack_name = get_stack_names(DEV)[VPC_STACK]
+    budget = get_stack_budget()
+    assert budget == {MAX_STACK_RESOURCES: 50, MAX_TEMPLATE_BYTES: 800000}
+
+    with pytest.raises(Exception, match=f'over the budget of 50 resources .*: {vpc_stack_name} \\(') as error_info:
+        check_stack_budget(synthesize_stage(DEV), budget)
+    assert get_stack_names(DEV)[S3_BUCKET_ZONES_STACK] not in str(error_info.value)
+
+    configuration[DEV][SHARDED_STACKS] = [VPC_STACK]
+    check_stack_budget(synthesize_stage(DEV), budget)
+
+
+def test_sharded_stack_keeps_the_bucket_logical_ids_and_zone_tags(configuration, synthesize_stage):
+    stack_name = get_stack_names(DEV)[S3_BUCKET_ZONES_STACK]
+    unsharded_buckets = get_buckets([find_stack_templates(synthesize_stage(DEV), [stack_name])[stack_name]])
+
+    configuration[DEV][SHARDED_STACKS] = [S3_BUCKET_ZONES_STACK]
+    cdk_out = synthesize_stage(DEV)
+    nested_templates = find_nested_templates(cdk_out, [stack_name])[stack_name]
+    sharded_buckets = get_buckets([find_stack_templates(cdk_out, [stack_name])[stack_name], *nested_templates])
+
+    # One nested stack per zone, holding the zone's bucket
+    assert len(nested_templates) == 3
+    assert [len(get_buckets([template])) for template in nested_templates] == [1, 1, 1]
+    assert sharded_buckets == unsharded_buckets
+    assert sorted(tags.get('unit-test:zone') for tags in sharded_buckets.values() if 'unit-test:zone' in tags) == [
+        'conformed', 'purpose-built', 'raw',
+    ]
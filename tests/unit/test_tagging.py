@@ -0,0 +1,46 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from lib.cloud_assembly import find_stack_templates
+from lib.configuration import DATA_LAKE_ZONES, DEV, S3_BUCKET_ZONES_STACK, get_stack_names
+from lib.tagging import COST_CENTER, get_tag
+
+STANDARD_TAGS = {
+    'unit-test:cost-center': 'DataLakeTestInfrastructure',
+    'unit-test:environment': DEV,
+    'unit-test:team': 'DataLakeTestAdmin',
+    'unit-test:application': 'DataLakeTestInfrastructure',
+}
+
+
+@pytest.fixture
+def bucket_tags(synthesize_stage):
+    """
+    Tags of every bucket of the synthesized S3BucketZonesStack, by bucket name
+    """
+    stack_name = get_stack_names(DEV)[S3_BUCKET_ZONES_STACK]
+    template = find_stack_templates(synthesize_stage(DEV), [stack_name])[stack_name]
+
+    return {
+        resource['Properties']['BucketName']: {item['Key']: item['Value'] for item in resource['Properties']['Tags']}
+        for resource in template['Resources'].values() if resource['Type'] == 'AWS::S3::Bucket'
+    }
+
+
+def test_zone_buckets_carry_the_standard_tags_and_their_zone_tag(bucket_tags):
+    for zone in DATA_LAKE_ZONES:
+        assert bucket_tags[f'dev-unit-test-222222222222-us-east-2-{zone}'] == {
+            **STANDARD_TAGS, 'unit-test:zone': zone,
+        }
+
+
+def test_access_logs_bucket_has_no_zone_tag(bucket_tags):
+    assert bucket_tags['dev-unit-test-222222222222-us-east-2-access-logs'] == STANDARD_TAGS
+
+
+def test_get_tag_returns_a_standard_tag(configuration):
+    assert get_tag(COST_CENTER, DEV) == ['unit-test:cost-center', 'DataLakeTestInfrastructure']
+    with pytest.raises(AttributeError):
+        get_tag('OWNER', DEV)
@@ -0,0 +1,155 @@
+# Copyright 2021 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from lib.configuration import (
+    ALLOW_TEARDOWN, CONFORMED_ZONE, DEV, PROD, RAW_ZONE, TEST, get_ephemeral_environment,
+)
+from lib.tools.teardown import (
+    ACCESS_LOGS, DELETE_OBJECTS_BATCH_SIZE, check_teardown_allowed, delete_bucket, format_report, purge_bucket,
+    teardown,
+)
+
+REGION_NAME = 'us-east-2'
+BUCKET_NAME = 'dev-unit-test-222222222222-us-east-2-{suffix}'
+
+
+def create_client():
+    return boto3.client('s3', region_name=REGION_NAME, aws_access_key_id='testing', aws_secret_access_key='testing')
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = create_client()
+        # The in-memory S3 of moto breaks when a listing runs while DeleteObjects calls remove versions, and cannot
+        # resume a listing after its marker version was deleted. So calls are serialized and deletions wait for the
+        # listing to complete, while purge_bucket still lists and deletes on its threads.
+        lock = threading.Lock()
+        listed = threading.Event()
+        listed.set()
+        make_api_call = client._make_api_call
+
+        def make_serialized_api_call(operation_name, api_params):
+            if operation_name == 'ListObjectVersions' and 'KeyMarker' not in api_params:
+                listed.clear()
+            if operation_name == 'DeleteObjects':
+                listed.wait(10)
+            with lock:
+                response = make_api_call(operation_name, api_params)
+            if operation_name == 'ListObjectVersions' and not response['IsTruncated']:
+                listed.set()
+            return response
+
+        client._make_api_call = make_serialized_api_call
+        yield client
+
+
+def create_versioned_bucket(s3_client, bucket: str, versions: int = 0, delete_markers: int = 0):
+    """
+    Creates a versioned bucket with two versions per key, and deletes the first keys to add delete markers
+    """
+    s3_client.create_bucket(Bucket=bucket, CreateBucketConfiguration={'LocationConstraint': REGION_NAME})
+    s3_client.put_bucket_versioning(Bucket=bucket, VersioningConfiguration={'Status': 'Enabled'})
+    for index in range(versions):
+        s3_client.put_object(Bucket=bucket, Key=f'raw/orders/part-{index // 2}.json', Body=b'{}')
+    for index in range(delete_markers):
+        s3_client.delete_object(Bucket=bucket, Key=f'raw/orders/part-{index}.json')
+
+
+def test_check_teardown_allowed_never_allows_prod(configuration):
+    configuration[PROD][ALLOW_TEARDOWN] = True
+    configuration[DEV][ALLOW_TEARDOWN] = True
+
+    with pytest.raises(Exception, match='never allowed for Prod'):
+        check_teardown_allowed(PROD)
+    with pytest.raises(Exception, match=f'not allowed for {TEST}, set {ALLOW_TEARDOWN}'):
+        check_teardown_allowed(TEST)
+    check_teardown_allowed(DEV)
+    check_teardown_allowed(get_ephemeral_environment('feature/teardown'))
+
+
+def test_purge_bucket_deletes_paged_versions_and_delete_markers_in_batches(s3):
+    bucket = BUCKET_NAME.format(suffix=RAW_ZONE)
+    create_versioned_bucket(s3, bucket, versions=1200, delete_markers=1)
+    batches = []
+    s3.meta.events.register(
+        'provide-client-params.s3.DeleteObjects',
+        lambda params, **kwargs: batches.append(len(params['Delete']['Objects'])),
+    )
+
+    result = purge_bucket(s3, bucket, max_workers=2)
+
+    assert (result['versions'], result['deleteMarkers'], result['errors']) == (1200, 1, 0)
+    # One page of 1000 versions and delete markers per DeleteObjects batch, then the rest
+    assert sorted(batches) == [201, DELETE_OBJECTS_BATCH_SIZE]
+    assert 'Versions' not in s3.list_object_versions(Bucket=bucket)
+    assert 'DeleteMarkers' not in s3.list_object_versions(Bucket=bucket)
+
+
+def test_delete_bucket_purges_again_when_objects_arrive_meanwhile(s3):
+    bucket = BUCKET_NAME.format(suffix=ACCESS_LOGS)
+    create_versioned_bucket(s3, bucket, versions=2)
+    deliveries = [b'access log']
+
+    def deliver_access_log(**kwargs):
+        if deliveries:
+            # A separate client, the hooks of this one must not see the delivery
+            create_client().put_object(Bucket=bucket, Key='logs/access.log', Body=deliveries.pop())
+
+    s3.meta.events.register('before-call.s3.DeleteBucket', deliver_access_log)
+
+    results = delete_bucket(s3, bucket, max_workers=1)
+
+    assert [result['versions'] for result in results] == [2, 1]
+    assert bucket not in [item['Name'] for item in s3.list_buckets()['Buckets']]
+
+
+def test_delete_bucket_gives_up_after_the_last_attempt(s3):
+    bucket = BUCKET_NAME.format(suffix=ACCESS_LOGS)
+    create_versioned_bucket(s3, bucket)
+
+    def deliver_access_log(**kwargs):
+        create_client().put_object(Bucket=bucket, Key='logs/access.log', Body=b'access log')
+
+    s3.meta.events.register('before-call.s3.DeleteBucket', deliver_access_log)
+
+    with pytest.raises(ClientError, match='BucketNotEmpty'):
+        delete_bucket(s3, bucket, max_workers=1, attempts=2)
+
+
+def test_teardown_purges_and_deletes_the_existing_buckets(configuration, s3):
+    configuration[DEV][ALLOW_TEARDOWN] = True
+    create_versioned_bucket(s3, BUCKET_NAME.format(suffix=RAW_ZONE), versions=4, delete_markers=1)
+    create_versioned_bucket(s3, BUCKET_NAME.format(suffix=CONFORMED_ZONE), versions=2)
+    create_versioned_bucket(s3, BUCKET_NAME.format(suffix=ACCESS_LOGS), versions=2)
+    s3.create_bucket(Bucket='unrelated-bucket', CreateBucketConfiguration={'LocationConstraint': REGION_NAME})
+
+    report = teardown(DEV, s3, max_workers=2)
+
+    assert [item['Name'] for item in s3.list_buckets()['Buckets']] == ['unrelated-bucket']
+    assert report['stacks'] == []
+    assert sorted((purge['bucket'], purge['versions'], purge['deleteMarkers']) for purge in report['purges']) == [
+        (BUCKET_NAME.format(suffix=ACCESS_LOGS), 0, 0),
+        (BUCKET_NAME.format(suffix=ACCESS_LOGS), 2, 0),
+        (BUCKET_NAME.format(suffix=CONFORMED_ZONE), 0, 0),
+        (BUCKET_NAME.format(suffix=CONFORMED_ZONE), 2, 0),
+        (BUCKET_NAME.format(suffix=RAW_ZONE), 0, 0),
+        (BUCKET_NAME.format(suffix=RAW_ZONE), 4, 1),
+    ]
+    assert f'Tore down {DEV} in' in format_report(report)
+
+
+def test_teardown_refuses_environments_that_do_not_allow_it(configuration, s3):
+    create_versioned_bucket(s3, BUCKET_NAME.format(suffix=RAW_ZONE), versions=2)
+
+    with pytest.raises(Exception, match='not allowed'):
+        teardown(DEV, s3)
+
+    assert len(s3.list_object_versions(Bucket=BUCKET_NAME.format(suffix=RAW_ZONE))['Versions']) == 2